@@ -0,0 +1,93 @@
+# Measures the stages of loading a config with many games: reading the JSON file,
+# compiling the schema validator, validating and parsing.
+#
+# Usage: python benchmarks/config_load.py [--games N] [--repeat N]
+import argparse
+import datetime
+import json
+import pathlib
+import shutil
+import statistics
+import tempfile
+import time
+
+from jingleplayer.configuration import Config, configclass, validation
+
+EXAMPLE_DIR = pathlib.Path(__file__).parents[1] / "tournaments" / "example"
+
+
+def _write_config(directory: pathlib.Path, n_games: int) -> pathlib.Path:
+    shutil.copy(EXAMPLE_DIR / "announce game.mp3", directory)
+    shutil.copy(EXAMPLE_DIR / "jingle start.mp3", directory)
+
+    start = datetime.datetime(2030, 1, 1, 8)
+    games = {
+        f"Game {i}": {
+            "start": (start + i * datetime.timedelta(minutes=30)).isoformat(" "),
+            "duration": "20m",
+            "announcement_file": "announce game.mp3",
+        }
+        for i in range(n_games)
+    }
+    cfg = {
+        "config_version": "1.0",
+        "games": games,
+        "jingles": {
+            "Start": {
+                "audio_file": "jingle start.mp3",
+                "trigger": "game_start",
+                "pre_actions": "announce game",
+                "actions": "play jingle",
+            }
+        },
+    }
+
+    file = directory / "config.json"
+    file.write_text(json.dumps(cfg))
+    return file
+
+
+def _time(f, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t)
+
+    return times
+
+
+def _report(name: str, times: list[float]):
+    print(
+        f"{name:<28} median {statistics.median(times) * 1000:9.2f} ms   min {min(times) * 1000:9.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        file = _write_config(pathlib.Path(d), args.games)
+        cfg_json = configclass._load_json(file)
+
+        print(f"Config with {args.games} games ({file.stat().st_size} bytes)")
+        print()
+
+        def compile_validator():
+            validation.get_validator.cache_clear()
+            validation.get_validator()
+
+        _report("read json", _time(lambda: configclass._load_json(file), args.repeat))
+        _report("compile validator", _time(compile_validator, args.repeat))
+        _report(
+            "validate",
+            _time(lambda: validation.validate_against_schema(cfg_json), args.repeat),
+        )
+        _report("full load", _time(lambda: Config.load(str(file)), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Compares a schedule of many games listed one by one with the same schedule described
+# by a game series: time to load the config and to set up the schedule (i.e. until the
+# first jingle can be scheduled), and the memory used by both.
+#
+# Usage: python benchmarks/game_series.py [--games N] [--repeat N]
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import tempfile
+import tracemalloc
+
+from config_load import _report, _time, _write_config
+
+from jingleplayer.configuration import Config
+from jingleplayer.execution.schedule import Schedule
+from jingleplayer.execution.tasks import get_task_count, iter_tasks
+
+
+def _write_series_config(file: pathlib.Path, n_games: int) -> pathlib.Path:
+    # The same games as _write_config, as one series
+    cfg = json.loads(file.read_text())
+    cfg.pop("games")
+    cfg["game_series"] = {
+        "Game": {
+            "start": datetime.datetime(2030, 1, 1, 8).isoformat(" "),
+            "interval": "30m",
+            "duration": "20m",
+            "count": n_games,
+            "announcement_file": "announce game.mp3",
+        }
+    }
+
+    series_file = file.with_name("series.json")
+    series_file.write_text(json.dumps(cfg))
+    return series_file
+
+
+def _setup(file: pathlib.Path) -> Schedule:
+    cfg = Config.load(str(file))
+    return Schedule(cfg, (), pending=iter_tasks(cfg), pending_count=get_task_count(cfg))
+
+
+def _memory(file: pathlib.Path) -> int:
+    tracemalloc.start()
+    schedule = _setup(file)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del schedule
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["JINGLEPLAYER_CACHE_DIR"] = str(pathlib.Path(d) / "cache")
+
+        games_file = _write_config(pathlib.Path(d), args.games)
+        series_file = _write_series_config(games_file, args.games)
+
+        # Audio durations are probed before measuring
+        _setup(series_file)
+
+        print(f"{args.games} games")
+        print()
+        _report(
+            "games: load + schedule", _time(lambda: _setup(games_file), args.repeat)
+        )
+        _report(
+            "series: load + schedule", _time(lambda: _setup(series_file), args.repeat)
+        )
+        print()
+        print(f"games:  {_memory(games_file) / 1024:10.1f} KiB")
+        print(f"series: {_memory(series_file) / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
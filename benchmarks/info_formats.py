@@ -0,0 +1,89 @@
+# Measures --info --format for a large game series: how long it takes until the first
+# task record is written, the time for the whole output of each format, and the memory
+# used meanwhile (which does not grow with the number of games, as records are written
+# as they are created).
+#
+# Usage: python benchmarks/info_formats.py [--games N] [--repeat N]
+import argparse
+import io
+import os
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+from config_load import _report, _time, _write_config
+from game_series import _write_series_config
+
+from jingleplayer import testing
+from jingleplayer.configuration import Config
+
+
+class _FirstTaskOutput(io.StringIO):
+    # Notes when the first task record is written and discards all output
+    def __init__(self):
+        super().__init__()
+        self.first_task = None
+
+    def write(self, s: str) -> int:
+        if self.first_task is None and '"type": "task"' in s:
+            self.first_task = time.perf_counter()
+
+        return len(s)
+
+
+def _time_to_first_task(cfg: Config, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        out = _FirstTaskOutput()
+        t = time.perf_counter()
+        testing.print_config_info(cfg, "jsonl", out=out)
+        times.append(out.first_task - t)
+
+    return times
+
+
+def _peak_memory(cfg: Config, format: str) -> int:
+    tracemalloc.start()
+    testing.print_config_info(cfg, format, out=_FirstTaskOutput())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["JINGLEPLAYER_CACHE_DIR"] = str(pathlib.Path(d) / "cache")
+
+        games_file = _write_config(pathlib.Path(d), args.games)
+        cfg = Config.load(str(_write_series_config(games_file, args.games)))
+
+        print(f"{args.games} games")
+        print()
+        _report("jsonl: first task", _time_to_first_task(cfg, args.repeat))
+        for format in ("json", "jsonl", "summary"):
+            _report(
+                f"{format}: all records",
+                _time(
+                    lambda format=format: testing.print_config_info(
+                        cfg, format, out=_FirstTaskOutput()
+                    ),
+                    args.repeat,
+                ),
+            )
+
+        print()
+        for format in ("json", "jsonl", "summary"):
+            print(
+                f"{format + ':':<8} {_peak_memory(cfg, format) / 1024:10.1f} KiB peak"
+            )
+
+
+if __name__ == "__main__":
+    main()
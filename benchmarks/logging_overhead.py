@@ -0,0 +1,124 @@
+# Measures the cost of logging for loading a config, generating its tasks and triggering
+# (how late util.wait_until returns), with logging disabled, logging directly to a file
+# and logging to a file through a queue (as --logfile does).
+#
+# Usage: python benchmarks/logging_overhead.py [--games N] [--repeat N] [--triggers N]
+#        [--write_delay MS]
+import argparse
+import datetime
+import logging
+import logging.handlers
+import os
+import pathlib
+import queue
+import statistics
+import tempfile
+import time
+
+from config_load import _report, _time, _write_config
+
+from jingleplayer import util
+from jingleplayer.configuration import Config
+from jingleplayer.execution.tasks import get_tasks
+
+
+class _SlowFileHandler(logging.FileHandler):
+    # Simulates a slow disk, e.g. an SD card
+    def __init__(self, filename: str, delay: float):
+        super().__init__(filename, mode="w")
+        self.write_delay = delay
+
+    def emit(self, record):
+        super().emit(record)
+        time.sleep(self.write_delay)
+
+
+def _setup(mode: str, file: pathlib.Path, write_delay: float):
+    # Returns a function that undoes the setup
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+        root.addHandler(logging.NullHandler())
+        return lambda: None
+
+    file_handler = _SlowFileHandler(str(file), write_delay)
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
+    )
+    root.setLevel(logging.DEBUG)
+
+    if mode == "file":
+        root.addHandler(file_handler)
+        return file_handler.close
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    def teardown():
+        listener.stop()
+        file_handler.close()
+
+    return teardown
+
+
+def _trigger_lateness(n: int) -> list[float]:
+    # Lateness (s) of waits 20 ms apart, like the triggers of consecutive actions
+    lateness = []
+    for _ in range(n):
+        target = datetime.datetime.now() + datetime.timedelta(milliseconds=20)
+        util.wait_until(target)
+        lateness.append((datetime.datetime.now() - target).total_seconds())
+
+    return lateness
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--triggers", type=int, default=100)
+    parser.add_argument(
+        "--write_delay",
+        type=float,
+        default=0,
+        help="Delay (ms) added to every write of a log record",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["JINGLEPLAYER_CACHE_DIR"] = str(pathlib.Path(d) / "cache")
+
+        file = _write_config(pathlib.Path(d), args.games)
+        log_file = pathlib.Path(d) / "log.txt"
+
+        # Audio durations are probed once, so that all modes load from the same caches
+        cfg = Config.load(str(file))
+
+        print(
+            f"Config with {args.games} games, {len(get_tasks(cfg))} tasks, write delay {args.write_delay} ms"
+        )
+
+        for mode in ("off", "file", "queue"):
+            print()
+            print(f"logging: {mode}")
+
+            teardown = _setup(mode, log_file, args.write_delay / 1000)
+            try:
+                _report("load", _time(lambda: Config.load(str(file)), args.repeat))
+                _report("generate tasks", _time(lambda: get_tasks(cfg), args.repeat))
+
+                lateness = _trigger_lateness(args.triggers)
+                print(
+                    f"{'trigger lateness':<28} median {statistics.median(lateness) * 1000:9.2f} ms   max {max(lateness) * 1000:9.2f} ms"
+                )
+            finally:
+                teardown()
+
+
+if __name__ == "__main__":
+    main()
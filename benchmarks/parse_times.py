@@ -0,0 +1,90 @@
+# Measures the throughput of parsing timedelta and datetime strings: with the general
+# parsers only (pytimeparse2 and strptime, as before the fast path), with the fast path
+# but without the cache, and with both (util.parse_timedelta_str/parse_datetime_str).
+#
+# Usage: python benchmarks/parse_times.py [--n N]
+import argparse
+import datetime
+import itertools
+import time
+
+from jingleplayer import util
+
+# Like the offsets, durations and delays of a generated config: few distinct values that
+# are repeated many times
+TIMEDELTAS = ["25m", "1s", "-2m", "2s", "20m", "-5m", "1h30m", "90", "3 min", "1.5s"]
+
+
+def _datetimes(n_distinct: int) -> list[str]:
+    start = datetime.datetime(2030, 1, 1, 8)
+    return [
+        (start + i * datetime.timedelta(minutes=30)).strftime(util.DT_FORMAT)
+        for i in range(n_distinct)
+    ]
+
+
+def _parse_timedelta_uncached(s: str):
+    if (td := util._parse_timedelta_fast(s)) is None:
+        td = util._parse_timedelta_general(s)
+    return td
+
+
+def _parse_datetime_uncached(s: str):
+    if (dt := util._parse_datetime_fast(s)) is None:
+        dt = util._parse_datetime_general(s)
+    return dt
+
+
+def _throughput(f, strings: list[str]) -> float:
+    t = time.perf_counter()
+    for s in strings:
+        f(s)
+
+    return len(strings) / (time.perf_counter() - t)
+
+
+def _report(name: str, strings: list[str], variants: dict):
+    print(f"{name} ({len(strings)} strings, {len(set(strings))} distinct)")
+
+    baseline = None
+    for variant, f in variants.items():
+        per_s = _throughput(f, strings)
+        baseline = baseline or per_s
+        print(f"  {variant:<20} {per_s:12,.0f} /s   {per_s / baseline:6.1f}x")
+
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    args = parser.parse_args()
+
+    util.parse_timedelta_str.cache_clear()
+    util.parse_datetime_str.cache_clear()
+
+    _report(
+        "timedelta",
+        list(itertools.islice(itertools.cycle(TIMEDELTAS), args.n)),
+        {
+            "general (before)": util._parse_timedelta_general,
+            "fast path": _parse_timedelta_uncached,
+            "fast path + cache": util.parse_timedelta_str,
+        },
+    )
+    # Games on different fields start at the same times, but there are far more distinct
+    # values than for timedeltas. With more distinct values than util.PARSE_CACHE_SIZE,
+    # the cache does not help.
+    _report(
+        "datetime",
+        list(itertools.islice(itertools.cycle(_datetimes(200)), args.n)),
+        {
+            "general (before)": util._parse_datetime_general,
+            "fast path": _parse_datetime_uncached,
+            "fast path + cache": util.parse_datetime_str,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
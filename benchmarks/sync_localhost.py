@@ -0,0 +1,145 @@
+# Runs a sync leader and several followers as separate processes on localhost and
+# measures how far apart they trigger the same actions. Shortly after starting, the
+# second game is delayed through the leader's control API, which the followers have to
+# apply as well.
+#
+# Usage: python benchmarks/sync_localhost.py [--followers N] [--games N]
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_DIR = pathlib.Path(__file__).parents[1]
+
+SYNC_PORT = 8797
+CONTROL_PORT = 8798
+
+
+def _write_config(directory: pathlib.Path, n_games: int) -> pathlib.Path:
+    start = datetime.datetime.now().replace(microsecond=0) + datetime.timedelta(
+        seconds=8
+    )
+    cfg = {
+        "config_version": "1.0",
+        "games": {
+            f"Game {i}": {
+                "start": (start + i * datetime.timedelta(seconds=4)).isoformat(" "),
+                "duration": "2s",
+            }
+            for i in range(n_games)
+        },
+        "jingles": {
+            "Start": {
+                "trigger": "game_start",
+                "pre_actions": "pause playback; wait 1s",
+                "actions": "resume playback",
+            }
+        },
+    }
+
+    file = directory / "config.json"
+    file.write_text(json.dumps(cfg))
+    return file
+
+
+def _start(name: str, cfg: pathlib.Path, directory: pathlib.Path, *args: str):
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "jingleplayer",
+            str(cfg),
+            "-p",
+            "dummy",
+            "--event_sink",
+            f"file:{directory / f'{name}.jsonl'}",
+            *args,
+        ],
+        cwd=REPO_DIR,
+        env={**os.environ, "PYTHONPATH": str(REPO_DIR)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _read_triggers(file: pathlib.Path) -> dict[tuple, datetime.datetime]:
+    triggers = {}
+    for line in file.read_text().splitlines():
+        e = json.loads(line)
+        if e["event"] == "action_started":
+            key = (e["task"]["id"], e["phase"], e["step"])
+            triggers[key] = datetime.datetime.fromisoformat(e["time"])
+
+    return triggers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--followers", type=int, default=2)
+    parser.add_argument("--games", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        directory = pathlib.Path(d)
+        cfg = _write_config(directory, args.games)
+
+        names = ["leader", *(f"follower{i}" for i in range(args.followers))]
+        procs = [
+            _start(
+                "leader",
+                cfg,
+                directory,
+                "--sync_leader",
+                f"127.0.0.1:{SYNC_PORT}",
+                "--control_port",
+                str(CONTROL_PORT),
+            ),
+            *(
+                _start(
+                    name, cfg, directory, "--sync_follower", f"127.0.0.1:{SYNC_PORT}"
+                )
+                for name in names[1:]
+            ),
+        ]
+
+        time.sleep(3)
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{CONTROL_PORT}/games/Game%201/delay",
+            data=json.dumps({"by": "2s"}).encode(),
+            method="POST",
+        )
+        urllib.request.urlopen(request).close()
+        print("Delayed Game 1 by 2s on the leader")
+
+        for p in procs:
+            p.wait(timeout=60 + args.games * 5)
+
+        triggers = {name: _read_triggers(directory / f"{name}.jsonl") for name in names}
+
+    spreads = []
+    for key, leader_time in sorted(triggers["leader"].items(), key=lambda kv: kv[1]):
+        times = [t[key] for t in triggers.values() if key in t]
+        if len(times) < len(names):
+            print(f"{key}: only triggered by {len(times)} of {len(names)} instances")
+            continue
+
+        spread = (max(times) - min(times)).total_seconds()
+        spreads.append(spread)
+        print(f"{leader_time:%H:%M:%S.%f} {key}: spread {spread * 1000:6.2f} ms")
+
+    if spreads:
+        print()
+        print(
+            f"spread between instances: median {statistics.median(spreads) * 1000:.2f} ms, max {max(spreads) * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Measures the memory used by the config and the generated tasks of a large schedule,
+# per task.
+#
+# Usage: python benchmarks/task_memory.py [--games N] [--jingles N]
+import argparse
+import gc
+import json
+import pathlib
+import tempfile
+import tracemalloc
+
+from config_load import _write_config
+
+from jingleplayer.configuration import Config
+from jingleplayer.execution.tasks import get_tasks
+
+
+def _add_jingles(file: pathlib.Path, n_jingles: int):
+    cfg = json.loads(file.read_text())
+    cfg["jingles"] = {
+        f"Jingle {i}": {
+            "audio_file": "jingle start.mp3",
+            "trigger": "game_start",
+            "offset": f"{i * 2}m",
+            # Jingles without actions use the default actions
+            **(
+                {"pre_actions": "pause playback; wait 2s", "actions": "play jingle"}
+                if i % 2
+                else {}
+            ),
+        }
+        for i in range(n_jingles)
+    }
+    file.write_text(json.dumps(cfg))
+
+
+def _measure(f):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    result = f()
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--jingles", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        file = _write_config(pathlib.Path(d), args.games)
+        _add_jingles(file, args.jingles)
+
+        # Audio durations are probed once before measuring, so that caches filled while
+        # probing are not counted
+        Config.load(str(file))
+
+        cfg, cfg_bytes = _measure(lambda: Config.load(str(file)))
+        tasks, task_bytes = _measure(lambda: get_tasks(cfg))
+
+    n = len(tasks)
+    print(f"{args.games} games, {args.jingles} jingles, {n} tasks")
+    print()
+    print(f"config: {cfg_bytes / 1024:10.1f} KiB ({cfg_bytes / n:7.1f} bytes per task)")
+    print(
+        f"tasks:  {task_bytes / 1024:10.1f} KiB ({task_bytes / n:7.1f} bytes per task)"
+    )
+    print(
+        f"total:  {(cfg_bytes + task_bytes) / 1024:10.1f} KiB ({(cfg_bytes + task_bytes) / n:7.1f} bytes per task)"
+    )
+
+
+if __name__ == "__main__":
+    main()
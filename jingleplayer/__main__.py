@@ -1,9 +1,21 @@
 import argparse
+import atexit
 import logging
+import logging.handlers
 import pathlib
+import queue
+import signal
 import sys
 
-from jingleplayer import execution, playback_control, testing
+from jingleplayer import (
+    audio,
+    events,
+    execution,
+    latency,
+    playback_control,
+    testing,
+    util,
+)
 from jingleplayer.configuration import Config
 from jingleplayer.playback_control.controllers import SpotifyDbusPlaybackController
 
@@ -18,6 +30,12 @@ def _parse_args():
         help="Path to the config file that should be loaded.",
     )
 
+    parser.add_argument(
+        "--games_csv",
+        type=str,
+        help="CSV file with additional games, one per row, e.g. exported from tournament software. The columns are name, start, end or duration, announcement_file and playlist (like the properties of games in the config file); other columns are ignored. Games from the CSV file are added after the games in the config file, which may also have no games at all.",
+    )
+
     parser.add_argument(
         "--playback_controller",
         "-p",
@@ -31,7 +49,15 @@ def _parse_args():
         "--info",
         "-i",
         action="store_true",
-        help="Show information about the provided configuration; i.e. list all games, jingles, and playlists in the specified configuration and how they are set up.",
+        help="Show information about the provided configuration; i.e. list all games, jingles, and playlists in the specified configuration and how they are set up. If numpy is installed, the loudness and peak level of all audio files is listed as well (this decodes the files into the audio cache, see --audio_cache).",
+    )
+
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=testing.INFO_FORMATS,
+        default="text",
+        help="Output format of --info. text (the default) is meant to be read. json (one array) and jsonl (one object per line) list every game, game series, jingle, playlist, audio file, and every task of the schedule, followed by warnings about them, with times in ISO format and durations in seconds; the records are written as they are created, so even very large schedules are listed quickly. summary only prints the counts, total audio time, smallest gap between two jingles (slack), and all warnings, as one JSON object. With a format other than text, all other messages are written to stderr.",
     )
 
     parser.add_argument(
@@ -55,6 +81,104 @@ def _parse_args():
         help="Has the same effect as passing --testaudio and --testplaybackcontrol.",
     )
 
+    parser.add_argument(
+        "--verify_audio",
+        action="store_true",
+        help="Fully decode all configured audio files (in parallel, without playing them) and check them for decoding errors, truncation, durations that differ from the ones used for scheduling, and mismatching sample rates or channel counts. Prints a summary and exits with a non-zero exit code if there are problems. Decoding formats other than WAV requires ffmpeg.",
+    )
+
+    parser.add_argument(
+        "--journal",
+        type=str,
+        help="File in which progress is recorded while jingles are played. If the program is restarted with the same journal (e.g. after a crash), jingles that were already played are skipped, a jingle that was interrupted is finished (see --resume_grace), and music playback is resumed if the interrupted run left it paused.",
+    )
+    parser.add_argument(
+        "--resume_grace",
+        type=str,
+        default="30s",
+        help="How long after its scheduled end a jingle that was interrupted (see --journal) is still finished after a restart. Default is 30s.",
+    )
+
+    parser.add_argument(
+        "--control_port",
+        type=int,
+        help="If set, a control API (HTTP/JSON) is served on this port on localhost while jingles are played. It can be used to see the upcoming jingles and the current state, and to delay games, insert additional jingles, or cancel jingles without restarting the program.",
+    )
+
+    sync_group = parser.add_mutually_exclusive_group()
+    sync_group.add_argument(
+        "--sync_leader",
+        type=str,
+        metavar="[HOST:]PORT",
+        help="Make this instance the leader of other instances (on other machines) that are started with --sync_follower. Followers run on the leader's clock and apply changes made through the leader's control API, so identical jingles trigger at the same time everywhere. HOST is the address to listen on, default is all addresses.",
+    )
+    sync_group.add_argument(
+        "--sync_follower",
+        type=str,
+        metavar="HOST:PORT",
+        help="Follow the instance started with --sync_leader at HOST:PORT. The follower should have the same config as the leader (apart from e.g. its audio files and playback controllers). If the connection is lost, it keeps running on the last known clock offset and reconnects.",
+    )
+
+    parser.add_argument(
+        "--timeline",
+        type=str,
+        help="File in which the upcoming jingles, with all their actions and absolute times, are kept while jingles are played, so displays and other programs can show them without loading the config. It is written when the program starts and changes made through the control API are appended to it. See the readme for the format.",
+    )
+    parser.add_argument(
+        "--export_timeline",
+        type=str,
+        nargs="+",
+        metavar="FILE",
+        help="Write all jingles, with all their actions and absolute times, to the given file(s) and exit. Files ending in .ics are written as calendars, other files in the JSON lines format of --timeline.",
+    )
+
+    parser.add_argument(
+        "--event_sink",
+        type=str,
+        action="append",
+        help="Where to send events (e.g. a jingle started or finished, or was skipped) to while jingles are played, as JSON objects: file:PATH appends them as lines to a file, unix:PATH writes them as lines to a Unix socket, and an http:// or https:// URL receives them in batches as POST requests with a JSON array. Can be passed multiple times. Events are sent in the background; if a sink can not keep up, events for it are dropped instead of delaying jingles.",
+    )
+
+    parser.add_argument(
+        "--audio_cache",
+        action="store_true",
+        help="Decode all configured audio files once and store them in a cache (see --audio_cache_dir) that is used for playback, so they do not need to be decoded each time they are played. Files are only decoded again when their content changes. Decoding formats other than WAV requires ffmpeg.",
+    )
+    parser.add_argument(
+        "--audio_cache_dir",
+        type=str,
+        help="Directory for --audio_cache. Default is a jingleplayer directory in the user's cache directory.",
+    )
+
+    parser.add_argument(
+        "--normalize_loudness",
+        type=float,
+        metavar="LUFS",
+        help="Adjust the volume of all configured audio files so that they have this integrated loudness (e.g. -16), so jingles and announcements play at matching volumes. Gains are limited so that files do not clip. Implies --audio_cache and requires numpy.",
+    )
+    parser.add_argument(
+        "--trim_silence",
+        action="store_true",
+        help="Remove silence at the start and end of all configured audio files when playing them. Jingles are scheduled with the shortened durations, so they end earlier and are less likely to overlap. Implies --audio_cache and requires numpy.",
+    )
+
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="While jingles are played, show a dashboard with the current and upcoming jingles, countdowns, the state of the music and how late triggers were, instead of printing messages line by line. Messages are shown at the bottom of the dashboard. Requires a terminal that supports ANSI escape sequences.",
+    )
+
+    parser.add_argument(
+        "--latency_compensation",
+        action="store_true",
+        help="Start audio playback and playback control actions early by their measured start-up latency, so that sound and music changes happen at the scheduled times. Latencies are measured while jingles are played (and with --calibrate_latency) and kept in the user's cache directory (see --audio_cache_dir) for the next run.",
+    )
+    parser.add_argument(
+        "--calibrate_latency",
+        action="store_true",
+        help="Measure the start-up latency of the audio backend (by playing short silent sounds) and of the playback controllers configured with --playback_controller (or -p) (by resuming and pausing playback a few times), print the estimates and store them for --latency_compensation.",
+    )
+
     parser.add_argument(
         "--logfile",
         type=str,
@@ -80,18 +204,36 @@ def _setup_logging(args: argparse.Namespace):
             )
         file.parent.mkdir(parents=True, exist_ok=True)
 
-        logging.basicConfig(
-            level=args.loglevel.upper(),
-            format="%(asctime)s %(levelname)s: %(message)s",
-            filename=str(file.resolve()),
-            filemode="w",
+        file_handler = logging.FileHandler(str(file.resolve()), mode="w")
+        file_handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
         )
+
+        # Records are only put into a queue on the logging thread and written to the
+        # file on the listener's thread, so a slow disk does not delay triggering
+        # jingles
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        # Writes the remaining records before exiting
+        atexit.register(listener.stop)
+
+        # Only merges the message and arguments, the file handler adds time and level
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        logging.basicConfig(level=args.loglevel.upper(), handlers=[queue_handler])
     else:
         logging.basicConfig(handlers=[logging.NullHandler()])
 
 
 args = _parse_args()
 
+# Only machine-readable info is written to stdout, so it can be piped into other tools
+info_out = sys.stdout
+if args.info and args.format != "text":
+    sys.stdout = sys.stderr
+
 _setup_logging(args)
 logger = logging.getLogger(__name__)
 logger.debug("Logging set up")
@@ -101,7 +243,7 @@ logger.debug("Logging set up")
 
 # Load config
 try:
-    cfg = Config.load(args.configfile)
+    cfg = Config.load(args.configfile, games_csv=args.games_csv)
 except Exception as exc:
     logger.exception("Exception occured while loading/parsing config:")
 
@@ -113,6 +255,71 @@ except Exception as exc:
     sys.exit(1)
 
 
+# Build audio cache, analyze audio files
+analyze_for_playback = args.normalize_loudness is not None or args.trim_silence
+use_cache = args.audio_cache or analyze_for_playback
+# Files are only decoded into the cache for showing their levels if they can be analyzed
+show_levels = (
+    args.info or args.test or args.testaudio
+) and audio.is_analysis_available()
+audio_levels = None
+gains = None
+trimmed = None
+
+if use_cache or show_levels:
+    try:
+        cache = audio.AudioCache(
+            pathlib.Path(args.audio_cache_dir) if args.audio_cache_dir else None
+        )
+
+        files = cfg.audio_files
+        if use_cache:
+            print(
+                f"Preparing audio cache for {len(files)} files in {cache.cache_dir} ..."
+            )
+        failed = cache.build(files)
+
+        if use_cache:
+            for f, exc in failed.items():
+                print(
+                    f'WARNING: "{f}" could not be cached and will be played directly: {exc}'
+                )
+            print()
+
+        if show_levels or analyze_for_playback:
+            try:
+                audio_levels = audio.analyze(cache, files - failed.keys())
+                audio_levels.update(failed)
+            except Exception as exc:
+                logger.exception("Exception occured while analyzing audio files:")
+
+                print(f"WARNING: Audio files could not be analyzed: {exc}")
+                print()
+
+        if args.trim_silence and audio_levels is not None:
+            trimmed = audio.trim_silence(cache, audio_levels)
+            print(f"Trimmed silence from {len(trimmed)} audio files.")
+            print()
+
+        if args.normalize_loudness is not None and audio_levels is not None:
+            gains = audio.normalize(cache, audio_levels, args.normalize_loudness)
+            print(
+                f"Normalized {len(gains)} audio files to {args.normalize_loudness:.1f} LUFS."
+            )
+            print()
+
+        if use_cache:
+            audio.set_active_cache(cache)
+    except Exception as exc:
+        logger.exception("Exception occured while building the audio cache:")
+
+        print(
+            "There was an unexpected problem while setting up the audio cache. Audio files will be played directly. The following message might be helpful."
+        )
+        print(str(exc))
+        print()
+
+
 # Set up playback controllers
 try:
     playback_controllers = playback_control.setup_from_cli(args.playback_controller)
@@ -127,7 +334,7 @@ try:
     if cfg.needs_spotify_dbus and not any(
         isinstance(pc, SpotifyDbusPlaybackController) for pc in playback_controllers
     ):
-        s = 'The loaded configuration has a switch playlist action configured. This only works with "-p spotify_dbus", which is not passed. Playlist control will not be available. Note that this is only available on linux systems and requires the sdbus package to be installed.'
+        s = 'The loaded configuration has a switch playlist or music ducking action configured. These only work with "-p spotify_dbus", which is not passed. Playlist and volume control will not be available. Note that this is only available on linux systems and requires the sdbus package to be installed.'
 
         logger.warning(s)
         print("WARNING: " + s)
@@ -144,29 +351,113 @@ except Exception as exc:
     sys.exit(1)
 
 
+# Set up event sinks
+try:
+    for sink_str in args.event_sink or ():
+        events.add_sink(events.parse_sink_str(sink_str))
+except Exception as exc:
+    logger.exception("Exception occured while parsing --event_sink option:")
+
+    print(
+        "There was an unexpected problem while parsing the --event_sink option. The following message might be helpful."
+    )
+    print(str(exc))
+
+    sys.exit(1)
+
+# Writes the remaining events before exiting
+atexit.register(events.stop)
+
+
+# Load latency estimates, store them again on exit
+if args.latency_compensation or args.calibrate_latency:
+    latency_file = (
+        pathlib.Path(args.audio_cache_dir)
+        if args.audio_cache_dir
+        else util.get_default_cache_dir()
+    ) / "latency.json"
+
+    latency.load(latency_file)
+    atexit.register(latency.save, latency_file)
+
+
 # Main
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+# Handle termination requests like Ctrl-C, so the journal is closed properly
+signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
 try:
     do_info = args.info
     do_ta = args.test or args.testaudio
     do_tpc = args.test or args.testplaybackcontrol
-    do_any_test = do_info or do_ta or do_tpc
+    do_verify = args.verify_audio
+    do_export = bool(args.export_timeline)
+    do_calibrate = args.calibrate_latency
+    do_any_test = do_info or do_ta or do_tpc or do_verify or do_export or do_calibrate
+
+    if do_info and args.format != "text":
+        testing.print_config_info(
+            cfg, args.format, audio_levels, gains, trimmed, out=info_out
+        )
 
     if do_ta:
-        testing.test_config(cfg, True)
+        testing.test_config(cfg, True, audio_levels, gains, trimmed)
         print()
         print()
-    elif do_info:
-        testing.test_config(cfg, False)
+    elif do_info and args.format == "text":
+        testing.test_config(cfg, False, audio_levels, gains, trimmed)
         print()
         print()
 
     if do_tpc:
         testing.test_playbackcontrol(playback_controllers)
 
+    if do_verify and not testing.verify_audio(cfg):
+        sys.exit(1)
+
+    if do_export:
+        tasks = execution.get_tasks(cfg)
+        for file in args.export_timeline:
+            execution.export_timeline(tasks, pathlib.Path(file))
+            print(f'Exported the timeline of {len(tasks)} jingles to "{file}".')
+        print()
+
+    if do_calibrate:
+        testing.calibrate_latency(playback_controllers)
+        print()
+
     if not do_any_test:
-        execution.schedule_and_run_jingles(cfg, playback_controllers)
+        execution.schedule_and_run_jingles(
+            cfg,
+            playback_controllers,
+            journal_file=pathlib.Path(args.journal) if args.journal else None,
+            resume_grace=util.parse_timedelta_str(args.resume_grace),
+            control_port=args.control_port,
+            timeline_file=pathlib.Path(args.timeline) if args.timeline else None,
+            sync_leader=(
+                execution.sync.parse_address(args.sync_leader, "0.0.0.0")
+                if args.sync_leader
+                else None
+            ),
+            sync_follower=(
+                execution.sync.parse_address(args.sync_follower)
+                if args.sync_follower
+                else None
+            ),
+            compensate_latency=args.latency_compensation,
+            dashboard=args.dashboard and sys.stdout.isatty(),
+        )
         print("No jingles left to play. Exiting program.")
 
+except KeyboardInterrupt:
+    logger.info("Interrupted, exiting")
+    print("Interrupted. Exiting program.")
+
+    sys.exit(130)
+
 except Exception as exc:
     logger.exception("Exception occured:")
 
@@ -0,0 +1,10 @@
+from .analysis import AudioAnalysis as AudioAnalysis
+from .analysis import analyze as analyze
+from .analysis import is_analysis_available as is_analysis_available
+from .analysis import normalize as normalize
+from .analysis import trim_silence as trim_silence
+from .cache import AudioCache as AudioCache
+from .cache import get_playback_duration as get_playback_duration
+from .cache import set_active_cache as set_active_cache
+from .playback import get_start_latency as get_start_latency
+from .playback import play_audiofile as play_audiofile
@@ -0,0 +1,388 @@
+import functools
+import importlib.util
+import json
+import logging
+import math
+import pathlib
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from . import cache
+from .cache import AudioCache, CacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the analysis changes, which invalidates previously cached results
+ANALYSIS_VERSION = 3
+
+# Gains are limited so that the sample peak stays below this level (dBFS)
+DEFAULT_PEAK_CEILING = -1.0
+
+# Block sizes and gates of the integrated loudness measurement (ITU-R BS.1770)
+_SUBBLOCK_S = 0.1
+_SUBBLOCKS_PER_BLOCK = 4
+_ABSOLUTE_GATE = -70.0
+_RELATIVE_GATE = -10.0
+
+# The K-weighting filter is applied as an FIR filter (its impulse response, which has
+# decayed to nothing long before this many taps) to chunks of this many frames, so the
+# memory used does not depend on the length of the file
+_K_WEIGHTING_TAPS = 1 << 13
+_K_WEIGHTING_FFT_SIZE = 1 << 16
+
+# Audio below this level (dBFS) at the start and end of a file counts as silence. Levels
+# are measured as the peak of short windows, so short pauses within the audio and quiet
+# fades are not cut off.
+SILENCE_THRESHOLD = -50.0
+_SILENCE_WINDOW_S = 0.01
+
+
+def is_analysis_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None
+
+
+def _import_numpy():
+    try:
+        import numpy
+
+        return numpy
+    except ImportError as e:
+        raise RuntimeError(
+            "Audio analysis requires the package numpy. Make sure it is installed and accessible"
+        ) from e
+
+
+@dataclass(frozen=True)
+class AudioAnalysis:
+    loudness: float  # integrated loudness in LUFS, -inf for silence
+    peak: float  # sample peak in dBFS, -inf for silence
+    # Bounds of the audio without leading/trailing silence and total length, in frames
+    audio_start: int
+    audio_end: int
+    frames: int
+
+    @property
+    def leading_silence(self) -> float:
+        return self.audio_start / cache.SAMPLE_RATE
+
+    @property
+    def trailing_silence(self) -> float:
+        return (self.frames - self.audio_end) / cache.SAMPLE_RATE
+
+    def get_gain(self, target: float, peak_ceiling: float = DEFAULT_PEAK_CEILING):
+        # Gain (dB) that brings the file to the target loudness without clipping
+        if math.isinf(self.loudness):
+            return 0.0
+
+        return min(target - self.loudness, peak_ceiling - self.peak)
+
+
+# region measurement
+def _load_samples(entry: CacheEntry):
+    np = _import_numpy()
+
+    pcm = np.frombuffer(entry.map_pcm(), dtype=np.int16)
+    return pcm.reshape(-1, cache.CHANNELS).astype(np.float32) / 32768
+
+
+def _k_weighting(n_fft: int, sample_rate: int):
+    # Frequency response of the K-weighting pre-filter (high shelf followed by high
+    # pass) at the bins of an rfft of length n_fft
+    np = _import_numpy()
+
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+    ]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    hp_b = [1.0, -2.0, 1.0]
+    hp_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    z = np.exp(-1j * np.pi * np.arange(n_fft // 2 + 1) / (n_fft // 2))
+
+    def response(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    return response(shelf_b, shelf_a) * response(hp_b, hp_a)
+
+
+@functools.cache
+def _k_weighting_fir(sample_rate: int):
+    # Frequency response of the truncated impulse response of the K-weighting filter,
+    # at the bins of an rfft of length _K_WEIGHTING_FFT_SIZE. Applying it in the
+    # frequency domain filters a whole chunk at once instead of running the recursive
+    # filter sample by sample.
+    np = _import_numpy()
+
+    # Sampled densely enough that the impulse response does not alias
+    n_ir = 4 * _K_WEIGHTING_FFT_SIZE
+    ir = np.fft.irfft(_k_weighting(n_ir, sample_rate), n=n_ir)[:_K_WEIGHTING_TAPS]
+    response = np.fft.rfft(ir, n=_K_WEIGHTING_FFT_SIZE).astype(np.complex64)
+
+    # Cached across threads, so it must not be modified
+    response.flags.writeable = False
+    return response
+
+
+def _iter_k_weighted(samples, sample_rate: int):
+    # Yields the K-weighted samples in chunks (overlap-save), each filtered together
+    # with the end of the previous chunk, so the filter runs on as if uninterrupted
+    np = _import_numpy()
+
+    response = _k_weighting_fir(sample_rate)[:, np.newaxis]
+    history = _K_WEIGHTING_TAPS - 1
+    hop = _K_WEIGHTING_FFT_SIZE - history
+
+    segment = np.zeros((_K_WEIGHTING_FFT_SIZE, samples.shape[1]), dtype=np.float32)
+    for start in range(0, len(samples), hop):
+        chunk = samples[start : start + hop]
+        segment[:history] = segment[-history:]
+        segment[history : history + len(chunk)] = chunk
+        segment[history + len(chunk) :] = 0
+
+        spectrum = np.fft.rfft(segment, axis=0)
+        spectrum *= response
+        yield np.fft.irfft(spectrum, n=_K_WEIGHTING_FFT_SIZE, axis=0)[
+            history : history + len(chunk)
+        ]
+
+
+def measure_loudness(samples, sample_rate: int = cache.SAMPLE_RATE) -> float:
+    np = _import_numpy()
+
+    if (n := len(samples)) == 0:
+        return -math.inf
+
+    # Mean squares of 100 ms sub-blocks, collected chunk by chunk (only the samples of
+    # an incomplete sub-block are carried over), then combined into overlapping 400 ms
+    # blocks
+    sub = int(sample_rate * _SUBBLOCK_S)
+    sub_powers = []
+    total_power = 0.0
+    rest = np.zeros((0, samples.shape[1]))
+    for weighted in _iter_k_weighted(samples, sample_rate):
+        squares = np.concatenate([rest, weighted.astype(np.float64) ** 2])
+        total_power += squares[len(rest) :].sum(axis=0)
+
+        n_sub = len(squares) // sub
+        sub_powers.append(
+            squares[: n_sub * sub].reshape(n_sub, sub, samples.shape[1]).mean(axis=1)
+        )
+        rest = squares[n_sub * sub :]
+
+    sub_powers = np.concatenate(sub_powers)
+    if len(sub_powers) < _SUBBLOCKS_PER_BLOCK:
+        powers = (total_power / n)[np.newaxis]
+    else:
+        powers = np.lib.stride_tricks.sliding_window_view(
+            sub_powers, _SUBBLOCKS_PER_BLOCK, axis=0
+        ).mean(axis=-1)
+
+    # All channels are weighted equally for stereo content
+    block_powers = powers.sum(axis=1)
+
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(block_powers)
+
+    gated = block_powers[block_loudness > _ABSOLUTE_GATE]
+    if len(gated) == 0:
+        return -math.inf
+
+    relative_gate = -0.691 + 10 * math.log10(gated.mean()) + _RELATIVE_GATE
+    gated = block_powers[
+        (block_loudness > _ABSOLUTE_GATE) & (block_loudness > relative_gate)
+    ]
+
+    return float(-0.691 + 10 * math.log10(gated.mean()))
+
+
+def measure_peak(samples) -> float:
+    np = _import_numpy()
+
+    if len(samples) == 0 or (peak := float(np.abs(samples).max())) == 0:
+        return -math.inf
+
+    return 20 * math.log10(peak)
+
+
+def find_audio_bounds(
+    samples, threshold: float = SILENCE_THRESHOLD, sample_rate: int = cache.SAMPLE_RATE
+) -> tuple[int, int]:
+    # Frames from which to which the level is above threshold, (0, 0) for silence
+    np = _import_numpy()
+
+    window = int(sample_rate * _SILENCE_WINDOW_S)
+    n_windows = -(-len(samples) // window)
+
+    levels = np.zeros(n_windows * window, dtype=np.float32)
+    levels[: len(samples)] = np.abs(samples).max(axis=1, initial=0)
+    window_peaks = levels.reshape(n_windows, window).max(axis=1)
+
+    loud = np.flatnonzero(window_peaks > 10 ** (threshold / 20))
+    if len(loud) == 0:
+        return 0, 0
+
+    return int(loud[0]) * window, min(len(samples), (int(loud[-1]) + 1) * window)
+
+
+def _analyze_entry(entry: CacheEntry) -> AudioAnalysis:
+    samples = _load_samples(entry)
+    audio_start, audio_end = find_audio_bounds(samples)
+
+    return AudioAnalysis(
+        loudness=measure_loudness(samples),
+        peak=measure_peak(samples),
+        audio_start=audio_start,
+        audio_end=audio_end,
+        frames=len(samples),
+    )
+
+
+# endregion
+
+
+# region cached analysis
+def _get_result_file(ac: AudioCache, entry: CacheEntry) -> pathlib.Path:
+    return ac.cache_dir / f"{entry.content_hash}.analysis.json"
+
+
+def _load_result(file: pathlib.Path) -> AudioAnalysis | None:
+    try:
+        data = json.loads(file.read_text())
+    except (OSError, ValueError):
+        return None
+
+    if data.pop("version", None) != ANALYSIS_VERSION:
+        return None
+
+    try:
+        return AudioAnalysis(**data)
+    except TypeError:
+        return None
+
+
+def analyze_file(ac: AudioCache, file: pathlib.Path) -> AudioAnalysis:
+    if (entry := ac.get(file)) is None:
+        entry = ac.add(file)
+
+    result_file = _get_result_file(ac, entry)
+    if (result := _load_result(result_file)) is not None:
+        return result
+
+    logger.info('Analyzing "%s"', entry.source)
+    result = _analyze_entry(entry)
+
+    tmp = result_file.with_name(f".{result_file.name}.tmp")
+    tmp.write_text(json.dumps({"version": ANALYSIS_VERSION, **asdict(result)}))
+    tmp.replace(result_file)
+
+    return result
+
+
+def analyze(
+    ac: AudioCache, files: Iterable[pathlib.Path], max_workers: int | None = None
+) -> dict[pathlib.Path, AudioAnalysis | Exception]:
+    # NumPy releases the GIL for the FFTs and array operations, so files are analyzed
+    # in parallel on threads
+    _import_numpy()
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="audio-analysis") as pool:
+        futures = {f: pool.submit(analyze_file, ac, f) for f in set(files)}
+
+    results: dict[pathlib.Path, AudioAnalysis | Exception] = {}
+    for f, fut in futures.items():
+        if (exc := fut.exception()) is not None:
+            logger.warning('Could not analyze "%s": %s', f, exc)
+            results[f] = exc
+        else:
+            results[f] = fut.result()
+
+    return results
+
+
+# endregion
+
+
+# region processing
+def _trim(start: int, end: int):
+    def process(entry: CacheEntry, target: pathlib.Path):
+        frame_size = cache.CHANNELS * cache.SAMPLE_WIDTH
+        cache.write_wav(
+            target, [entry.map_pcm()[start * frame_size : end * frame_size]]
+        )
+
+    return process
+
+
+def trim_silence(
+    ac: AudioCache, results: dict[pathlib.Path, AudioAnalysis | Exception]
+) -> dict[pathlib.Path, tuple[float, float]]:
+    # Replaces the cache entries of the analyzed files with versions without leading
+    # and trailing silence. Returns the removed silence (s) at the start and end.
+    trimmed: dict[pathlib.Path, tuple[float, float]] = {}
+
+    for f, result in results.items():
+        if isinstance(result, Exception) or result.audio_end == 0:
+            continue
+
+        if result.audio_start == 0 and result.audio_end == result.frames:
+            continue
+
+        ac.derive(
+            f,
+            f"trim{result.audio_start}-{result.audio_end}",
+            _trim(result.audio_start, result.audio_end),
+        )
+        trimmed[f] = (result.leading_silence, result.trailing_silence)
+
+    return trimmed
+
+
+def _apply_gain(gain: float):
+    def process(entry: CacheEntry, target: pathlib.Path):
+        np = _import_numpy()
+
+        pcm = np.frombuffer(entry.map_pcm(), dtype=np.int16).astype(np.float32)
+        pcm *= 10 ** (gain / 20)
+        np.clip(pcm, -32768, 32767, out=pcm)
+
+        cache.write_wav(target, [np.rint(pcm).astype(np.int16).tobytes()])
+
+    return process
+
+
+def normalize(
+    ac: AudioCache,
+    results: dict[pathlib.Path, AudioAnalysis | Exception],
+    target: float,
+    peak_ceiling: float = DEFAULT_PEAK_CEILING,
+) -> dict[pathlib.Path, float]:
+    # Replaces the cache entries of the analyzed files with versions at the target
+    # loudness, so they are used for playback (and rendering)
+    gains: dict[pathlib.Path, float] = {}
+
+    for f, result in results.items():
+        if isinstance(result, Exception):
+            continue
+
+        gain = round(result.get_gain(target, peak_ceiling), 1)
+        if gain != 0:
+            ac.derive(f, f"gain{gain:+.1f}dB", _apply_gain(gain))
+
+        gains[f] = gain
+
+    return gains
+
+
+# endregion
@@ -0,0 +1,277 @@
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import pathlib
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from jingleplayer import util
+
+logger = logging.getLogger(__name__)
+
+# All cached audio is decoded to the same format, so cached files can be played without
+# any decoding and combined without resampling
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2  # bytes, i.e. signed 16 bit PCM
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_content_hash(file: pathlib.Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+
+    with file.open("rb") as fs:
+        while chunk := fs.read(_HASH_CHUNK_SIZE):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+# region wav files
+def _is_canonical_wav(file: pathlib.Path) -> bool:
+    try:
+        with wave.open(str(file), "rb") as w:
+            return (
+                w.getframerate() == SAMPLE_RATE
+                and w.getnchannels() == CHANNELS
+                and w.getsampwidth() == SAMPLE_WIDTH
+            )
+    except (wave.Error, EOFError):
+        return False
+
+
+def find_pcm_data(buf) -> tuple[int, int]:
+    # Returns offset and length of the sample data in a RIFF/WAVE file
+    if buf[0:4] != b"RIFF" or buf[8:12] != b"WAVE":
+        raise ValueError("Not a WAVE file")
+
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id = bytes(buf[pos : pos + 4])
+        (size,) = struct.unpack_from("<I", buf, pos + 4)
+
+        if chunk_id == b"data":
+            return pos + 8, min(size, len(buf) - pos - 8)
+
+        pos += 8 + size + (size & 1)
+
+    raise ValueError("WAVE file has no data chunk")
+
+
+def write_wav(target: pathlib.Path, chunks: Iterable[bytes | memoryview]):
+    # Writes PCM chunks in the cache's format; readers never see a partial file
+    tmp = target.with_name(f".{target.name}.{threading.get_ident()}.tmp")
+
+    try:
+        with wave.open(str(tmp), "wb") as w:
+            w.setnchannels(CHANNELS)
+            w.setsampwidth(SAMPLE_WIDTH)
+            w.setframerate(SAMPLE_RATE)
+
+            for chunk in chunks:
+                w.writeframesraw(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp, target)
+
+
+# endregion
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    source: pathlib.Path
+    content_hash: str
+    path: pathlib.Path
+
+    @functools.cached_property
+    def frames(self) -> int:
+        with wave.open(str(self.path), "rb") as w:
+            return w.getnframes()
+
+    @property
+    def duration(self) -> timedelta:
+        return timedelta(seconds=self.frames / SAMPLE_RATE)
+
+    def map_pcm(self) -> memoryview:
+        # Maps the file into memory and returns its sample data without copying it.
+        # The mapping stays alive for as long as the returned view is referenced.
+        with self.path.open("rb") as fs:
+            mm = mmap.mmap(fs.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset, length = find_pcm_data(mm)
+        return memoryview(mm)[offset : offset + length]
+
+
+class AudioCache:
+    # Content-addressed store of audio files decoded to PCM WAV files. Entries are named
+    # after the hash of the source file's content, so editing a file invalidates its entry
+    # and identical files share one. Decoding (other than copying WAV files that are
+    # already in the right format) requires ffmpeg.
+    def __init__(self, cache_dir: pathlib.Path | None = None):
+        self.cache_dir = cache_dir or util.get_default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._ffmpeg = shutil.which("ffmpeg")
+        self._entries: dict[pathlib.Path, CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def _decode(self, source: pathlib.Path, target: pathlib.Path):
+        # Written to a temporary file first, so an interrupted write never leaves a
+        # partial file behind that would be taken for a cache hit
+        tmp = target.with_name(f".{target.name}.{threading.get_ident()}.tmp")
+
+        if not self._ffmpeg and not _is_canonical_wav(source):
+            raise RuntimeError(
+                f'Decoding "{source}" requires ffmpeg, which could not be found'
+            )
+
+        try:
+            self._write_decoded(source, tmp)
+        except BaseException:
+            # A failed decode must not leave its (partial) temporary file behind
+            tmp.unlink(missing_ok=True)
+            raise
+
+        os.replace(tmp, target)
+
+    def _write_decoded(self, source: pathlib.Path, tmp: pathlib.Path):
+        if _is_canonical_wav(source):
+            shutil.copyfile(source, tmp)
+            return
+
+        subprocess.run(
+            [
+                self._ffmpeg,
+                "-nostdin",
+                "-v",
+                "error",
+                "-y",
+                "-i",
+                str(source),
+                "-map",
+                "0:a:0",
+                "-ac",
+                str(CHANNELS),
+                "-ar",
+                str(SAMPLE_RATE),
+                "-c:a",
+                "pcm_s16le",
+                "-fflags",
+                "+bitexact",
+                "-f",
+                "wav",
+                str(tmp),
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+    def add(self, file: pathlib.Path) -> CacheEntry:
+        source = file.resolve()
+
+        content_hash = get_content_hash(source)
+        path = self.cache_dir / f"{content_hash}.wav"
+
+        if path.is_file():
+            logger.debug('Cache hit for "%s": %s', source, path)
+        else:
+            logger.info('Decoding "%s" into cache (%s)', source, path)
+            self._decode(source, path)
+
+        entry = CacheEntry(source, content_hash, path)
+        with self._lock:
+            # Stored under the path as given as well, to avoid resolving it on lookups
+            self._entries[source] = entry
+            self._entries[file] = entry
+
+        return entry
+
+    def build(self, files: Iterable[pathlib.Path], max_workers: int | None = None):
+        # Decoding happens in ffmpeg subprocesses and hashing releases the GIL, so
+        # threads are enough to use all cores
+        files = set(files)
+
+        failed: dict[pathlib.Path, Exception] = {}
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="audio-cache") as pool:
+            futures = {f: pool.submit(self.add, f) for f in files}
+
+            for f, fut in futures.items():
+                if (exc := fut.exception()) is not None:
+                    logger.warning('Could not add "%s" to the audio cache: %s', f, exc)
+                    failed[f] = exc
+
+        logger.info(
+            "Audio cache built: %s of %s files cached",
+            len(files) - len(failed),
+            len(files),
+        )
+        return failed
+
+    def derive(
+        self,
+        source: pathlib.Path,
+        name: str,
+        process: Callable[[CacheEntry, pathlib.Path], None],
+    ) -> CacheEntry:
+        # Replaces the entry of source with a processed version of it (e.g. with a gain
+        # applied), which process writes to the given path if it is not cached yet.
+        # name must identify the processing, as it is part of the derived entry's key.
+        if (entry := self.get(source)) is None:
+            raise KeyError(f'"{source}" is not in the audio cache')
+
+        content_hash = f"{entry.content_hash}-{name}"
+        path = self.cache_dir / f"{content_hash}.wav"
+
+        if not path.is_file():
+            logger.info('Deriving "%s" version of "%s" (%s)', name, entry.source, path)
+            process(entry, path)
+
+        derived = CacheEntry(entry.source, content_hash, path)
+        with self._lock:
+            for key, e in self._entries.items():
+                if e is entry:
+                    self._entries[key] = derived
+
+        return derived
+
+    def get(self, source: pathlib.Path) -> CacheEntry | None:
+        if (entry := self._entries.get(source)) is not None:
+            return entry
+
+        return self._entries.get(source.resolve())
+
+    def playback_file(self, source: pathlib.Path) -> pathlib.Path:
+        if entry := self.get(source):
+            return entry.path
+
+        return source
+
+
+ACTIVE_CACHE: AudioCache | None = None
+
+
+def get_playback_duration(file: pathlib.Path, probed: timedelta) -> timedelta:
+    # Length of what is actually played for file: decoded files are measured in samples
+    # (and may be trimmed), otherwise the duration probed from the file is used
+    if ACTIVE_CACHE is not None and (entry := ACTIVE_CACHE.get(file)) is not None:
+        return entry.duration
+
+    return probed
+
+
+def set_active_cache(cache: AudioCache | None):
+    global ACTIVE_CACHE
+    ACTIVE_CACHE = cache
@@ -0,0 +1,173 @@
+import logging
+import pathlib
+import subprocess
+import threading
+import time
+from datetime import timedelta
+
+import playsound3
+
+from jingleplayer import latency, metrics, util
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Playback legitimately takes a bit longer than the probed duration (backend start-up,
+# rounding), so the deadline is the probed duration scaled by this factor plus the margin
+DEADLINE_FACTOR = 1.1
+DEADLINE_MARGIN = timedelta(seconds=3)
+
+# After this many consecutive failures, the next available backend is used instead
+MAX_CONSECUTIVE_FAILURES = 2
+
+_KILL_GRACE_S = 1.0
+_POLL_INTERVAL_S = 0.05
+
+
+class PlaybackSupervisor:
+    def __init__(self, backends: list[str] | None = None):
+        if backends is None:
+            backends = list(playsound3.AVAILABLE_BACKENDS)
+
+        self._backends = backends
+        self._backend_idx = 0
+        self._consecutive_failures = 0
+
+        # Several branches of a parallel action may play at the same time
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> str | None:
+        # None lets playsound3 fall back to its own backend selection
+        if self._backends:
+            return self._backends[self._backend_idx]
+
+        return None
+
+    def get_start_latency(self) -> float:
+        return latency.get(latency.audio_key(self.backend))
+
+    def get_timeout(self, expected_duration: timedelta) -> timedelta:
+        return expected_duration * DEADLINE_FACTOR + DEADLINE_MARGIN
+
+    def play(
+        self, file: pathlib.Path, expected_duration: timedelta | None = None
+    ) -> bool:
+        if expected_duration is None:
+            expected_duration = util.get_audiofile_duration(file)
+
+        timeout = self.get_timeout(expected_duration)
+        backend = self.backend
+
+        if cache.ACTIVE_CACHE is not None:
+            file = cache.ACTIVE_CACHE.playback_file(file)
+
+        logger.debug(
+            'Playing sound file "%s" with backend %s (timeout: %s)',
+            file,
+            backend,
+            timeout,
+        )
+
+        started = time.monotonic()
+        try:
+            sound = playsound3.playsound(file, block=False, backend=backend)
+        except Exception:
+            logger.exception('Backend %s failed to play "%s"', backend, file)
+            metrics.increment("watchdog.playback_errors")
+            self._record_failure(backend)
+            return False
+
+        if not self._wait(sound, started + timeout.total_seconds()):
+            logger.warning(
+                'Watchdog: playback of "%s" with backend %s did not finish within %s, killing it',
+                file,
+                backend,
+                timeout,
+            )
+            metrics.increment("watchdog.playback_timeouts")
+            self._kill(sound)
+            self._record_failure(backend)
+            return False
+
+        elapsed = time.monotonic() - started
+        overrun = elapsed - expected_duration.total_seconds()
+        metrics.observe("playback.overrun_s", overrun)
+        # Most of the overrun is the time the backend needs to start up (and open the
+        # audio device) before the sound comes out
+        latency.observe(latency.audio_key(backend), max(0.0, overrun))
+
+        with self._lock:
+            self._consecutive_failures = 0
+
+        return True
+
+    def _wait(self, sound: playsound3.playsound3.Sound, deadline: float) -> bool:
+        proc = sound.subprocess
+
+        if isinstance(proc, subprocess.Popen):
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+
+        # Non-subprocess backends (Windows, macOS) can only be polled
+        while sound.is_alive():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            time.sleep(min(remaining, _POLL_INTERVAL_S))
+
+        return True
+
+    def _kill(self, sound: playsound3.playsound3.Sound):
+        try:
+            sound.stop()
+
+            proc = sound.subprocess
+            if isinstance(proc, subprocess.Popen):
+                try:
+                    proc.wait(timeout=_KILL_GRACE_S)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    logger.warning("Watchdog: sent SIGKILL to backend pid %s", proc.pid)
+        except Exception:
+            logger.exception("Watchdog: failed to stop hung playback")
+
+    def _record_failure(self, backend: str | None):
+        with self._lock:
+            self._consecutive_failures += 1
+
+            if (
+                self._consecutive_failures < MAX_CONSECUTIVE_FAILURES
+                or len(self._backends) < 2
+            ):
+                return
+
+            # Restart playback on a different backend; a fresh subprocess of the hung one
+            # is tried again once all others have failed as well
+            self._backend_idx = (self._backend_idx + 1) % len(self._backends)
+            self._consecutive_failures = 0
+            new_backend = self._backends[self._backend_idx]
+
+        logger.warning(
+            "Watchdog: backend %s failed %s times in a row, switching to %s",
+            backend,
+            MAX_CONSECUTIVE_FAILURES,
+            new_backend,
+        )
+        metrics.increment("watchdog.backend_switches")
+
+
+SUPERVISOR = PlaybackSupervisor()
+
+
+def play_audiofile(file: pathlib.Path, expected_duration: timedelta | None = None):
+    return SUPERVISOR.play(file, expected_duration)
+
+
+def get_start_latency() -> float:
+    return SUPERVISOR.get_start_latency()
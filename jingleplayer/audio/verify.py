@@ -0,0 +1,224 @@
+import logging
+import pathlib
+import re
+import shutil
+import subprocess
+import tempfile
+import wave
+from collections import Counter
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import tinytag
+
+logger = logging.getLogger(__name__)
+
+# Decoded and probed durations may differ this much (s) without being reported
+DURATION_TOLERANCE = 0.25
+
+# Decoded audio is only counted, so it is decoded to a low rate to keep the pipe small
+_COUNT_RATE = 8000
+_READ_CHUNK_SIZE = 1 << 16
+
+_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: .*?, (\d+) Hz, ([^,]+)")
+_ERROR_RE = re.compile(r".*?\[(?:error|fatal)\] (.*)")
+_CHANNEL_LAYOUTS = {
+    "mono": 1,
+    "stereo": 2,
+    "2.1": 3,
+    "quad": 4,
+    "5.0": 5,
+    "5.1": 6,
+    "6.1": 7,
+    "7.1": 8,
+}
+
+
+@dataclass
+class VerificationResult:
+    file: pathlib.Path
+    # From the file's header/metadata (tinytag), as used for scheduling
+    probed_duration: float | None = None
+    probed_sample_rate: int | None = None
+    probed_channels: int | None = None
+    # From fully decoding the file
+    decoded_duration: float | None = None
+    sample_rate: int | None = None
+    channels: int | None = None
+    problems: list[str] = field(default_factory=list)
+    # Noteworthy, but not necessarily wrong
+    warnings: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def _parse_channels(layout: str) -> int | None:
+    layout = layout.strip().split("(")[0]
+
+    if (n := _CHANNEL_LAYOUTS.get(layout)) is not None:
+        return n
+
+    if m := re.match(r"(\d+) channels", layout):
+        return int(m.group(1))
+
+    return None
+
+
+def _decode_ffmpeg(ffmpeg: str, result: VerificationResult):
+    # The decoded audio is only counted as it is read from the pipe, so it is never held
+    # in memory. The log goes to a temporary file, so neither pipe can fill up.
+    with tempfile.TemporaryFile() as log_fs:
+        with subprocess.Popen(
+            [
+                ffmpeg,
+                "-hide_banner",
+                "-nostdin",
+                "-loglevel",
+                "repeat+level+info",
+                "-i",
+                str(result.file),
+                "-map",
+                "0:a:0",
+                "-ac",
+                "1",
+                "-ar",
+                str(_COUNT_RATE),
+                "-f",
+                "s16le",
+                "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=log_fs,
+        ) as proc:
+            n_bytes = 0
+            while chunk := proc.stdout.read(_READ_CHUNK_SIZE):
+                n_bytes += len(chunk)
+
+        log_fs.seek(0)
+        log = log_fs.read().decode(errors="replace").splitlines()
+
+    input_log = []
+    for line in log:
+        if line.startswith("[info] Output #"):
+            break
+        input_log.append(line)
+
+    if m := _STREAM_RE.search("\n".join(input_log)):
+        result.sample_rate = int(m.group(1))
+        result.channels = _parse_channels(m.group(2))
+
+    errors = [m.group(1) for line in log if (m := _ERROR_RE.match(line))]
+    if proc.returncode != 0 or errors:
+        # Decoders log one line per broken frame, the first few are enough
+        details = "; ".join(errors[:3])
+        result.problems.append(
+            f"decoding errors ({len(errors)}): {details}"
+            if errors
+            else f"ffmpeg failed with exit code {proc.returncode}"
+        )
+
+    if proc.returncode == 0:
+        result.decoded_duration = n_bytes / 2 / _COUNT_RATE
+
+
+def _decode_wav(result: VerificationResult):
+    try:
+        with wave.open(str(result.file), "rb") as w:
+            result.sample_rate = w.getframerate()
+            result.channels = w.getnchannels()
+            frame_size = w.getsampwidth() * w.getnchannels()
+
+            declared = w.getnframes()
+            data = w.readframes(declared)
+    except (wave.Error, EOFError) as exc:
+        result.problems.append(f"invalid WAV file: {exc}")
+        return
+
+    frames = len(data) // frame_size
+    result.decoded_duration = frames / result.sample_rate
+
+    if frames < declared:
+        result.problems.append(
+            f"truncated: header declares {declared} frames, but only {frames} are present"
+        )
+
+
+def verify_file(file: pathlib.Path, ffmpeg: str | None) -> VerificationResult:
+    result = VerificationResult(file)
+
+    if not file.is_file():
+        result.problems.append("file does not exist")
+        return result
+
+    try:
+        tag = tinytag.TinyTag.get(file, tags=False, duration=True)
+        result.probed_duration = tag.duration
+        result.probed_sample_rate = tag.samplerate
+        result.probed_channels = tag.channels
+    except (tinytag.TinyTagException, OSError) as exc:
+        result.problems.append(f"metadata could not be read: {exc}")
+
+    if ffmpeg:
+        _decode_ffmpeg(ffmpeg, result)
+    elif file.suffix.lower() == ".wav":
+        _decode_wav(result)
+    else:
+        result.problems.append("can not be decoded without ffmpeg")
+        return result
+
+    if result.decoded_duration is not None:
+        if result.decoded_duration == 0:
+            result.problems.append("contains no audio")
+        elif (
+            result.probed_duration is not None
+            and abs(result.decoded_duration - result.probed_duration)
+            > DURATION_TOLERANCE
+        ):
+            result.problems.append(
+                f"decoded duration differs from the probed duration by {result.decoded_duration - result.probed_duration:+.2f}s"
+            )
+
+    if result.probed_sample_rate and result.sample_rate != result.probed_sample_rate:
+        result.problems.append(
+            f"sample rate in the header ({result.probed_sample_rate} Hz) does not match the decoded stream"
+        )
+    if result.probed_channels and result.channels != result.probed_channels:
+        result.problems.append(
+            f"channel count in the header ({result.probed_channels}) does not match the decoded stream"
+        )
+
+    return result
+
+
+def verify_files(
+    files: Iterable[pathlib.Path], max_workers: int | None = None
+) -> list[VerificationResult]:
+    # Decoding happens in ffmpeg subprocesses (or is I/O bound for WAV files), so
+    # threads are enough to decode files in parallel
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        logger.warning("ffmpeg not found, only WAV files can be verified")
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="audio-verify") as pool:
+        results = list(pool.map(lambda f: verify_file(f, ffmpeg), sorted(set(files))))
+
+    # Files that differ from the rest in format are often exported with wrong settings
+    formats = Counter(
+        (r.sample_rate, r.channels) for r in results if r.sample_rate is not None
+    )
+    if len(formats) > 1:
+        (rate, channels), _ = formats.most_common(1)[0]
+
+        for r in results:
+            if r.sample_rate is not None and (r.sample_rate, r.channels) != (
+                rate,
+                channels,
+            ):
+                r.warnings.append(
+                    f"format differs from most other files ({rate} Hz, {channels} channels)"
+                )
+
+    return results
@@ -1,6 +1,11 @@
 import abc
+import functools
 import logging
+import pathlib
+import re
+from collections.abc import Callable, Iterable, Iterator
 from datetime import timedelta
+from typing import ClassVar
 
 import humanize
 
@@ -15,55 +20,154 @@ class ActionBase(abc.ABC):
     def get_description_str(self) -> str:
         pass
 
+    def walk(self) -> Iterator["ActionBase"]:
+        # Yields this action and all actions nested in it
+        yield self
 
-class NothingAction(ActionBase):
+
+class StatelessAction(ActionBase):
+    # Actions without parameters can not differ from each other, so all uses of such an
+    # action share one instance per class
+    def __new__(cls):
+        if (instance := cls.__dict__.get("_instance")) is None:
+            instance = super().__new__(cls)
+            cls._instance = instance
+
+        return instance
+
+
+class NothingAction(StatelessAction):
     def get_description_str(self):
         return "do nothing"
 
 
 class DelayAction(ActionBase):
-    def __init__(self, duration: timedelta):
-        super().__init__()
+    # Delays are interned, i.e. all delays of the same duration are the same instance
+    _interned: ClassVar[dict[tuple[type, timedelta], "DelayAction"]] = {}
+
+    duration: timedelta
+
+    def __new__(cls, duration: timedelta):
+        if (instance := DelayAction._interned.get((cls, duration))) is not None:
+            return instance
 
         if duration < util.ZERO_TD:
             raise ValueError("Delay must be positive (or 0)")
 
-        self.duration = duration
+        instance = super().__new__(cls)
+        instance.duration = duration
+        return DelayAction._interned.setdefault((cls, duration), instance)
 
     def get_description_str(self):
         return f"wait {humanize.precisedelta(self.duration)}"
 
 
-class PausePlaybackAction(ActionBase):
+class PausePlaybackAction(StatelessAction):
     def get_description_str(self):
         return "pause playback"
 
 
-class ResumePlaybackAction(ActionBase):
+class ResumePlaybackAction(StatelessAction):
     def get_description_str(self):
         return "resume playback"
 
 
-class PlayJingleAction(ActionBase):
+class PlayJingleAction(StatelessAction):
     def get_description_str(self):
         return "play jingle"
 
 
-class AnnounceGameAction(ActionBase):
+class AnnounceGameAction(StatelessAction):
     def get_description_str(self):
         return "announce game"
 
 
-class SwitchToGamePlaylistAction(ActionBase):
+class SwitchToGamePlaylistAction(StatelessAction):
     def get_description_str(self):
         return "switch to game playlist"
 
 
-class AnnounceGamePlaylistAction(ActionBase):
+class AnnounceGamePlaylistAction(StatelessAction):
     def get_description_str(self):
         return "announce game playlist"
 
 
+# Ducking lowers the volume of the music to this fraction over this time by default
+DEFAULT_DUCK_VOLUME = 0.2
+DEFAULT_RAMP = timedelta(seconds=1)
+
+
+class DuckMusicAction(ActionBase):
+    def __init__(
+        self, volume: float = DEFAULT_DUCK_VOLUME, ramp: timedelta = DEFAULT_RAMP
+    ) -> None:
+        super().__init__()
+
+        if not 0 <= volume <= 1:
+            raise ValueError("Ducking volume must be between 0% and 100%")
+        if ramp < util.ZERO_TD:
+            raise ValueError("Ramp must be positive (or 0)")
+
+        self.volume = volume
+        self.ramp = ramp
+
+    def get_description_str(self):
+        return (
+            f"duck music to {self.volume:.0%} over {humanize.precisedelta(self.ramp)}"
+        )
+
+
+class RestoreMusicAction(ActionBase):
+    def __init__(self, ramp: timedelta = DEFAULT_RAMP) -> None:
+        super().__init__()
+
+        if ramp < util.ZERO_TD:
+            raise ValueError("Ramp must be positive (or 0)")
+
+        self.ramp = ramp
+
+    def get_description_str(self):
+        return f"restore music over {humanize.precisedelta(self.ramp)}"
+
+
+class ParallelAction(ActionBase):
+    def __init__(self, branches: Iterable[ActionBase]) -> None:
+        super().__init__()
+
+        self.branches = tuple(branches)
+
+        if len(self.branches) < 2:
+            raise ValueError("Parallel actions need at least two branches")
+
+    def get_description_str(self):
+        return "[" + " & ".join(b.get_description_str() for b in self.branches) + "]"
+
+    def walk(self):
+        yield self
+        for b in self.branches:
+            yield from b.walk()
+
+
+class PlayRenderedAudioAction(ActionBase):
+    # Created when rendering an action group (see execution/render.py), not from
+    # configuration. Plays one file that contains the audio of all parts.
+    def __init__(
+        self, file: pathlib.Path, duration: timedelta, parts: Iterable[ActionBase]
+    ) -> None:
+        super().__init__()
+        self.file = file
+        self.duration = duration
+        self.parts = tuple(parts)
+
+    def get_description_str(self):
+        return "(" + " -> ".join(p.get_description_str() for p in self.parts) + ")"
+
+    def walk(self):
+        yield self
+        for p in self.parts:
+            yield from p.walk()
+
+
 type Action = (
     NothingAction
     | DelayAction
@@ -73,25 +177,62 @@ type Action = (
     | AnnounceGameAction
     | SwitchToGamePlaylistAction
     | AnnounceGamePlaylistAction
+    | DuckMusicAction
+    | RestoreMusicAction
+    | ParallelAction
+    | PlayRenderedAudioAction
 )
 
 
 class ActionGroup(ActionBase):
-    def __init__(self, actions: list[Action]) -> None:
+    # Action groups are immutable, so equal groups can be shared between jingles
+    def __init__(self, actions: Iterable[Action]) -> None:
         super().__init__()
-        self.actions = actions
+        self.actions = tuple(actions)
 
     def get_description_str(self):
         return " -> ".join((a.get_description_str() for a in self.actions))
 
+    def walk(self):
+        yield self
+        for a in self.actions:
+            yield from a.walk()
+
     def includes(self, action_type: type[Action]):
-        return any((isinstance(child, action_type) for child in self.actions))
+        return any(
+            isinstance(child, action_type) for a in self.actions for child in a.walk()
+        )
 
 
 # endregion
 
 
 # region parsing
+_EXTRA_PARSERS: list[Callable[[str], ActionBase | None]] = []
+
+_DUCK_RE = re.compile(
+    r"duck music(?:\s+to\s+(?P<volume>\d+(?:\.\d+)?)\s*%)?(?:\s+over\s+(?P<ramp>.+))?"
+)
+_RESTORE_RE = re.compile(r"restore music(?:\s+over\s+(?P<ramp>.+))?")
+
+
+def _parse_ramp(s: str | None) -> timedelta:
+    if s is None:
+        return DEFAULT_RAMP
+
+    try:
+        return util.parse_timedelta_str(s.strip())
+    except Exception as e:
+        raise ValueError(f'Invalid ramp specification "{s}"') from e
+
+
+def register_action_parser(parser: Callable[[str], ActionBase | None]):
+    _EXTRA_PARSERS.append(parser)
+
+    # Strings parsed before may have a different meaning now
+    parse_action_group_str.cache_clear()
+
+
 def parse_action_str(s: str) -> Action:
     match s.strip():
         case "nothing" | "" | "do nothing":
@@ -125,14 +266,38 @@ def parse_action_str(s: str) -> Action:
         case "announce game playlist":
             return AnnounceGamePlaylistAction()
 
-        case _:
+        case s if m := _DUCK_RE.fullmatch(s):
+            volume = m["volume"]
+            return DuckMusicAction(
+                DEFAULT_DUCK_VOLUME if volume is None else float(volume) / 100,
+                _parse_ramp(m["ramp"]),
+            )
+
+        case s if m := _RESTORE_RE.fullmatch(s):
+            return RestoreMusicAction(_parse_ramp(m["ramp"]))
+
+        case s:
+            for parser in _EXTRA_PARSERS:
+                if (action := parser(s)) is not None:
+                    return action  # type: ignore
+
             raise ValueError(f'Unknown action specification: "{s}"')
 
 
+def parse_action_step_str(s: str) -> Action:
+    # Actions separated by "&" are started at the same time
+    branch_strs = s.split("&")
+    if len(branch_strs) == 1:
+        return parse_action_str(s)
+
+    return ParallelAction([parse_action_str(b) for b in branch_strs])
+
+
+@functools.cache
 def parse_action_group_str(s: str) -> ActionGroup:
     sub_strs = s.split(";")
 
-    return ActionGroup([parse_action_str(sub_str) for sub_str in sub_strs])
+    return ActionGroup([parse_action_step_str(sub_str) for sub_str in sub_strs])
 
 
 # endregion
@@ -1,30 +1,27 @@
 import json
 import logging
 import pathlib
-from dataclasses import dataclass
-
-import jsonschema
-import jsonschema.exceptions
+from dataclasses import dataclass, field
 
 from jingleplayer import util
-
-from .actions import (
-    Action,
-    PausePlaybackAction,
-    ResumePlaybackAction,
-    SwitchToGamePlaylistAction,
+from jingleplayer.playback_control.controllers import (
+    PlaybackController,
+    SpotifyDbusPlaybackController,
 )
-from .games import Game
+
+from .actions import ActionBase
+from .games import Game, get_game_dependents
+from .handlers import get_handler_for_type
 from .jingles import Jingle
 from .playlists import SpotifyPlaylist
+from .series import GameSeries
+from .validation import validate_against_schema
 
 logger = logging.getLogger(__name__)
 
-schema_file = pathlib.Path(__file__).with_name("schema.json")
-
 
 def _load_json(cfg_file: pathlib.Path):
-    logger.info(f'Loading config file from "{cfg_file.resolve()}")')
+    logger.info('Loading config file from "%s")', cfg_file.resolve())
 
     if not cfg_file.is_file():
         raise RuntimeError(
@@ -35,24 +32,18 @@ def _load_json(cfg_file: pathlib.Path):
         return json.load(cfg_fs)
 
 
-def _validate_against_schema(cfg_json):
-    with schema_file.open() as cfg_fs:
-        schema = json.load(cfg_fs)
-
-    try:
-        jsonschema.validate(cfg_json, schema)
-    except jsonschema.exceptions.SchemaError as exc:
-        raise RuntimeError("Config schema is not a valid schema") from exc
-    except jsonschema.exceptions.ValidationError as exc:
-        path_in_config = "config"
-        for rp in exc.relative_path:
-            path_in_config += f"[{str(rp)}]"
-
-        raise RuntimeError(
-            "Config is invalid: " + str(exc.message) + "; occured on " + path_in_config
-        ) from exc
-
-    logger.debug("Config json validated against schema")
+def _check_game_names(games: dict[str, Game], game_series: dict[str, GameSeries]):
+    # Games are looked up (and edited) by name, so the generated names of series games
+    # must not clash with listed games or the games of other series. Only the names are
+    # generated here, the games themselves are still created when tasks are.
+    names = set(games)
+    for series in game_series.values():
+        for name in series.iter_game_names():
+            if name in names:
+                raise ValueError(
+                    f'Game "{name}" of game series "{series.name}" already exists'
+                )
+            names.add(name)
 
 
 @dataclass
@@ -60,33 +51,74 @@ class Config:
     jingles: dict[str, Jingle]
     games: dict[str, Game]
     playlists: dict[str, SpotifyPlaylist]
+    # Games described by rules, which are only created when tasks are generated
+    game_series: dict[str, GameSeries] = field(default_factory=dict)
+
+    # Types of all actions used by any jingle, collected once on creation
+    action_types: frozenset[type[ActionBase]] = field(init=False, repr=False)
+    # Which games are specified relative to each game, and the position of each game
+    game_dependents: dict[str, list[str]] = field(init=False, repr=False)
+    game_order: dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.game_dependents = get_game_dependents(self.games)
+        self.game_order = {name: i for i, name in enumerate(self.games)}
+
+        self.action_types = frozenset(
+            type(a)
+            for j in self.jingles.values()
+            for group in (j.pre_actions, j.actions)
+            for step in group.actions
+            for a in step.walk()
+        )
 
-    def has_action(self, *actionTypes: type[Action]):
-        for actionType in actionTypes:
-            if any(
-                j.pre_actions.includes(actionType) or j.actions.includes(actionType)
-                for j in self.jingles.values()
-            ):
-                return True
+    def has_action(self, *actionTypes: type[ActionBase]):
+        return any(
+            issubclass(used, actionType)
+            for used in self.action_types
+            for actionType in actionTypes
+        )
+
+    @property
+    def audio_files(self) -> set[pathlib.Path]:
+        files = {j.audiofile for j in self.jingles.values()}
+        files.update(g.announcement_file for g in self.games.values())
+        files.update(pl.announcement_file for pl in self.playlists.values())
+        files.update(s.announcement_file for s in self.game_series.values())
+        files.discard(None)
 
-        return False
+        return files  # type: ignore
+
+    @property
+    def required_controllers(self) -> set[type[PlaybackController]]:
+        return {
+            rc
+            for t in self.action_types
+            if (rc := get_handler_for_type(t).REQUIRED_CONTROLLER) is not None
+        }
 
     @property
     def needs_playback_control(self):
-        return self.has_action(PausePlaybackAction, ResumePlaybackAction)
+        return any(
+            get_handler_for_type(t).NEEDS_PLAYBACK_CONTROL for t in self.action_types
+        )
 
     @property
     def needs_spotify_dbus(self):
-        return self.has_action(SwitchToGamePlaylistAction)
+        return SpotifyDbusPlaybackController in self.required_controllers
 
     @classmethod
-    def load(cls, path: str):
+    def load(cls, path: str, games_csv: str | None = None):
         cfg_file = pathlib.Path(path)
         root_dir = cfg_file.parent
 
         cfg_json = _load_json(cfg_file)
 
-        _validate_against_schema(cfg_json)
+        # Games may come from the CSV file or game series only
+        if games_csv is not None or "game_series" in cfg_json:
+            cfg_json.setdefault("games", {})
+
+        validate_against_schema(cfg_json)
 
         # Parse default_delay
         default_delay = util.parse_timedelta_str(cfg_json.get("default_delay", "1s"))
@@ -96,7 +128,7 @@ class Config:
         if playlists_obj := cfg_json.get("playlists", None):
             logger.debug("Parsing playlists")
             for name, plobj in playlists_obj.items():
-                logger.debug(f'Parsing playlist "{name}"')
+                logger.debug('Parsing playlist "%s"', name)
                 playlists[name] = SpotifyPlaylist.from_json_obj(
                     name,
                     plobj,
@@ -109,7 +141,7 @@ class Config:
         logger.debug("Parsing jingles")
         jingles = {}
         for name, jingle_obj in cfg_json["jingles"].items():
-            logger.debug(f'Parsing jingle "{name}"')
+            logger.debug('Parsing jingle "%s"', name)
             jingles[name] = Jingle.from_json_obj(
                 name,
                 jingle_obj,
@@ -121,7 +153,7 @@ class Config:
         logger.debug("Parsing games")
         games = {}
         for name, game_obj in cfg_json["games"].items():
-            logger.debug(f'Parsing game "{name}"')
+            logger.debug('Parsing game "%s"', name)
             games[name] = Game.from_json_obj(
                 name,
                 game_obj,
@@ -130,9 +162,28 @@ class Config:
                 root_dir=root_dir,
             )
 
+        game_series = {}
+        for name, series_obj in cfg_json.get("game_series", {}).items():
+            logger.debug('Parsing game series "%s"', name)
+            game_series[name] = GameSeries.from_json_obj(
+                name,
+                series_obj,
+                playlists=playlists,
+                root_dir=root_dir,
+            )
+
+        if games_csv is not None:
+            from .csv_import import load_games_from_csv
+
+            logger.debug('Importing games from "%s"', games_csv)
+            games = load_games_from_csv(pathlib.Path(games_csv), playlists, games)
+
+        _check_game_names(games, game_series)
+
         logger.debug("Finished parsing config")
         return cls(
             jingles=jingles,
             games=games,
             playlists=playlists,
+            game_series=game_series,
         )
@@ -0,0 +1,146 @@
+import argparse
+import csv
+import json
+import logging
+import pathlib
+import sys
+from collections.abc import Iterator, Mapping
+
+import jsonschema.exceptions
+
+from .games import Game
+from .playlists import SpotifyPlaylist
+from .validation import validate_against_schema
+
+logger = logging.getLogger(__name__)
+
+# Columns that are part of a game's specification, like the keys of a game in the JSON
+# config. Other columns (e.g. the field a game is played on) are ignored.
+GAME_COLUMNS = ("start", "end", "duration", "announcement_file", "playlist")
+NAME_COLUMN = "name"
+
+
+def _read_rows(file: pathlib.Path) -> Iterator[tuple[int, dict]]:
+    # Yields the line number and game specification (as in the JSON config) of each
+    # row. Rows are read one at a time, so files of any size can be imported.
+    with file.open(newline="", encoding="utf-8-sig") as fs:
+        reader = csv.DictReader(fs)
+
+        if reader.fieldnames is None or NAME_COLUMN not in reader.fieldnames:
+            raise RuntimeError(f'CSV file "{file}" has no "{NAME_COLUMN}" column')
+
+        for row in reader:
+            obj = {
+                col: value.strip()
+                for col in (NAME_COLUMN, *GAME_COLUMNS)
+                if (value := row.get(col)) and value.strip()
+            }
+
+            # Skip empty lines, e.g. at the end of exports
+            if obj:
+                yield reader.line_num, obj
+
+
+def iter_games_from_csv(
+    file: pathlib.Path,
+    playlists: Mapping[str, SpotifyPlaylist],
+    known_games: dict[str, Game] | None = None,
+) -> Iterator[Game]:
+    # Games are validated and parsed like the games of the JSON config. Announcement
+    # files are relative to the CSV file. Start and end must be absolute times.
+    if known_games is None:
+        known_games = {}
+
+    for line, obj in _read_rows(file):
+        location = f'line {line} of "{file.name}"'
+
+        if (name := obj.pop(NAME_COLUMN, None)) is None:
+            raise RuntimeError(f"Game on {location} has no name")
+        if name in known_games:
+            raise RuntimeError(f'Game "{name}" on {location} already exists')
+
+        validate_against_schema(obj, definition="game", location=location)
+
+        try:
+            game = Game.from_json_obj(
+                name,
+                obj,
+                known_games=known_games,
+                playlists=playlists,  # type: ignore
+                root_dir=file.parent,
+            )
+        except (ValueError, KeyError, jsonschema.exceptions.ValidationError) as exc:
+            raise RuntimeError(f"Game on {location} is invalid: {exc}") from exc
+
+        yield game
+
+
+def load_games_from_csv(
+    file: pathlib.Path,
+    playlists: Mapping[str, SpotifyPlaylist],
+    known_games: dict[str, Game] | None = None,
+) -> dict[str, Game]:
+    games = {} if known_games is None else known_games
+
+    for g in iter_games_from_csv(file, playlists, games):
+        games[g.name] = g
+
+    return games
+
+
+def convert_csv_to_json(file: pathlib.Path, out):
+    # Writes the games of the CSV file as the "games" object of a JSON config. Rows are
+    # validated (but not parsed) and written one at a time.
+    out.write('{\n    "games": {')
+
+    # Only the names are kept, so duplicates (of which only the last would take effect
+    # in the JSON object) are rejected as when loading the CSV file
+    names = set()
+    for line, obj in _read_rows(file):
+        location = f'line {line} of "{file.name}"'
+
+        if (name := obj.pop(NAME_COLUMN, None)) is None:
+            raise RuntimeError(f"Game on {location} has no name")
+        if name in names:
+            raise RuntimeError(f'Game "{name}" on {location} already exists')
+        validate_against_schema(obj, definition="game", location=location)
+
+        out.write(",\n" if names else "\n")
+        out.write(f"        {json.dumps(name)}: {json.dumps(obj)}")
+        names.add(name)
+
+    out.write("\n    }\n}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m jingleplayer.configuration.csv_import",
+        description=f"Converts a CSV file with one game per row into the games object of a config file. The columns are {NAME_COLUMN}, {', '.join(GAME_COLUMNS)} (like the properties of games in the config file); other columns are ignored.",
+    )
+    parser.add_argument("csvfile", type=str, help="CSV file to convert.")
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        help="File to write the JSON to. If not set, it is written to stdout.",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.output:
+            with open(args.output, "w") as out:
+                convert_csv_to_json(pathlib.Path(args.csvfile), out)
+        else:
+            convert_csv_to_json(pathlib.Path(args.csvfile), sys.stdout)
+    except (RuntimeError, OSError, ValueError, csv.Error) as exc:
+        # Do not leave a partially written file behind
+        if args.output:
+            pathlib.Path(args.output).unlink(missing_ok=True)
+
+        print(file=sys.stderr)
+        print(str(exc), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import dataclasses
+import functools
+import heapq
 import logging
 import pathlib
+from collections import ChainMap
+from collections.abc import Mapping
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from enum import StrEnum, auto
 
 import humanize
 
@@ -14,46 +20,76 @@ from .playlists import SpotifyPlaylist
 logger = logging.getLogger(__name__)
 
 
-def _parse_relative_dt(d: dict, known_games: dict[str, Game]):
-    rel_str: str = d["relative_to"]
+class GameAnchor(StrEnum):
+    START = auto()
+    END = auto()
 
-    if rel_str == "NOW":
-        rel_dt = util.RELATIVE_TO_NOW_BASE
-    elif rel_str.startswith("END OF GAME: "):
-        game_id = rel_str.removeprefix("END OF GAME: ")
-        try:
-            rel_dt = known_games[game_id].end
-        except KeyError as ke:
-            raise ValueError(f'Game "{game_id}" does not exist') from ke
-    elif rel_str.startswith("START OF GAME: "):
-        game_id = rel_str.removeprefix("START OF GAME: ")
-        try:
-            rel_dt = known_games[game_id].start
-        except KeyError as ke:
-            raise ValueError(f'Game "{game_id}" does not exist') from ke
-    else:
-        raise ValueError(f'Value "{rel_str}" is not valid for relative_to')
+
+@dataclass(frozen=True, slots=True)
+class RelativeTime:
+    game: str
+    anchor: GameAnchor
+    offset: timedelta
+
+    def resolve(self, games: Mapping[str, Game]):
+        g = games[self.game]
+        return (g.start if self.anchor == GameAnchor.START else g.end) + self.offset
+
+
+def _parse_relative_dt(
+    d: dict, known_games: dict[str, Game]
+) -> tuple[datetime, RelativeTime | None]:
+    rel_str: str = d["relative_to"]
 
     if offset_str := d.get("offset", None):
         offset = util.parse_timedelta_str(offset_str)
     else:
         offset = util.ZERO_TD
 
-    dt = rel_dt + offset
-    logger.debug(f"Relative start/end specification {d} parsed to datetime {dt}")
-    return dt
+    if rel_str == "NOW":
+        rel = None
+        dt = util.RELATIVE_TO_NOW_BASE + offset
+    else:
+        if rel_str.startswith("END OF GAME: "):
+            game_id = rel_str.removeprefix("END OF GAME: ")
+            anchor = GameAnchor.END
+        elif rel_str.startswith("START OF GAME: "):
+            game_id = rel_str.removeprefix("START OF GAME: ")
+            anchor = GameAnchor.START
+        else:
+            raise ValueError(f'Value "{rel_str}" is not valid for relative_to')
 
+        rel = RelativeTime(game_id, anchor, offset)
+        try:
+            dt = rel.resolve(known_games)
+        except KeyError as ke:
+            raise ValueError(f'Game "{game_id}" does not exist') from ke
 
-def _parse_dt(obj: object, games: dict[str, Game]):
+    logger.debug("Relative start/end specification %s parsed to datetime %s", d, dt)
+    return dt, rel
+
+
+def _parse_dt(
+    obj: object, games: dict[str, Game]
+) -> tuple[datetime, RelativeTime | None]:
     if isinstance(obj, str):
-        return util.parse_datetime_str(obj)
+        return util.parse_datetime_str(obj), None
     elif isinstance(obj, dict):
         return _parse_relative_dt(obj, games)
 
     raise ValueError("Unknown datetime specification")
 
 
-@dataclass
+@functools.cache
+def _get_announcement_file(root_dir: pathlib.Path, filename: str) -> pathlib.Path:
+    # Games often share announcement files, which then share one path object
+    announcement_file = root_dir / pathlib.Path(filename)
+    logger.info('Filename "%s" resolves to "%s"', filename, announcement_file.resolve())
+
+    return announcement_file
+
+
+@dataclass(frozen=True, slots=True)
 class Game:
     name: str
 
@@ -64,6 +100,14 @@ class Game:
 
     playlist: SpotifyPlaylist | None = None
 
+    # How start and end were specified, used to move dependent games along at runtime
+    start_ref: RelativeTime | None = None
+    end_ref: RelativeTime | None = None
+    duration: timedelta | None = None
+
+    # Probed from announcement_file if not set (and kept by dataclasses.replace)
+    announcement_duration: timedelta | None = None
+
     def __post_init__(self):
         if self.start > self.end:
             raise ValueError(f"start of game {self.name} is later than the end.")
@@ -74,9 +118,12 @@ class Game:
                     f'Announcement file "{self.announcement_file}" does not exist or is not a file.'
                 )
 
-            self.announcement_duration = util.get_audiofile_duration(
-                self.announcement_file
-            )
+            if self.announcement_duration is None:
+                object.__setattr__(
+                    self,
+                    "announcement_duration",
+                    util.get_audiofile_duration(self.announcement_file),
+                )
 
     def get_info_str(
         self,
@@ -110,6 +157,23 @@ class Game:
 
         return util.lines_to_string(lines)
 
+    def to_record(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "duration": (self.end - self.start).total_seconds(),
+            "announcement_file": (
+                str(self.announcement_file) if self.announcement_file else None
+            ),
+            "announcement_duration": (
+                self.announcement_duration.total_seconds()
+                if self.announcement_duration
+                else None
+            ),
+            "playlist": self.playlist.name if self.playlist else None,
+        }
+
     @classmethod
     def from_json_obj(
         cls,
@@ -119,10 +183,12 @@ class Game:
         playlists: dict[str, SpotifyPlaylist],
         root_dir: pathlib.Path,
     ):
-        start = _parse_dt(obj["start"], known_games)
+        start, start_ref = _parse_dt(obj["start"], known_games)
+        end_ref = None
+        dur = None
 
         if (end_str := obj.get("end", None)) is not None:
-            end = _parse_dt(end_str, known_games)
+            end, end_ref = _parse_dt(end_str, known_games)
 
             if start >= end:
                 raise ValueError("Start of game must be before its end")
@@ -135,11 +201,7 @@ class Game:
 
         announcement_file = None
         if ann_file_str := obj.get("announcement_file", None):
-            filename = pathlib.Path(ann_file_str)
-            announcement_file = root_dir / filename
-            logger.info(
-                f'Filename "{filename}" resolves to "{announcement_file.resolve()}"'
-            )
+            announcement_file = _get_announcement_file(root_dir, ann_file_str)
 
         if pl_key := obj.get("playlist", None):
             pl = playlists.get(pl_key, None)
@@ -152,6 +214,9 @@ class Game:
             end=end,
             announcement_file=announcement_file,
             playlist=pl,
+            start_ref=start_ref,
+            end_ref=end_ref,
+            duration=dur,
         )
 
         plstr = (
@@ -159,6 +224,75 @@ class Game:
             if g.playlist is None
             else f'playlist: "{g.playlist.name}"'
         )
-        logger.info(f'Parsed game "{g.name}" (from {g.start} to {g.end}, {plstr})')
+        logger.info(
+            'Parsed game "%s" (from %s to %s, %s)', g.name, g.start, g.end, plstr
+        )
 
         return g
+
+
+# region runtime changes
+def get_game_dependents(games: Mapping[str, Game]) -> dict[str, list[str]]:
+    dependents: dict[str, list[str]] = {}
+
+    for g in games.values():
+        for ref in (g.start_ref, g.end_ref):
+            if ref is not None and g.name not in dependents.setdefault(ref.game, []):
+                dependents[ref.game].append(g.name)
+
+    return dependents
+
+
+def _recompute_times(game: Game, games: Mapping[str, Game]) -> Game | None:
+    start = game.start_ref.resolve(games) if game.start_ref else game.start
+
+    if game.end_ref:
+        end = game.end_ref.resolve(games)
+    elif game.duration is not None:
+        end = start + game.duration
+    else:
+        end = game.end
+
+    if start == game.start and end == game.end:
+        return None
+
+    return dataclasses.replace(game, start=start, end=end)
+
+
+def propagate_game_change(
+    games: Mapping[str, Game],
+    changed: Game,
+    dependents: Mapping[str, list[str]],
+    order: Mapping[str, int],
+) -> dict[str, Game]:
+    # Returns the changed game and all games that (transitively) depend on it and move
+    # as a result. Only the part of the dependency graph downstream of the change is
+    # visited, and a game whose times do not change does not propagate any further.
+    # Games can only refer to earlier games, so processing them by their position in
+    # the config (order) visits every game after all games it depends on.
+    updated = {changed.name: changed}
+    view = ChainMap(updated, games)  # type: ignore
+
+    heap = [(order[d], d) for d in dependents.get(changed.name, ())]
+    heapq.heapify(heap)
+    visited = set()
+
+    while heap:
+        _, name = heapq.heappop(heap)
+        if name in visited:
+            continue
+        visited.add(name)
+
+        if (new := _recompute_times(view[name], view)) is None:
+            continue
+
+        updated[name] = new
+        logger.info('Game "%s" moved to %s - %s', name, new.start, new.end)
+
+        for d in dependents.get(name, ()):
+            heapq.heappush(heap, (order[d], d))
+
+    return updated
+
+
+# endregion
@@ -0,0 +1,424 @@
+import abc
+import itertools
+import logging
+import math
+import pathlib
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from jingleplayer import audio, latency, util
+from jingleplayer.playback_control.controllers import (
+    PlaybackController,
+    PlaybackState,
+    SpotifyDbusPlaybackController,
+)
+
+from . import actions
+from .actions import (
+    ActionBase,
+    AnnounceGameAction,
+    AnnounceGamePlaylistAction,
+    DelayAction,
+    DuckMusicAction,
+    NothingAction,
+    ParallelAction,
+    PausePlaybackAction,
+    PlayJingleAction,
+    PlayRenderedAudioAction,
+    RestoreMusicAction,
+    ResumePlaybackAction,
+    SwitchToGamePlaylistAction,
+)
+from .games import Game
+from .jingles import Jingle
+
+logger = logging.getLogger(__name__)
+
+# Volume ramps set the volume this often per second
+RAMP_STEPS_PER_S = 20
+
+
+# region handler base classes
+class ActionHandler[A: ActionBase](abc.ABC):
+    # Whether the action does anything useful without a playback controller
+    NEEDS_PLAYBACK_CONTROL: bool = False
+    # Playback controller type the action only works with (None: no requirement)
+    REQUIRED_CONTROLLER: type[PlaybackController] | None = None
+    # Playback state the action leaves the music in (None: unchanged)
+    RESULTING_PLAYBACK_STATE: PlaybackState | None = None
+
+    def get_duration(self, action: A, jingle: Jingle, game: Game) -> timedelta:
+        return util.ZERO_TD
+
+    def get_audiofiles(
+        self, action: A, jingle: Jingle, game: Game
+    ) -> Iterable[pathlib.Path]:
+        return ()
+
+    def get_resulting_playback_state(
+        self, action: A, jingle: Jingle, game: Game
+    ) -> PlaybackState | None:
+        return self.RESULTING_PLAYBACK_STATE
+
+    def get_start_latency(
+        self,
+        action: A,
+        jingle: Jingle,
+        game: Game,
+        playback_controllers: Iterable[PlaybackController],
+    ) -> float:
+        # Estimated time (s) from executing the action until it takes effect (e.g. until
+        # the sound comes out of the speakers). With latency compensation, the action is
+        # executed this much earlier.
+        return 0.0
+
+    @abc.abstractmethod
+    def execute(
+        self,
+        action: A,
+        jingle: Jingle,
+        game: Game,
+        playback_controllers: Iterable[PlaybackController],
+    ):
+        pass
+
+    def parse(self, s: str) -> A | None:
+        # Third-party handlers can override this to make their action available
+        # in action specification strings. Return None if s does not match.
+        return None
+
+
+class AudioActionHandler[A: ActionBase](ActionHandler[A]):
+    @abc.abstractmethod
+    def get_audio(
+        self, action: A, jingle: Jingle, game: Game
+    ) -> tuple[pathlib.Path, timedelta] | None:
+        pass
+
+    def get_duration(self, action: A, jingle: Jingle, game: Game) -> timedelta:
+        if a := self.get_audio(action, jingle, game):
+            return audio.get_playback_duration(*a)
+
+        return util.ZERO_TD
+
+    def get_audiofiles(self, action: A, jingle: Jingle, game: Game):
+        if a := self.get_audio(action, jingle, game):
+            return (a[0],)
+
+        return ()
+
+    def get_start_latency(self, action, jingle, game, playback_controllers):
+        if self.get_audio(action, jingle, game):
+            return audio.get_start_latency()
+
+        return 0.0
+
+    def execute(
+        self,
+        action: A,
+        jingle: Jingle,
+        game: Game,
+        playback_controllers: Iterable[PlaybackController],
+    ):
+        if a := self.get_audio(action, jingle, game):
+            file, duration = a
+            audio.play_audiofile(file, audio.get_playback_duration(file, duration))
+
+
+class PlaybackControlHandler[A: ActionBase](ActionHandler[A]):
+    # Calls each playback controller, measuring how long the calls take as the
+    # controllers' latencies
+    def get_controllers(
+        self, action: A, jingle: Jingle, game: Game, playback_controllers
+    ) -> Iterable[PlaybackController]:
+        return playback_controllers
+
+    @abc.abstractmethod
+    def control(self, action: A, jingle: Jingle, game: Game, pc: PlaybackController):
+        pass
+
+    def get_start_latency(self, action, jingle, game, playback_controllers):
+        return max(
+            (
+                latency.get(latency.controller_key(pc))
+                for pc in self.get_controllers(
+                    action, jingle, game, playback_controllers
+                )
+            ),
+            default=0.0,
+        )
+
+    def execute(self, action, jingle, game, playback_controllers):
+        for pc in self.get_controllers(action, jingle, game, playback_controllers):
+            with latency.measure(latency.controller_key(pc)):
+                self.control(action, jingle, game, pc)
+
+
+# endregion
+
+
+# region built-in handlers
+class NothingHandler(ActionHandler[NothingAction]):
+    def execute(self, action, jingle, game, playback_controllers):
+        pass
+
+
+class DelayHandler(ActionHandler[DelayAction]):
+    def get_duration(self, action, jingle, game):
+        return action.duration
+
+    def execute(self, action, jingle, game, playback_controllers):
+        util.wait_for(action.duration.total_seconds())
+
+
+class PausePlaybackHandler(PlaybackControlHandler[PausePlaybackAction]):
+    NEEDS_PLAYBACK_CONTROL = True
+    RESULTING_PLAYBACK_STATE = PlaybackState.PAUSED
+
+    def control(self, action, jingle, game, pc):
+        pc.pause()
+
+
+class ResumePlaybackHandler(PlaybackControlHandler[ResumePlaybackAction]):
+    NEEDS_PLAYBACK_CONTROL = True
+    RESULTING_PLAYBACK_STATE = PlaybackState.PLAYING
+
+    def control(self, action, jingle, game, pc):
+        pc.resume()
+
+
+class PlayJingleHandler(AudioActionHandler[PlayJingleAction]):
+    def get_audio(self, action, jingle, game):
+        if f := jingle.audiofile:
+            return (f, jingle.audio_duration)
+
+        return None
+
+
+class AnnounceGameHandler(AudioActionHandler[AnnounceGameAction]):
+    def get_audio(self, action, jingle, game):
+        if f := game.announcement_file:
+            return (f, game.announcement_duration)
+
+        return None
+
+
+class AnnounceGamePlaylistHandler(AudioActionHandler[AnnounceGamePlaylistAction]):
+    def get_audio(self, action, jingle, game):
+        if (pl := game.playlist) and (f := pl.announcement_file):
+            return (f, pl.announcement_duration)
+
+        return None
+
+
+class PlayRenderedAudioHandler(AudioActionHandler[PlayRenderedAudioAction]):
+    def get_audio(self, action, jingle, game):
+        return (action.file, action.duration)
+
+
+class SwitchToGamePlaylistHandler(PlaybackControlHandler[SwitchToGamePlaylistAction]):
+    REQUIRED_CONTROLLER = SpotifyDbusPlaybackController
+    # Opening a URI starts playback
+    RESULTING_PLAYBACK_STATE = PlaybackState.PLAYING
+
+    def get_resulting_playback_state(self, action, jingle, game):
+        return self.RESULTING_PLAYBACK_STATE if game.playlist else None
+
+    def get_controllers(self, action, jingle, game, playback_controllers):
+        if not game.playlist:
+            return ()
+
+        return (
+            pc
+            for pc in playback_controllers
+            if isinstance(pc, SpotifyDbusPlaybackController)
+        )
+
+    def control(self, action, jingle, game, pc):
+        pc.open_uri(game.playlist.uri)
+
+
+# Volumes of the controllers before they were ducked, to restore them afterwards
+_ducked_volumes: dict[PlaybackController, float] = {}
+_ducked_volumes_lock = threading.Lock()
+
+
+def _run_volume_ramp(
+    ramps: list[tuple[PlaybackController, float, float]], seconds: float
+):
+    # Moves all controllers from their start to their target volume at once. Steps are
+    # timed from the start of the ramp, so slow calls do not make it take longer.
+    steps = max(1, math.ceil(seconds * RAMP_STEPS_PER_S))
+    started = time.monotonic()
+
+    for i in range(1, steps + 1):
+        if (delay := started + seconds * i / steps - time.monotonic()) > 0:
+            util.wait_for(delay)
+
+        for pc, start, target in ramps:
+            volume = start + (target - start) * i / steps
+            if i == 1:
+                # The first change is when the ramp becomes audible
+                with latency.measure(latency.controller_key(pc)):
+                    pc.set_volume(volume)
+            else:
+                pc.set_volume(volume)
+
+
+class VolumeRampHandler[A: DuckMusicAction | RestoreMusicAction](ActionHandler[A]):
+    NEEDS_PLAYBACK_CONTROL = True
+    REQUIRED_CONTROLLER = SpotifyDbusPlaybackController
+
+    def get_duration(self, action, jingle, game):
+        # The ramp is part of the timeline, so e.g. ducking in the pre_actions is
+        # finished when the jingle starts
+        return action.ramp
+
+    def get_controllers(
+        self, playback_controllers: Iterable[PlaybackController]
+    ) -> list[PlaybackController]:
+        return [pc for pc in playback_controllers if pc.CAN_SET_VOLUME]
+
+    @abc.abstractmethod
+    def get_target_volume(self, action: A, pc: PlaybackController) -> float | None:
+        # Volume to ramp to, or None to leave the controller alone
+        pass
+
+    def get_start_latency(self, action, jingle, game, playback_controllers):
+        return max(
+            (
+                latency.get(latency.controller_key(pc))
+                for pc in self.get_controllers(playback_controllers)
+            ),
+            default=0.0,
+        )
+
+    def execute(self, action, jingle, game, playback_controllers):
+        ramps = []
+        for pc in self.get_controllers(playback_controllers):
+            start = pc.get_volume()
+            if (target := self.get_target_volume(action, pc)) is not None:
+                ramps.append((pc, start, target))
+
+        if ramps:
+            _run_volume_ramp(ramps, action.ramp.total_seconds())
+
+
+class DuckMusicHandler(VolumeRampHandler[DuckMusicAction]):
+    def get_target_volume(self, action, pc):
+        with _ducked_volumes_lock:
+            # Ducking again lowers relative to the volume before the first ducking
+            original = _ducked_volumes.setdefault(pc, pc.get_volume())
+
+        return original * action.volume
+
+
+class RestoreMusicHandler(VolumeRampHandler[RestoreMusicAction]):
+    def get_target_volume(self, action, pc):
+        with _ducked_volumes_lock:
+            original = _ducked_volumes.pop(pc, None)
+
+        if original is None:
+            logger.info("Music of %s was not ducked, not restoring its volume", pc.name)
+
+        return original
+
+
+class ParallelHandler(ActionHandler[ParallelAction]):
+    def __init__(self):
+        super().__init__()
+        # Threads are kept around so starting a branch does not pay for thread creation
+        self._pool = ThreadPoolExecutor(thread_name_prefix="action-branch")
+
+    def get_duration(self, action, jingle, game):
+        # The branches run concurrently, so the longest one determines the duration
+        return max(
+            get_handler(b).get_duration(b, jingle, game) for b in action.branches
+        )
+
+    def get_audiofiles(self, action, jingle, game):
+        return itertools.chain.from_iterable(
+            get_handler(b).get_audiofiles(b, jingle, game) for b in action.branches
+        )
+
+    def get_start_latency(self, action, jingle, game, playback_controllers):
+        return max(
+            get_handler(b).get_start_latency(b, jingle, game, playback_controllers)
+            for b in action.branches
+        )
+
+    def get_resulting_playback_state(self, action, jingle, game):
+        states = (
+            get_handler(b).get_resulting_playback_state(b, jingle, game)
+            for b in action.branches
+        )
+        return next((s for s in reversed(list(states)) if s is not None), None)
+
+    def execute(self, action, jingle, game, playback_controllers):
+        *others, last = action.branches
+
+        futures = [
+            self._pool.submit(
+                get_handler(b).execute, b, jingle, game, playback_controllers
+            )
+            for b in others
+        ]
+        get_handler(last).execute(last, jingle, game, playback_controllers)
+
+        for f in futures:
+            f.result()
+
+
+# endregion
+
+
+# region registry
+_HANDLERS: dict[type[ActionBase], ActionHandler] = {}
+
+
+def register_action_handler(action_type: type[ActionBase], handler: ActionHandler):
+    if action_type in _HANDLERS:
+        logger.info("Replacing handler for action type %s", action_type.__name__)
+
+    _HANDLERS[action_type] = handler
+
+    if type(handler).parse is not ActionHandler.parse:
+        actions.register_action_parser(handler.parse)
+
+    logger.debug("Registered %s for action type %s", handler, action_type.__name__)
+
+
+def get_handler_for_type(action_type: type[ActionBase]) -> ActionHandler:
+    if (handler := _HANDLERS.get(action_type)) is not None:
+        return handler
+
+    # Subclasses of registered action types use their parent's handler
+    for base in action_type.__mro__[1:]:
+        if (handler := _HANDLERS.get(base)) is not None:
+            _HANDLERS[action_type] = handler
+            return handler
+
+    raise TypeError(f"Unknown action type {action_type.__name__}")
+
+
+def get_handler(action: ActionBase) -> ActionHandler:
+    return get_handler_for_type(type(action))
+
+
+register_action_handler(NothingAction, NothingHandler())
+register_action_handler(DelayAction, DelayHandler())
+register_action_handler(PausePlaybackAction, PausePlaybackHandler())
+register_action_handler(ResumePlaybackAction, ResumePlaybackHandler())
+register_action_handler(PlayJingleAction, PlayJingleHandler())
+register_action_handler(AnnounceGameAction, AnnounceGameHandler())
+register_action_handler(SwitchToGamePlaylistAction, SwitchToGamePlaylistHandler())
+register_action_handler(AnnounceGamePlaylistAction, AnnounceGamePlaylistHandler())
+register_action_handler(DuckMusicAction, DuckMusicHandler())
+register_action_handler(RestoreMusicAction, RestoreMusicHandler())
+register_action_handler(ParallelAction, ParallelHandler())
+register_action_handler(PlayRenderedAudioAction, PlayRenderedAudioHandler())
+
+# endregion
@@ -1,6 +1,7 @@
+import functools
 import logging
 import pathlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import timedelta
 from enum import StrEnum, auto
 
@@ -32,7 +33,19 @@ class JingleTrigger(StrEnum):
                 return "end of each game"
 
 
-@dataclass
+@functools.cache
+def _get_default_pre_actions(default_delay: timedelta):
+    return ActionGroup([PausePlaybackAction(), DelayAction(default_delay)])
+
+
+@functools.cache
+def _get_default_actions(default_delay: timedelta):
+    return ActionGroup(
+        [PlayJingleAction(), DelayAction(default_delay), ResumePlaybackAction()]
+    )
+
+
+@dataclass(frozen=True, slots=True)
 class Jingle:
     name: str
 
@@ -43,10 +56,18 @@ class Jingle:
     actions: ActionGroup
 
     audiofile: pathlib.Path | None = None
+    # Probed from audiofile if not set
+    audio_duration: timedelta | None = None
+
+    has_playjingle_action: bool = field(init=False, repr=False)
 
     def __post_init__(self):
-        self.has_playjingle_action = (self.pre_actions.includes(PlayJingleAction)) or (
-            self.actions.includes(PlayJingleAction)
+        # Computed fields are set with object.__setattr__ as the class is frozen
+        object.__setattr__(
+            self,
+            "has_playjingle_action",
+            self.pre_actions.includes(PlayJingleAction)
+            or self.actions.includes(PlayJingleAction),
         )
 
         if self.audiofile:
@@ -55,7 +76,12 @@ class Jingle:
                     f'Jingle file "{self.audiofile}" does not exist or is not a file.'
                 )
 
-            self.audio_duration = util.get_audiofile_duration(self.audiofile)
+            if self.audio_duration is None:
+                object.__setattr__(
+                    self,
+                    "audio_duration",
+                    util.get_audiofile_duration(self.audiofile),
+                )
 
         if self.has_playjingle_action and not self.audiofile:
             raise ValueError(
@@ -87,6 +113,19 @@ class Jingle:
 
         return util.lines_to_string(lines)
 
+    def to_record(self) -> dict:
+        return {
+            "name": self.name,
+            "trigger": str(self.trigger),
+            "offset": self.offset.total_seconds(),
+            "audio_file": str(self.audiofile) if self.audiofile else None,
+            "audio_duration": (
+                self.audio_duration.total_seconds() if self.audio_duration else None
+            ),
+            "pre_actions": self.pre_actions.get_description_str(),
+            "actions": self.actions.get_description_str(),
+        }
+
     @classmethod
     def from_json_obj(
         cls, name: str, obj, root_dir: pathlib.Path, default_delay: timedelta
@@ -103,7 +142,7 @@ class Jingle:
         # Audio file
         if filename := obj.get("audio_file", None):
             audiofile = root_dir / pathlib.Path(filename)
-            logger.info(f'Filename "{filename}" resolves to "{audiofile.resolve()}"')
+            logger.info('Filename "%s" resolves to "%s"', filename, audiofile.resolve())
         else:
             audiofile = None
 
@@ -111,16 +150,12 @@ class Jingle:
         if pre_action_str := obj.get("pre_actions", None):
             pre_actions = parse_action_group_str(pre_action_str)
         else:
-            pre_actions = ActionGroup(
-                [PausePlaybackAction(), DelayAction(default_delay)]
-            )
+            pre_actions = _get_default_pre_actions(default_delay)
 
         if action_str := obj.get("actions", None):
             actions = parse_action_group_str(action_str)
         else:
-            actions = ActionGroup(
-                [PlayJingleAction(), DelayAction(default_delay), ResumePlaybackAction()]
-            )
+            actions = _get_default_actions(default_delay)
 
         # finalize
         j = cls(
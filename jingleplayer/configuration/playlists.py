@@ -1,6 +1,7 @@
 import logging
 import pathlib
 from dataclasses import dataclass
+from datetime import timedelta
 
 import humanize
 
@@ -9,12 +10,14 @@ from jingleplayer import util
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SpotifyPlaylist:
     name: str
     uri: str
 
     announcement_file: pathlib.Path | None
+    # Probed from announcement_file if not set
+    announcement_duration: timedelta | None = None
 
     def __post_init__(self):
         if self.announcement_file is not None:
@@ -23,9 +26,12 @@ class SpotifyPlaylist:
                     f'Announcement file "{self.announcement_file}" does not exist or is not a file.'
                 )
 
-            self.announcement_duration = util.get_audiofile_duration(
-                self.announcement_file
-            )
+            if self.announcement_duration is None:
+                object.__setattr__(
+                    self,
+                    "announcement_duration",
+                    util.get_audiofile_duration(self.announcement_file),
+                )
 
     def get_info_str(self, warn_if_no_announcement: bool = False):
         lines = util.get_info_string_header("Playlist", self.name)
@@ -45,6 +51,20 @@ class SpotifyPlaylist:
 
         return util.lines_to_string(lines)
 
+    def to_record(self) -> dict:
+        return {
+            "name": self.name,
+            "uri": self.uri,
+            "announcement_file": (
+                str(self.announcement_file) if self.announcement_file else None
+            ),
+            "announcement_duration": (
+                self.announcement_duration.total_seconds()
+                if self.announcement_duration
+                else None
+            ),
+        }
+
     @classmethod
     def from_json_obj(
         cls,
@@ -57,7 +77,7 @@ class SpotifyPlaylist:
             filename = pathlib.Path(ann_file_str)
             announcement_file = root_dir / filename
             logger.info(
-                f'Filename "{filename}" resolves to "{announcement_file.resolve()}"'
+                'Filename "%s" resolves to "%s"', filename, announcement_file.resolve()
             )
 
         return cls(
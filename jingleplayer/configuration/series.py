@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import logging
+import pathlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+import humanize
+
+import jingleplayer.util as util
+
+from .games import Game, _get_announcement_file
+from .playlists import SpotifyPlaylist
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME_FORMAT = "{series} #{n}"
+
+
+def _parse_time_of_day(s: str) -> time:
+    try:
+        return time.fromisoformat(s.strip())
+    except ValueError as e:
+        raise ValueError(f'Time of day "{s}" is not given as HH:MM') from e
+
+
+@dataclass(frozen=True, slots=True)
+class SeriesBreak:
+    # Games that would start at or after this time of day start this much later
+    at: time
+    duration: timedelta
+
+
+@dataclass(frozen=True, slots=True)
+class GameSeries:
+    # Regularly spaced games (e.g. a round robin) that are described by a rule instead
+    # of one by one. Games are only created when they are iterated, so a series of
+    # thousands of games takes no time to load.
+    name: str
+
+    # Start of the first game (of the first day)
+    start: datetime
+    interval: timedelta
+    duration: timedelta
+
+    # Games per day are limited by count and/or by the latest start time of day
+    count: int | None = None
+    until: time | None = None
+    days: int = 1
+    breaks: tuple[SeriesBreak, ...] = ()
+
+    name_format: str = DEFAULT_NAME_FORMAT
+    announcement_file: pathlib.Path | None = None
+    playlist: SpotifyPlaylist | None = None
+
+    def __post_init__(self):
+        if self.interval <= util.ZERO_TD:
+            raise ValueError(f"interval of game series {self.name} must be positive")
+        if self.count is None and self.until is None:
+            raise ValueError(
+                f"Either count or until must be set on game series {self.name}"
+            )
+        if "{n}" not in self.name_format:
+            raise ValueError(
+                f'name of game series {self.name} must contain "{{n}}", so game names are unique'
+            )
+
+    def _iter_day_starts(self, day: int) -> Iterator[datetime]:
+        day_start = self.start + timedelta(days=day)
+        date = day_start.date()
+        until = datetime.combine(date, self.until) if self.until else None
+        breaks = [(datetime.combine(date, b.at), b.duration) for b in self.breaks]
+
+        k = 0
+        while self.count is None or k < self.count:
+            start = day_start + k * self.interval
+            # Breaks are sorted, so games moved by one break are moved by later ones
+            # as well if they now start after them
+            for at, duration in breaks:
+                if start >= at:
+                    start += duration
+
+            if until is not None and start > until:
+                return
+
+            yield start
+            k += 1
+
+    def _iter_numbered_starts(self) -> Iterator[tuple[int, datetime]]:
+        n = 0
+        for day in range(self.days):
+            for start in self._iter_day_starts(day):
+                n += 1
+                yield n, start
+
+    def _get_game_name(self, n: int, start: datetime) -> str:
+        return self.name_format.format(series=self.name, n=n, start=start)
+
+    def iter_game_names(self) -> Iterator[str]:
+        # Names of the games, without creating them
+        for n, start in self._iter_numbered_starts():
+            yield self._get_game_name(n, start)
+
+    def iter_starts(self) -> Iterator[datetime]:
+        # Starts of the games in order, without creating them
+        for _, start in self._iter_numbered_starts():
+            yield start
+
+    def iter_games(self, since: datetime | None = None) -> Iterator[Game]:
+        # Games in order of their start. Games that start before since are skipped
+        # without creating them.
+        for n, start in self._iter_numbered_starts():
+            if since is not None and start < since:
+                continue
+
+            yield Game(
+                self._get_game_name(n, start),
+                start=start,
+                end=start + self.duration,
+                announcement_file=self.announcement_file,
+                playlist=self.playlist,
+                duration=self.duration,
+            )
+
+    @property
+    def game_count(self) -> int:
+        # Counted without creating the games
+        return sum(
+            sum(1 for _ in self._iter_day_starts(day)) for day in range(self.days)
+        )
+
+    def get_info_str(self):
+        lines = util.get_info_string_header("Game series", self.name)
+
+        lines.append(f"- First game: {util.format_datetime(self.start)}")
+        lines.append(
+            f"- A game every {humanize.precisedelta(self.interval)}, each {humanize.precisedelta(self.duration)} long"
+        )
+        if self.count is not None:
+            lines.append(f"- At most {self.count} games per day")
+        if self.until is not None:
+            lines.append(f"- Last start of the day: {self.until:%H:%M}")
+        lines.append(f"- Days: {self.days} ({self.game_count} games in total)")
+        for b in self.breaks:
+            lines.append(
+                f"- Break at {b.at:%H:%M}: {humanize.precisedelta(b.duration)}"
+            )
+        if self.announcement_file:
+            lines.append(f'- Announcement file: "{self.announcement_file}"')
+        if self.playlist:
+            lines.append(f"- Game playlist: {self.playlist.name}")
+
+        return util.lines_to_string(lines)
+
+    def to_record(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start.isoformat(),
+            "interval": self.interval.total_seconds(),
+            "duration": self.duration.total_seconds(),
+            "count": self.count,
+            "until": self.until.isoformat("minutes") if self.until else None,
+            "days": self.days,
+            "breaks": [
+                {
+                    "at": b.at.isoformat("minutes"),
+                    "duration": b.duration.total_seconds(),
+                }
+                for b in self.breaks
+            ],
+            "game_count": self.game_count,
+            "announcement_file": (
+                str(self.announcement_file) if self.announcement_file else None
+            ),
+            "playlist": self.playlist.name if self.playlist else None,
+        }
+
+    @classmethod
+    def from_json_obj(
+        cls,
+        name: str,
+        obj: dict,
+        playlists: dict[str, SpotifyPlaylist],
+        root_dir: pathlib.Path,
+    ):
+        announcement_file = None
+        if ann_file_str := obj.get("announcement_file", None):
+            announcement_file = _get_announcement_file(root_dir, ann_file_str)
+
+        if pl_key := obj.get("playlist", None):
+            pl = playlists.get(pl_key, None)
+        else:
+            pl = None
+
+        until = obj.get("until", None)
+
+        s = cls(
+            name,
+            start=util.parse_datetime_str(obj["start"]),
+            interval=util.parse_timedelta_str(obj["interval"]),
+            duration=util.parse_timedelta_str(obj["duration"]),
+            count=obj.get("count", None),
+            until=None if until is None else _parse_time_of_day(until),
+            days=obj.get("days", 1),
+            breaks=tuple(
+                sorted(
+                    (
+                        SeriesBreak(
+                            _parse_time_of_day(b["at"]),
+                            util.parse_timedelta_str(b["duration"]),
+                        )
+                        for b in obj.get("breaks", ())
+                    ),
+                    key=lambda b: b.at,
+                )
+            ),
+            name_format=obj.get("name", DEFAULT_NAME_FORMAT),
+            announcement_file=announcement_file,
+            playlist=pl,
+        )
+
+        logger.info(
+            'Parsed game series "%s" (first game at %s, every %s)',
+            s.name,
+            s.start,
+            s.interval,
+        )
+
+        return s
@@ -0,0 +1,72 @@
+import functools
+import json
+import logging
+import pathlib
+
+import jsonschema
+import jsonschema.exceptions
+import jsonschema.validators
+
+logger = logging.getLogger(__name__)
+
+schema_file = pathlib.Path(__file__).with_name("schema.json")
+
+
+@functools.cache
+def get_validator():
+    # The schema is checked against its meta-schema (the expensive part) once per
+    # process, as the validator is cached
+    with schema_file.open() as fs:
+        schema = json.load(fs)
+
+    validator_cls = jsonschema.validators.validator_for(schema)
+    try:
+        validator_cls.check_schema(schema)
+    except jsonschema.exceptions.SchemaError as exc:
+        raise RuntimeError("Config schema is not a valid schema") from exc
+
+    logger.debug("Config schema validator compiled")
+    return validator_cls(schema)
+
+
+def _get_config_path(
+    error: jsonschema.exceptions.ValidationError, location: str = "config"
+) -> str:
+    path_in_config = location
+    for rp in error.absolute_path:
+        path_in_config += f"[{str(rp)}]"
+
+    return path_in_config
+
+
+def validate_against_schema(
+    cfg_json, definition: str | None = None, location: str = "config"
+):
+    # definition validates against one of the schema's definitions (e.g. a single game)
+    validator = get_validator()
+    if definition is not None:
+        validator = validator.evolve(schema=validator.schema["definitions"][definition])
+
+    what = location[:1].upper() + location[1:]
+    errors = sorted(
+        validator.iter_errors(cfg_json),
+        key=lambda e: [str(p) for p in e.absolute_path],
+    )
+
+    if len(errors) == 1:
+        e = errors[0]
+        msg = f"{what} is invalid: " + str(e.message)
+        if e.absolute_path or definition is None:
+            msg += "; occured on " + _get_config_path(e, location)
+
+        raise RuntimeError(msg) from e
+    elif errors:
+        raise RuntimeError(
+            f"{what} is invalid ({len(errors)} problems):\n"
+            + "\n".join(
+                f"- {e.message}; occured on {_get_config_path(e, location)}"
+                for e in errors
+            )
+        ) from errors[0]
+
+    logger.debug("%s validated against schema", location)
@@ -0,0 +1,307 @@
+import abc
+import datetime
+import json
+import logging
+import pathlib
+import queue
+import socket
+import threading
+import time
+import urllib.request
+
+from jingleplayer import metrics
+
+logger = logging.getLogger(__name__)
+
+# Events that are not yet written to a sink. If a sink falls this far behind, further
+# events for it are dropped (and counted) instead of delaying playback.
+DEFAULT_QUEUE_SIZE = 1000
+
+# How long stop() waits for the remaining events to be written (s)
+STOP_TIMEOUT = 5.0
+
+_STOP = object()
+
+
+def _to_json(obj):
+    # Event data is passed as is and only converted on the sink's thread
+    if hasattr(obj, "to_record"):
+        return obj.to_record()
+    if hasattr(obj, "get_description_str"):
+        return obj.get_description_str()
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+
+    return str(obj)
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, default=_to_json)
+
+
+# region sinks
+class EventSink(abc.ABC):
+    # Events are collected into batches of up to BATCH_SIZE events. After the first
+    # event of a batch, the sink waits up to BATCH_INTERVAL seconds for more.
+    BATCH_SIZE = 100
+    BATCH_INTERVAL = 0.0
+
+    @property
+    @abc.abstractmethod
+    def name(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def write(self, records: list[dict]):
+        # Raises if the events could not be written
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonLinesFileSink(EventSink):
+    def __init__(self, file: pathlib.Path):
+        self.file = file
+        self._fs = None
+
+    @property
+    def name(self):
+        return f"file:{self.file}"
+
+    def write(self, records: list[dict]):
+        if self._fs is None:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            self._fs = self.file.open("a", encoding="utf-8")
+
+        self._fs.writelines(_dumps(r) + "\n" for r in records)
+        self._fs.flush()
+
+    def close(self):
+        if self._fs is not None:
+            self._fs.close()
+            self._fs = None
+
+
+class UnixSocketSink(EventSink):
+    # Writes JSON lines to a stream socket, e.g. one created with
+    # socat UNIX-LISTEN:/tmp/jingleplayer.sock,fork -
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._sock: socket.socket | None = None
+
+    @property
+    def name(self):
+        return f"unix:{self.path}"
+
+    def _send(self, data: bytes):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(2)
+            try:
+                sock.connect(str(self.path))
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+
+        try:
+            self._sock.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def write(self, records: list[dict]):
+        data = "".join(_dumps(r) + "\n" for r in records).encode()
+
+        try:
+            self._send(data)
+        except OSError:
+            # The listener may have been restarted, so reconnect once
+            self._send(data)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class WebhookSink(EventSink):
+    # POSTs batches of events as a JSON array. Failed requests are retried with
+    # exponential backoff.
+    BATCH_SIZE = 50
+    BATCH_INTERVAL = 0.5
+
+    MAX_RETRIES = 3
+    RETRY_DELAY = 0.5
+    TIMEOUT = 2.0
+
+    def __init__(self, url: str):
+        self.url = url
+
+    @property
+    def name(self):
+        return self.url
+
+    def _post(self, body: bytes):
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.TIMEOUT):
+            pass
+
+    def write(self, records: list[dict]):
+        body = ("[" + ",".join(_dumps(r) for r in records) + "]").encode()
+
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                self._post(body)
+                return
+            except OSError:
+                if attempt == self.MAX_RETRIES:
+                    raise
+
+                logger.debug(
+                    "Posting events to %s failed, retrying", self.url, exc_info=True
+                )
+                time.sleep(self.RETRY_DELAY * 2**attempt)
+
+
+def parse_sink_str(s: str) -> EventSink:
+    if s.startswith(("http://", "https://")):
+        return WebhookSink(s)
+
+    kind, sep, target = s.partition(":")
+    if not sep or not target:
+        raise ValueError(
+            f'Invalid event sink "{s}". Use file:PATH, unix:PATH or an http(s):// URL.'
+        )
+
+    match kind:
+        case "file":
+            return JsonLinesFileSink(pathlib.Path(target))
+        case "unix":
+            return UnixSocketSink(pathlib.Path(target))
+        case _:
+            raise ValueError(
+                f'Unknown event sink type "{kind}" in "{s}". Use file:PATH, unix:PATH or an http(s):// URL.'
+            )
+
+
+# endregion
+
+
+# region workers
+class _SinkWorker:
+    # Each sink has its own queue and thread, so a slow sink does not hold up the others
+    def __init__(self, sink: EventSink, queue_size: int):
+        self.sink = sink
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(
+            target=self._run, name=f"events {sink.name}", daemon=True
+        )
+
+    def put(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment(f"events.dropped.{self.sink.name}")
+
+    def _next_batch(self) -> tuple[list[dict], bool]:
+        # Blocks until there is at least one event. Also returns if stop was requested.
+        first = self.queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.sink.BATCH_INTERVAL
+
+        while len(batch) < self.sink.BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            try:
+                record = (
+                    self.queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self.queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+
+            if record is _STOP:
+                return batch, True
+            batch.append(record)
+
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                self.sink.write(batch)
+                metrics.increment(f"events.written.{self.sink.name}", len(batch))
+            except Exception:
+                logger.warning(
+                    "Could not write %s events to %s",
+                    len(batch),
+                    self.sink.name,
+                    exc_info=True,
+                )
+                metrics.increment(f"events.failed.{self.sink.name}", len(batch))
+
+        self.sink.close()
+
+
+_lock = threading.Lock()
+_workers: list[_SinkWorker] = []
+
+
+def add_sink(sink: EventSink, queue_size: int = DEFAULT_QUEUE_SIZE):
+    # A queue_size of 0 never drops events, for sinks that must see every event and whose
+    # write never blocks
+    worker = _SinkWorker(sink, queue_size)
+    worker.thread.start()
+
+    with _lock:
+        _workers.append(worker)
+
+    logger.info("Sending events to %s", sink.name)
+
+
+def emit(event: str, **data):
+    # Only puts the event into the queues of the sinks, so it can be called right before
+    # and after triggers. Data is converted to JSON on the sinks' threads.
+    if not _workers:
+        return
+
+    record = {"event": event, "time": datetime.datetime.now(), **data}
+    for worker in _workers:
+        worker.put(record)
+
+
+def stop(timeout: float = STOP_TIMEOUT):
+    # Writes the remaining events. Sinks that do not finish in time are abandoned.
+    with _lock:
+        workers = _workers[:]
+        _workers.clear()
+
+    for worker in workers:
+        try:
+            worker.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            continue
+
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        worker.thread.join(max(0, deadline - time.monotonic()))
+
+
+# endregion
@@ -1,3 +1,5 @@
 from jingleplayer.execution.loop import (
     schedule_and_run_jingles as schedule_and_run_jingles,
 )
+from jingleplayer.execution.tasks import get_tasks as get_tasks
+from jingleplayer.execution.timeline import export_timeline as export_timeline
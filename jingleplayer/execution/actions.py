@@ -1,27 +1,17 @@
-from collections.abc import Iterable
-from datetime import timedelta
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
 from functools import reduce
 
-from jingleplayer import util
+from jingleplayer import util, waiting
 from jingleplayer.configuration import (
     Action,
     ActionGroup,
     Game,
     Jingle,
 )
-from jingleplayer.configuration.actions import (
-    AnnounceGameAction,
-    DelayAction,
-    NothingAction,
-    PausePlaybackAction,
-    PlayJingleAction,
-    ResumePlaybackAction,
-    SwitchToGamePlaylistAction,
-)
-from jingleplayer.playback_control import (
-    PlaybackController,
-    SpotifyDbusPlaybackController,
-)
+from jingleplayer.configuration.actions import DelayAction
+from jingleplayer.configuration.handlers import get_handler
+from jingleplayer.playback_control import PlaybackController
 
 
 def get_action_duration(
@@ -29,36 +19,7 @@ def get_action_duration(
     jingle: Jingle,
     game: Game,
 ) -> timedelta:
-    match action:
-        case NothingAction() | PausePlaybackAction() | ResumePlaybackAction():
-            return timedelta(0)
-
-        case DelayAction():
-            return action.duration
-
-        case PlayJingleAction():
-            if dur := jingle.audio_duration:
-                return dur
-
-            return timedelta(0)
-
-        case AnnounceGameAction():
-            if dur := game.announcement_duration:
-                return dur
-            else:
-                return timedelta(0)
-
-        case SwitchToGamePlaylistAction():
-            return timedelta(0)
-
-        case AnnounceGameAction():
-            if (pl := game.playlist) and (dur := pl.announcement_duration):
-                return dur
-
-            return timedelta(0)
-
-        case _:
-            raise TypeError("Unknown action type")
+    return get_handler(action).get_duration(action, jingle, game)
 
 
 def get_actiongroup_duration(
@@ -73,50 +34,41 @@ def get_actiongroup_duration(
     )
 
 
-def execute_action(
+def get_action_lead(
     action: Action,
     jingle: Jingle,
     game: Game,
     playback_controllers: Iterable[PlaybackController],
-):
-    match action:
-        case NothingAction():
-            pass
-
-        case DelayAction():
-            util.wait_for(action.duration.total_seconds())
-
-        case PausePlaybackAction():
-            for pc in playback_controllers:
-                pc.pause()
-
-        case ResumePlaybackAction():
-            for pc in playback_controllers:
-                pc.resume()
-
-        case PlayJingleAction():
-            if jingle.audiofile:
-                assert jingle.audiofile
-                util.play_audiofile(jingle.audiofile)
+) -> timedelta:
+    # How much earlier the action is executed to compensate its start-up latency
+    seconds = get_handler(action).get_start_latency(
+        action, jingle, game, playback_controllers
+    )
+    return timedelta(seconds=seconds)
 
-        case AnnounceGameAction():
-            if f := game.announcement_file:
-                util.play_audiofile(f)
 
-        case SwitchToGamePlaylistAction():
-            for pc in playback_controllers:
-                if not isinstance(pc, SpotifyDbusPlaybackController):
-                    continue
+def get_actiongroup_lead(
+    actiongroup: ActionGroup,
+    jingle: Jingle,
+    game: Game,
+    playback_controllers: Iterable[PlaybackController],
+    start_step: int = 0,
+) -> timedelta:
+    if start_step >= len(actiongroup.actions):
+        return util.ZERO_TD
 
-                if pl := game.playlist:
-                    pc.open_uri(pl.uri)
+    return get_action_lead(
+        actiongroup.actions[start_step], jingle, game, playback_controllers
+    )
 
-        case AnnounceGameAction():
-            if (pl := game.playlist) and (af := pl.announcement_file):
-                util.play_audiofile(af)
 
-        case _:
-            raise TypeError("Unknown action type")
+def execute_action(
+    action: Action,
+    jingle: Jingle,
+    game: Game,
+    playback_controllers: Iterable[PlaybackController],
+):
+    get_handler(action).execute(action, jingle, game, playback_controllers)
 
 
 def execute_actiongroup(
@@ -125,11 +77,40 @@ def execute_actiongroup(
     game: Game,
     playback_controllers: Iterable[PlaybackController],
     skip_trailing_delay: bool = True,
+    start_step: int = 0,
+    on_step_start: Callable[[int, Action], None] | None = None,
+    on_step_done: Callable[[int, Action], None] | None = None,
+    start: datetime | None = None,
+    waiter: waiting.Waiter | None = None,
 ):
+    # If start is given, each step is executed at its own time in the timeline of the
+    # group, less its start-up latency, instead of right after the previous step. Delays
+    # are then covered by waiting for the next step.
     trail_idx = len(actiongroup.actions) - 1
+    target = start
 
     for idx, action in enumerate(actiongroup.actions):
+        step_target = target
+        if target is not None:
+            target += get_action_duration(action, jingle, game)
+
+        if idx < start_step:
+            continue
+
         if skip_trailing_delay and idx == trail_idx and isinstance(action, DelayAction):
             break
 
-        execute_action(action, jingle, game, playback_controllers)
+        if step_target is not None:
+            lead = get_action_lead(action, jingle, game, playback_controllers)
+            util.wait_until(step_target - lead, waiter)
+
+        if on_step_start:
+            on_step_start(idx, action)
+
+        if step_target is None or not isinstance(action, DelayAction):
+            execute_action(action, jingle, game, playback_controllers)
+        elif idx == trail_idx:
+            util.wait_until(target, waiter)
+
+        if on_step_done:
+            on_step_done(idx, action)
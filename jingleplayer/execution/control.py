@@ -0,0 +1,168 @@
+import http.server
+import json
+import logging
+import threading
+import urllib.parse
+
+from jingleplayer import metrics, util
+
+from .schedule import INDEX_SIZE, Schedule, ScheduleError
+from .tasks import JingleOverlapError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPCOMING_COUNT = 10
+
+
+def _get_count(query: dict) -> int:
+    # Larger counts are capped to the schedule's index, so a request never makes the
+    # schedule expand (and hold its lock for) an unbounded number of tasks
+    n = int(query.get("n", [DEFAULT_UPCOMING_COUNT])[0])
+    if n < 1:
+        raise ValueError(f"n must be at least 1, got {n}")
+
+    return min(n, INDEX_SIZE)
+
+
+def get_status(schedule: Schedule, n: int = DEFAULT_UPCOMING_COUNT) -> dict:
+    now = util.now()
+
+    if current := schedule.current:
+        task, phase = current
+        state = {"state": "running", "task": task.to_record(), "phase": phase}
+    else:
+        state = {"state": "waiting"}
+
+    return {
+        "now": now.isoformat(),
+        **state,
+        "remaining_tasks": len(schedule),
+        "next": [t.to_record() for t in schedule.upcoming(n)],
+        "metrics": metrics.snapshot(),
+    }
+
+
+class _ControlRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Set on the subclass created by ControlServer
+    schedule: Schedule
+
+    def log_message(self, format, *args):
+        logger.info("Control API: " + format, *args)
+
+    def _send_json(self, status: int, obj):
+        body = json.dumps(obj).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return {}
+
+        return json.loads(self.rfile.read(length))
+
+    def _path_parts(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(p) for p in url.path.split("/") if p]
+        query = urllib.parse.parse_qs(url.query)
+        return parts, query
+
+    def _handle(self, method: str):
+        try:
+            parts, query = self._path_parts()
+            status, result = self._dispatch(method, parts, query)
+        except (ScheduleError, JingleOverlapError, ValueError, KeyError) as exc:
+            logger.info("Control API: rejected %s %s: %s", method, self.path, exc)
+            status, result = 400, {"error": str(exc)}
+        except Exception as exc:
+            logger.exception("Control API: error handling %s %s", method, self.path)
+            status, result = 500, {"error": str(exc)}
+
+        self._send_json(status, result)
+
+    def _dispatch(self, method: str, parts: list[str], query: dict):
+        schedule = self.schedule
+
+        match method, parts:
+            case "GET", ["status"]:
+                n = _get_count(query)
+                return 200, get_status(schedule, n)
+
+            case "GET", ["tasks"]:
+                n = _get_count(query)
+                return 200, [t.to_record() for t in schedule.upcoming(n)]
+
+            case "POST", ["tasks"]:
+                body = self._read_json()
+                if "at" in body:
+                    at = util.parse_datetime_str(body["at"])
+                else:
+                    at = util.now() + util.parse_timedelta_str(body["in"])
+
+                task = schedule.insert_jingle(body["jingle"], at)
+                return 201, task.to_record()
+
+            case "DELETE", ["tasks", task_id]:
+                return 200, schedule.cancel(task_id).to_record()
+
+            case "POST", ["games", game_name, "delay"]:
+                delta = util.parse_timedelta_str(self._read_json()["by"])
+                tasks = schedule.shift_game(game_name, delta)
+                return 200, [t.to_record() for t in tasks]
+
+            case "POST", ["games", game_name, ("start" | "end") as which]:
+                body = self._read_json()
+                if "at" in body:
+                    at = util.parse_datetime_str(body["at"])
+                else:
+                    at = util.now()
+
+                tasks = schedule.update_game(game_name, **{which: at})
+                return 200, [t.to_record() for t in tasks]
+
+            case _:
+                return 404, {"error": f"Unknown endpoint {method} /{'/'.join(parts)}"}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class ControlServer:
+    # Local HTTP/JSON interface to a running schedule. Requests are handled on their own
+    # threads and only touch the schedule through its (briefly held) lock, so they never
+    # block the scheduling loop.
+    def __init__(self, schedule: Schedule, port: int, host: str = "127.0.0.1"):
+        handler = type(
+            "ControlRequestHandler", (_ControlRequestHandler,), {"schedule": schedule}
+        )
+
+        self._server = http.server.ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="control-server", daemon=True
+        )
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self):
+        self._thread.start()
+        logger.info(
+            "Control API listening on http://%s:%s", self.address[0], self.address[1]
+        )
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,192 @@
+import collections
+import datetime
+import io
+import shutil
+import sys
+import threading
+
+from jingleplayer import events, metrics, util
+from jingleplayer.configuration.actions import DuckMusicAction, RestoreMusicAction
+from jingleplayer.configuration.handlers import get_handler
+
+from .journal import Phase
+from .schedule import Schedule
+
+# Redraws per second
+REFRESH_RATE = 4
+
+# Output of print() that is shown below the upcoming tasks
+MESSAGE_HISTORY = 200
+
+_CSI = "\x1b["
+_ENTER = _CSI + "?1049h" + _CSI + "?25l"  # alternate screen, hide cursor
+_LEAVE = _CSI + "?25h" + _CSI + "?1049l"
+_CLEAR = _CSI + "2J"
+
+
+def _format_countdown(td: datetime.timedelta) -> str:
+    seconds = max(0, int(td.total_seconds()))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+def _format_lateness(name: str) -> str:
+    if (o := metrics.peek(name)) is None or not o.count:
+        return "-"
+
+    return f"{o.last * 1000:.1f} ms (max {o.max * 1000:.1f} ms)"
+
+
+class _CapturedOutput(io.TextIOBase):
+    # Replaces sys.stdout while the dashboard is shown, so the messages of the
+    # scheduling loop end up in the dashboard instead of scrolling it away
+    def __init__(self):
+        self.lines: collections.deque[str] = collections.deque(maxlen=MESSAGE_HISTORY)
+        self._partial = ""
+
+    def writable(self):
+        return True
+
+    def write(self, s: str) -> int:
+        *complete, self._partial = (self._partial + s).split("\n")
+        self.lines.extend(line for line in complete if line)
+        return len(s)
+
+
+class _DashboardSink(events.EventSink):
+    # Keeps track of the music's state from the executed actions, on the sink's thread
+    def __init__(self):
+        self.music = "unknown"
+
+    @property
+    def name(self):
+        return "dashboard"
+
+    def write(self, records: list[dict]):
+        for r in records:
+            if r["event"] != "action_finished":
+                continue
+
+            action, task = r["action"], r["task"]
+            if isinstance(action, DuckMusicAction):
+                self.music = "ducked"
+            elif isinstance(action, RestoreMusicAction):
+                self.music = "playing"
+            elif state := get_handler(action).get_resulting_playback_state(
+                action, task.jingle, task.game
+            ):
+                self.music = str(state)
+
+
+class Dashboard:
+    # Shows the current and upcoming tasks with countdowns on the terminal. It runs on
+    # its own thread and only reads state that is published without locks (the
+    # schedule's view, the current task, metrics), so drawing never delays a trigger.
+    # Only lines that changed since the last frame are written.
+    def __init__(self, schedule: Schedule):
+        self.schedule = schedule
+
+        self._out = sys.stdout
+        self._captured = _CapturedOutput()
+        self._sink = _DashboardSink()
+        self._frame: list[str] = []
+        self._size: tuple[int, int] | None = None
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dashboard", daemon=True)
+
+    # region rendering
+    def _render(self, width: int, height: int) -> list[str]:
+        now = util.now()
+        view = self.schedule.view
+
+        header = f"jingleplayer  {now:%Y-%m-%d %H:%M:%S}"
+        if offset := util.get_clock_offset():
+            header += f"  (synced, clock offset {offset * 1000:+.1f} ms)"
+
+        if current := self.schedule.current:
+            task, phase = current
+            now_line = f'Now:   "{task.jingle.name}" for "{task.game.name}" ({phase})'
+        else:
+            now_line = "Now:   waiting"
+
+        lines = [
+            header,
+            "",
+            now_line,
+            f"Music: {self._sink.music}",
+            "Lateness: pre_actions "
+            + _format_lateness(f"trigger.{Phase.PRE_ACTIONS}.lateness_s")
+            + ", actions "
+            + _format_lateness(f"trigger.{Phase.ACTIONS}.lateness_s"),
+            "",
+        ]
+
+        # At least a few messages are shown, the rest of the screen is for tasks
+        messages = list(self._captured.lines)
+        n_messages = min(len(messages), max(3, height // 4))
+        n_tasks = max(0, height - len(lines) - 3 - (n_messages + 2 if messages else 0))
+        upcoming = view.upcoming[:n_tasks]
+
+        lines.append(f"Upcoming ({len(upcoming)} of {view.total})")
+        lines.append(f"{'In':>9}  {'Trigger':<8}  {'Jingle':<24}  Game")
+        for t in upcoming:
+            lines.append(
+                f"{_format_countdown(t.action_start - now):>9}  {t.action_start:%H:%M:%S}  {t.jingle.name:<24.24}  {t.game.name}"
+            )
+
+        if messages:
+            lines += ["", "Messages"]
+            lines += messages[len(messages) - n_messages :]
+
+        return [line[:width] for line in lines[:height]]
+
+    def _draw(self):
+        width, height = shutil.get_terminal_size()
+        frame = self._render(width, height)
+
+        out = []
+        if (width, height) != self._size:
+            out.append(_CLEAR)
+            self._frame = []
+            self._size = (width, height)
+
+        for row, line in enumerate(frame):
+            if row >= len(self._frame) or self._frame[row] != line:
+                out.append(f"{_CSI}{row + 1};1H{line}{_CSI}K")
+
+        # Lines that are not used anymore are cleared
+        for row in range(len(frame), len(self._frame)):
+            out.append(f"{_CSI}{row + 1};1H{_CSI}K")
+
+        self._frame = frame
+        if out:
+            self._out.write("".join(out))
+            self._out.flush()
+
+    # endregion
+
+    def _run(self):
+        while not self._stop.wait(1 / REFRESH_RATE):
+            self._draw()
+
+    def start(self):
+        events.add_sink(self._sink)
+
+        self._out.write(_ENTER)
+        self._draw()
+        sys.stdout = self._captured
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+        sys.stdout = self._out
+        self._out.write(_LEAVE)
+        self._out.flush()
+
+        # The messages are printed again, so they are not lost with the dashboard
+        for line in self._captured.lines:
+            print(line)
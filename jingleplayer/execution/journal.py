@@ -0,0 +1,186 @@
+import datetime
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import StrEnum, auto
+
+from jingleplayer.playback_control import PlaybackState
+
+logger = logging.getLogger(__name__)
+
+type TaskKey = tuple[str, str, str]
+
+# Records are flushed to the OS immediately, which makes them survive a crash of this
+# process. fsync (which makes them survive a power loss, but can take a while on SD
+# cards) is done in batches on a background thread.
+DEFAULT_FSYNC_INTERVAL_S = 1.0
+
+
+class Phase(StrEnum):
+    PRE_ACTIONS = auto()
+    ACTIONS = auto()
+
+
+class JournalEvent(StrEnum):
+    TASK_STARTED = auto()
+    STEP_DONE = auto()
+    TASK_DONE = auto()
+    PLAYBACK_STATE = auto()
+
+
+@dataclass
+class TaskProgress:
+    key: TaskKey
+    # Phase and index of the last finished step; None if no step finished yet
+    phase: Phase | None = None
+    step: int | None = None
+
+    @property
+    def next_pre_action_step(self) -> int:
+        match self.phase:
+            case None:
+                return 0
+            case Phase.PRE_ACTIONS:
+                return self.step + 1  # type: ignore
+            case Phase.ACTIONS:
+                return -1  # all pre actions are done
+
+    @property
+    def next_action_step(self) -> int:
+        if self.phase == Phase.ACTIONS:
+            return self.step + 1  # type: ignore
+
+        return 0
+
+
+@dataclass
+class JournalState:
+    done: set[TaskKey] = field(default_factory=set)
+    interrupted: TaskProgress | None = None
+    playback_state: PlaybackState | None = None
+
+
+def _decode_key(k: list[str]) -> TaskKey:
+    return (k[0], k[1], k[2])
+
+
+def replay(path: pathlib.Path) -> JournalState:
+    state = JournalState()
+
+    if not path.is_file():
+        logger.info('No journal at "%s", starting from scratch', path)
+        return state
+
+    with path.open(encoding="utf-8") as fs:
+        for lineno, line in enumerate(fs, start=1):
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash in the middle of a write leaves a torn last line behind
+                logger.warning('Ignoring corrupt journal line %s in "%s"', lineno, path)
+                continue
+
+            match rec["event"]:
+                case JournalEvent.TASK_STARTED:
+                    state.interrupted = TaskProgress(_decode_key(rec["task"]))
+                case JournalEvent.STEP_DONE:
+                    state.interrupted = TaskProgress(
+                        _decode_key(rec["task"]), Phase(rec["phase"]), rec["step"]
+                    )
+                case JournalEvent.TASK_DONE:
+                    state.done.add(_decode_key(rec["task"]))
+                    state.interrupted = None
+                case JournalEvent.PLAYBACK_STATE:
+                    state.playback_state = PlaybackState(rec["state"])
+
+    logger.info(
+        'Replayed journal "%s": %s tasks done, interrupted: %s, playback state: %s',
+        path,
+        len(state.done),
+        state.interrupted,
+        state.playback_state,
+    )
+    return state
+
+
+class Journal:
+    def __init__(
+        self, path: pathlib.Path, fsync_interval_s: float = DEFAULT_FSYNC_INTERVAL_S
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+
+        self._fs = path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = False
+
+        self._fsync_interval_s = fsync_interval_s
+        self._fsync_thread = threading.Thread(
+            target=self._fsync_loop, name="journal-fsync", daemon=True
+        )
+        self._fsync_thread.start()
+
+    def _write(self, event: JournalEvent, **fields):
+        rec = {
+            "time": datetime.datetime.now().isoformat(),
+            "event": str(event),
+            **fields,
+        }
+        line = json.dumps(rec, separators=(",", ":")) + "\n"
+
+        with self._lock:
+            self._fs.write(line)
+            self._fs.flush()
+
+        self._dirty.set()
+
+    def _fsync_loop(self):
+        while not self._closed:
+            self._dirty.wait()
+            self._dirty.clear()
+            self.sync()
+
+            # Batches all records written during the interval into the next fsync
+            time.sleep(self._fsync_interval_s)
+
+    def sync(self):
+        with self._lock:
+            if self._fs.closed:
+                return
+
+            self._fs.flush()
+            fd = self._fs.fileno()
+
+        # fsync outside of the lock, so it does not hold up writes from the scheduler
+        try:
+            os.fsync(fd)
+        except OSError:
+            if not self._closed:
+                raise
+
+    def close(self):
+        self._closed = True
+
+        with self._lock:
+            self._fs.flush()
+            os.fsync(self._fs.fileno())
+            self._fs.close()
+
+        self._dirty.set()
+
+    def task_started(self, key: TaskKey):
+        self._write(JournalEvent.TASK_STARTED, task=key)
+
+    def step_done(self, key: TaskKey, phase: Phase, step: int):
+        self._write(JournalEvent.STEP_DONE, task=key, phase=str(phase), step=step)
+
+    def task_done(self, key: TaskKey):
+        self._write(JournalEvent.TASK_DONE, task=key)
+
+    def playback_state(self, state: PlaybackState):
+        self._write(JournalEvent.PLAYBACK_STATE, state=str(state))
@@ -1,69 +1,361 @@
 import datetime
 import logging
+import pathlib
 from collections.abc import Iterable
 
 import humanize
 
-from jingleplayer import util
-from jingleplayer.configuration import Config
-from jingleplayer.playback_control import PlaybackController
+from jingleplayer import events, metrics, util, waiting
+from jingleplayer.configuration import Action, Config
+from jingleplayer.configuration.handlers import get_handler
+from jingleplayer.playback_control import PlaybackController, PlaybackState
 
-from .actions import execute_actiongroup
-from .tasks import GameJingleTask, get_tasks
+from . import journal, timeline
+from .actions import execute_actiongroup, get_actiongroup_lead
+from .control import ControlServer
+from .dashboard import Dashboard
+from .journal import Journal, JournalState, Phase, TaskProgress
+from .schedule import Schedule
+from .sync import SyncFollower, SyncLeader
+from .tasks import (
+    GameJingleTask,
+    check_for_overlaps,
+    find_task,
+    get_game_tasks,
+    get_task_count,
+    iter_tasks,
+)
 
 logger = logging.getLogger(__name__)
 
+# How long after its scheduled end an interrupted task is still finished after a restart
+DEFAULT_RESUME_GRACE = datetime.timedelta(seconds=30)
 
-def _run_task(task: GameJingleTask, pcs: Iterable[PlaybackController]):
+# Used for waits inside of a task, which must not be cut short by wake-ups meant for the
+# scheduling loop
+_task_waiter = waiting.create_waiter()
+
+
+def _run_task(
+    task: GameJingleTask,
+    pcs: Iterable[PlaybackController],
+    jrnl: Journal | None = None,
+    progress: TaskProgress | None = None,
+    schedule: Schedule | None = None,
+    compensate_latency: bool = False,
+):
     j = task.jingle
     e = task.game
+    key = task.key
+
+    def on_step_start(phase: Phase):
+        def callback(idx: int, action: Action):
+            events.emit(
+                "action_started", task=task, phase=phase, step=idx, action=action
+            )
+
+        return callback
+
+    def on_step_done(phase: Phase):
+        def callback(idx: int, action: Action):
+            events.emit(
+                "action_finished", task=task, phase=phase, step=idx, action=action
+            )
+
+            if jrnl is None:
+                return
+
+            jrnl.step_done(key, phase, idx)
+
+            handler = get_handler(action)
+            if state := handler.get_resulting_playback_state(action, j, e):
+                jrnl.playback_state(state)
+
+        return callback
+
+    def start_phase(phase: Phase, target: datetime.datetime):
+        lateness = (util.now() - target).total_seconds()
+        metrics.observe(f"trigger.{phase}.lateness_s", lateness)
+
+        if schedule:
+            schedule.current = (task, str(phase))
+
+    events.emit("task_started", task=task, resumed=progress is not None)
+
+    if progress is None:
+        progress = TaskProgress(key)
+        if jrnl:
+            jrnl.task_started(key)
+
+    def run_phase(phase: Phase, actiongroup, start: datetime.datetime, step: int):
+        # With latency compensation, steps are started early by their start-up latency
+        # and each one at its own time, so that latencies do not add up
+        target = start
+        if compensate_latency:
+            target -= get_actiongroup_lead(actiongroup, j, e, pcs, step)
+
+        util.wait_until(target, _task_waiter)
+        start_phase(phase, target)
+        execute_actiongroup(
+            actiongroup,
+            j,
+            e,
+            pcs,
+            start_step=step,
+            on_step_start=on_step_start(phase),
+            on_step_done=on_step_done(phase),
+            start=start if compensate_latency else None,
+            waiter=_task_waiter,
+        )
 
-    logger.info("Waiting for jingle pre_action trigger time")
-    util.wait_until(task.start)
-    execute_actiongroup(j.pre_actions, j, e, pcs)
+    if (pre_step := progress.next_pre_action_step) >= 0:
+        logger.info("Waiting for jingle pre_action trigger time")
+        run_phase(Phase.PRE_ACTIONS, task.pre_actions, task.start, pre_step)
 
     logger.info("Waiting for jingle trigger time")
-    util.wait_until(task.action_start)
-    execute_actiongroup(j.actions, j, e, pcs)
+    run_phase(Phase.ACTIONS, task.actions, task.action_start, progress.next_action_step)
+
+    if jrnl:
+        jrnl.task_done(key)
+
+    events.emit("task_finished", task=task)
+
+    if schedule:
+        schedule.current = None
+
+
+def _find_resumable_task(
+    cfg: Config,
+    game_tasks: list[GameJingleTask],
+    state: JournalState,
+    now: datetime.datetime,
+    grace: datetime.timedelta,
+):
+    if (progress := state.interrupted) is None:
+        return None
+
+    # Looked up by its key, without going through the tasks before it
+    task = find_task(cfg, progress.key, game_tasks)
+    if task is None or task.start >= now:
+        # Tasks that did not start yet (e.g. after the clock was changed) run as usual
+        logger.info(
+            "Interrupted task %s is not part of the schedule anymore", progress.key
+        )
+        return None
+
+    if now > task.end + grace:
+        logger.info(
+            "Interrupted task %s ended at %s, which is more than %s ago. Not resuming it.",
+            progress.key,
+            task.end,
+            grace,
+        )
+        return None
+
+    return task, progress
+
+
+def _restore_playback(
+    state: JournalState,
+    resuming_task: bool,
+    pcs: Iterable[PlaybackController],
+    jrnl: Journal | None,
+):
+    # A resumed task resumes playback itself if it is configured to
+    if resuming_task or state.playback_state != PlaybackState.PAUSED:
+        return
+
+    s = "The previous run was interrupted while playback was paused. Resuming playback."
+    logger.info(s)
+    print(s)
+    print()
+
+    for pc in pcs:
+        pc.resume()
+
+    if jrnl:
+        jrnl.playback_state(PlaybackState.PLAYING)
 
 
 def schedule_and_run_jingles(
-    cfg: Config, playback_controllers: Iterable[PlaybackController]
+    cfg: Config,
+    playback_controllers: Iterable[PlaybackController],
+    journal_file: pathlib.Path | None = None,
+    resume_grace: datetime.timedelta = DEFAULT_RESUME_GRACE,
+    waiter: waiting.Waiter | None = None,
+    control_port: int | None = None,
+    timeline_file: pathlib.Path | None = None,
+    sync_leader: tuple[str, int] | None = None,
+    sync_follower: tuple[str, int] | None = None,
+    compensate_latency: bool = False,
+    dashboard: bool = False,
 ):
+    # Waking up the waiter makes the loop re-evaluate the schedule before the next task
+    waiter = waiter or waiting.DEFAULT_WAITER
+
     if any(pc.CAN_ONLY_TOGGLE for pc in playback_controllers):
         print(
             "WARNING: At least one of the configured playback controllers can not reliably pause or resume playback, but just toggle between them. Make sure that music playback is running before you start the program for playback control to work properly."
         )
         print()
 
-    logger.debug("Generating tasks")
-    tasks = get_tasks(cfg)
-    logger.info(f"Generated {len(tasks)} tasks")
+    n_tasks = get_task_count(cfg)
+    logger.info("Scheduling %s tasks", n_tasks)
+
+    # All tasks are checked for overlaps once before anything is scheduled, without
+    # keeping them. The tasks of the listed games are created once for all passes.
+    game_tasks = get_game_tasks(cfg)
+    check_for_overlaps(cfg, game_tasks)
+
+    if journal_file:
+        state = journal.replay(journal_file)
+        jrnl = Journal(journal_file)
+    else:
+        state = JournalState()
+        jrnl = None
 
     logger.debug("Starting scheduling loop")
-    print(f"Loaded config. Scheduling {len(tasks)} jingles in total).")
+    print(f"Loaded config. Scheduling {n_tasks} jingles in total).")
     print()
 
-    for t in tasks:
-        now = datetime.datetime.now()
+    now = util.now()
 
-        if t.start < now:
-            logger.info(
-                f'Skipping jingle "{t.jingle.name}" for game "{t.game.name}": start time {t.start} has already passed (now: {now})'
-            )
+    # Tasks are created as the schedule advances (see Schedule), from the first one that
+    # did not start yet. Tasks (and series games) before it are skipped by their start
+    # without being created.
+    def iter_upcoming():
+        tasks = iter_tasks(cfg, check_overlaps=False, game_tasks=game_tasks, since=now)
+        return (t for t in tasks if t.key not in state.done)
+
+    n_upcoming = get_task_count(cfg, since=now, game_tasks=game_tasks)
+    resumable = _find_resumable_task(cfg, game_tasks, state, now, resume_grace)
+
+    if n_started := n_tasks - n_upcoming:
+        logger.info("Skipping %s tasks with start times before %s", n_started, now)
+        print(f"Skipping {n_started} jingles whose start time has already passed.")
+        print()
+
+    schedule = Schedule(cfg, (), pending=iter_upcoming(), pending_count=n_upcoming)
+    schedule.add_listener(waiter.wake)
+    announced = None
+
+    # Started first, so the following messages are shown in it
+    dash = None
+    if dashboard:
+        dash = Dashboard(schedule)
+        dash.start()
+
+    if timeline_file:
+        # Written from its own pass over the tasks, which are not kept
+        timeline.follow_schedule(iter_upcoming(), timeline_file)
+
+    server = None
+    if control_port is not None:
+        server = ControlServer(schedule, control_port)
+        server.start()
+
+        host, port = server.address
+        print(f"Control API is available at http://{host}:{port}")
+        print()
+
+    leader = None
+    if sync_leader is not None:
+        leader = SyncLeader(sync_leader[1], sync_leader[0])
+        leader.start()
+
+        host, port = leader.address
+        print(f"Sync leader: followers can connect to port {port} ({host})")
+        print()
+
+    follower = None
+    if sync_follower is not None:
+        # Offset changes re-evaluate the wait for the next task, like schedule edits
+        follower = SyncFollower(schedule, *sync_follower, on_offset_change=waiter.wake)
+        follower.start()
+
+        print(
+            f"Sync follower: following the leader at {sync_follower[0]}:{sync_follower[1]}"
+        )
+        print()
+
+    try:
+        _restore_playback(state, resumable is not None, playback_controllers, jrnl)
+
+        if resumable:
+            t, progress = resumable
+            logger.info("Resuming interrupted task %s after %s", t.key, progress)
             print(
-                f'Skipping jingle "{t.jingle.name}" for game "{t.game.name}": start time has already passed {humanize.naturaltime(now - t.start)}'
+                f'Resuming interrupted jingle "{t.jingle.name}" for game "{t.game.name}"'
+            )
+            _run_task(
+                t, playback_controllers, jrnl, progress, schedule, compensate_latency
             )
             print()
-            continue
 
-        logger.info(f'Next: jingle "{t.jingle.name}" for game "{t.game.name}"')
-        print(
-            f'Next: jingle "{t.jingle.name}" for game "{t.game.name}" (trigger is in {humanize.naturaldelta(t.action_start - now)})'
-        )
+        while (t := schedule.peek()) is not None:
+            now = util.now()
 
-        _run_task(t, playback_controllers)
+            if t.start < now:
+                if not schedule.take(t):
+                    continue
 
-        print()
+                logger.info(
+                    'Skipping jingle "%s" for game "%s": start time %s has already passed (now: %s)',
+                    t.jingle.name,
+                    t.game.name,
+                    t.start,
+                    now,
+                )
+                events.emit("task_skipped", task=t, reason="start time has passed")
+                print(
+                    f'Skipping jingle "{t.jingle.name}" for game "{t.game.name}": start time has already passed {humanize.naturaltime(now - t.start)}'
+                )
+                print()
+                continue
+
+            if announced is not t:
+                logger.info(
+                    'Next: jingle "%s" for game "%s"', t.jingle.name, t.game.name
+                )
+                events.emit("task_scheduled", task=t)
+                print(
+                    f'Next: jingle "{t.jingle.name}" for game "{t.game.name}" (trigger is in {humanize.naturaldelta(t.action_start - now)})'
+                )
+                announced = t
+
+            trigger = t.start
+            if compensate_latency:
+                trigger -= get_actiongroup_lead(
+                    t.pre_actions, t.jingle, t.game, playback_controllers
+                )
+
+            if not util.wait_until(trigger, waiter) or not schedule.take(t):
+                logger.info("Schedule changed, re-evaluating next task")
+                continue
+
+            _run_task(
+                t,
+                playback_controllers,
+                jrnl,
+                schedule=schedule,
+                compensate_latency=compensate_latency,
+            )
+
+            print()
+    finally:
+        if dash:
+            dash.stop()
+
+        if server:
+            server.stop()
+
+        if leader:
+            leader.stop()
+
+        if follower:
+            follower.stop()
+
+        if jrnl:
+            jrnl.close()
 
     logger.info("All jingles played, schedule loop exiting")
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import subprocess
+import threading
+import wave
+from collections.abc import Iterator
+from datetime import timedelta
+
+from jingleplayer.audio import cache
+from jingleplayer.audio.cache import AudioCache, CacheEntry
+from jingleplayer.configuration import Action, ActionGroup, Game, Jingle
+from jingleplayer.configuration.actions import DelayAction, PlayRenderedAudioAction
+from jingleplayer.configuration.handlers import AudioActionHandler, get_handler
+
+logger = logging.getLogger(__name__)
+
+_FRAME_SIZE = cache.CHANNELS * cache.SAMPLE_WIDTH
+_SILENCE_CHUNK = bytes(cache.SAMPLE_RATE * _FRAME_SIZE)
+
+# Renders of the same segment from several threads would write the same file
+_render_lock = threading.Lock()
+
+# A cached clip, or the number of frames of silence for a delay
+type _Item = CacheEntry | int
+
+
+def _get_item(action: Action, jingle: Jingle, game: Game, ac: AudioCache):
+    if isinstance(action, DelayAction):
+        return round(action.duration.total_seconds() * cache.SAMPLE_RATE)
+
+    handler = get_handler(action)
+    if not isinstance(handler, AudioActionHandler):
+        return None
+
+    if (a := handler.get_audio(action, jingle, game)) is None:
+        return None
+
+    try:
+        return ac.get(a[0]) or ac.add(a[0])
+    except (OSError, subprocess.CalledProcessError, RuntimeError) as exc:
+        # The file could not be read or decoded, or ffmpeg is missing
+        logger.warning(
+            '"%s" can not be rendered and is played on its own: %s', a[0], exc
+        )
+        return None
+
+
+def _silence(frames: int) -> Iterator[bytes]:
+    remaining = frames * _FRAME_SIZE
+    while remaining > 0:
+        chunk = _SILENCE_CHUNK[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _pcm_chunks(items: list[_Item]) -> Iterator[bytes | memoryview]:
+    for item in items:
+        if isinstance(item, int):
+            yield from _silence(item)
+        else:
+            yield item.map_pcm()
+
+
+def _render(segment: list[tuple[Action, _Item]], ac: AudioCache):
+    items = [item for _, item in segment]
+
+    # Named after its contents, so a segment is only rendered once across all tasks
+    # and runs, and changed source files lead to a new render
+    h = hashlib.blake2b(digest_size=20)
+    for item in items:
+        h.update(
+            f"silence:{item}".encode()
+            if isinstance(item, int)
+            else item.content_hash.encode()
+        )
+        h.update(b"\0")
+    path = ac.cache_dir / f"rendered-{h.hexdigest()}.wav"
+
+    with _render_lock:
+        if not path.is_file():
+            logger.debug("Rendering %s segment parts to %s", len(items), path)
+            cache.write_wav(path, _pcm_chunks(items))
+
+    with wave.open(str(path), "rb") as w:
+        duration = timedelta(seconds=w.getnframes() / cache.SAMPLE_RATE)
+
+    return PlayRenderedAudioAction(path, duration, [a for a, _ in segment])
+
+
+def render_actiongroup(
+    actiongroup: ActionGroup, jingle: Jingle, game: Game, ac: AudioCache
+) -> ActionGroup:
+    # Replaces runs of audio actions (and the delays between them) with a single
+    # rendered clip, so they play without the backend's start-up delay in between
+    steps: list[Action] = []
+    run: list[tuple[Action, _Item]] = []
+
+    def flush():
+        # Delays at the edges of a run do not separate clips and are kept as they are,
+        # e.g. so that a trailing delay can still be skipped
+        start, end = 0, len(run)
+        while start < end and isinstance(run[start][1], int):
+            start += 1
+        while end > start and isinstance(run[end - 1][1], int):
+            end -= 1
+
+        segment = run[start:end]
+        steps.extend(a for a, _ in run[:start])
+        if sum(not isinstance(item, int) for _, item in segment) >= 2:
+            steps.append(_render(segment, ac))
+        else:
+            steps.extend(a for a, _ in segment)
+        steps.extend(a for a, _ in run[end:])
+
+        run.clear()
+
+    for action in actiongroup.actions:
+        if (item := _get_item(action, jingle, game, ac)) is None:
+            flush()
+            steps.append(action)
+        else:
+            run.append((action, item))
+    flush()
+
+    if len(steps) == len(actiongroup.actions):
+        return actiongroup
+
+    return ActionGroup(steps)
+
+
+def get_task_actiongroups(
+    jingle: Jingle, game: Game
+) -> tuple[ActionGroup, ActionGroup]:
+    # Action groups to execute for a task: rendered if the audio cache is active
+    if (ac := cache.ACTIVE_CACHE) is None:
+        return jingle.pre_actions, jingle.actions
+
+    return (
+        render_actiongroup(jingle.pre_actions, jingle, game, ac),
+        render_actiongroup(jingle.actions, jingle, game, ac),
+    )
@@ -0,0 +1,407 @@
+import bisect
+import dataclasses
+import datetime
+import itertools
+import logging
+import operator
+import threading
+from collections.abc import Callable, Iterable, Iterator
+
+from jingleplayer import events
+from jingleplayer.configuration import Config, Game
+from jingleplayer.configuration.games import propagate_game_change
+
+from .tasks import GameJingleTask, JingleOverlapError, get_tasks_for_game
+
+logger = logging.getLogger(__name__)
+
+_sort_key = operator.attrgetter("start", "end")
+
+# Number of upcoming tasks in Schedule.view
+VIEW_SIZE = 100
+# Number of tasks that are kept in the index, the rest stays pending
+INDEX_SIZE = 2 * VIEW_SIZE
+
+
+class ScheduleError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class ScheduleView:
+    # Copy of the head of the schedule. It is replaced (never changed) after each edit,
+    # so readers like the dashboard can use it without taking the lock.
+    version: int
+    upcoming: tuple[GameJingleTask, ...]
+    total: int
+
+
+class Schedule:
+    # Live, sorted index of the tasks still to run. It is shared between the scheduling
+    # loop and the control interface, so all access goes through a lock that is only ever
+    # held for a bisect and a list insert/delete. Listeners are called after each edit
+    # (outside of the lock), e.g. to wake up the scheduling loop.
+    # Pending tasks (sorted) are only moved into the index when they get close to the
+    # front, so long schedules (e.g. of game series) are created as they advance.
+    # pending_count is how many there are, if known. Taking a task (right before it is
+    # triggered) and edits do not wait for this: the index is refilled afterwards on a
+    # background thread, and pending tasks are created outside of the lock.
+    def __init__(
+        self,
+        cfg: Config,
+        tasks: Iterable[GameJingleTask],
+        pending: Iterable[GameJingleTask] = (),
+        pending_count: int = 0,
+    ):
+        self.cfg = cfg
+
+        self._tasks = sorted(tasks, key=_sort_key)
+        self._by_id = {t.id: t for t in self._tasks}
+        self._pending: Iterator[GameJingleTask] = iter(pending)
+        self._next_pending = next(self._pending, None)
+        self._pending_count = pending_count if self._next_pending else 0
+        # Games of series, which are not part of the config, from when their tasks
+        # were moved into the index on
+        self._series_games: dict[str, Game] = {}
+        self._lock = threading.Lock()
+        # Serializes moving pending tasks into the index, which is taken before _lock
+        self._fill_lock = threading.RLock()
+        self._refill_needed = threading.Event()
+        self._refill_thread: threading.Thread | None = None
+        # Serializes edits that are computed from the current games before being applied
+        self._edit_lock = threading.Lock()
+        self._listeners: list[Callable[[], None]] = []
+        self._adhoc_counter = itertools.count(1)
+
+        # Task that is currently executed by the scheduling loop and its phase
+        self.current: tuple[GameJingleTask, str] | None = None
+
+        self._fill()
+        self.view = ScheduleView(0, tuple(self._tasks[:VIEW_SIZE]), len(self))
+
+    def add_listener(self, listener: Callable[[], None]):
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def __len__(self):
+        return len(self._tasks) + self._pending_count
+
+    # region queries
+    def peek(self) -> GameJingleTask | None:
+        with self._lock:
+            if not self._needs_fill(1):
+                return self._tasks[0] if self._tasks else None
+
+        # The background refill has not caught up yet
+        self._fill(1)
+        with self._lock:
+            return self._tasks[0] if self._tasks else None
+
+    def upcoming(self, n: int) -> list[GameJingleTask]:
+        self._fill(n)
+        with self._lock:
+            return self._tasks[:n]
+
+    def get(self, task_id: str) -> GameJingleTask | None:
+        with self._lock:
+            return self._by_id.get(task_id)
+
+    def get_game(self, game_name: str) -> Game | None:
+        if (game := self.cfg.games.get(game_name)) is not None:
+            return game
+
+        with self._lock:
+            return self._series_games.get(game_name)
+
+    # endregion
+
+    # region pending tasks
+    def _needs_fill(self, n: int, until: tuple | None = None) -> bool:
+        # Whether the next pending task belongs among the first n tasks of the index, or
+        # (if set) up to the sort key until (lock must be held)
+        return (t := self._next_pending) is not None and (
+            len(self._tasks) < n
+            or _sort_key(t) < _sort_key(self._tasks[n - 1])
+            or (until is not None and _sort_key(t) <= until)
+        )
+
+    def _fill(self, n: int = INDEX_SIZE, until: tuple | None = None) -> int:
+        # Moves pending tasks into the index until the first n tasks are final, and (if
+        # set) all tasks up to the sort key until are in it. The following pending task
+        # is created outside of the lock, which is only held to insert each task.
+        # Returns the number of tasks that were moved.
+        moved = 0
+        with self._fill_lock:
+            while True:
+                with self._lock:
+                    if not self._needs_fill(n, until):
+                        return moved
+
+                    t = self._next_pending
+
+                following = next(self._pending, None)
+
+                with self._lock:
+                    self._next_pending = following
+                    self._pending_count = (
+                        max(0, self._pending_count - 1) if following else 0
+                    )
+
+                    if t.game.name not in self.cfg.games:
+                        self._series_games.setdefault(t.game.name, t.game)
+
+                    try:
+                        self._insert(t)
+                    except (JingleOverlapError, ScheduleError) as exc:
+                        # Pending tasks were not checked against edits of the schedule
+                        logger.warning("Not scheduling task %s: %s", t.id, exc)
+                        events.emit("task_skipped", task=t, reason=str(exc))
+
+                moved += 1
+
+    def _request_refill(self):
+        # Called after the index shrank or was edited, without holding the lock
+        if self._next_pending is None:
+            return
+
+        self._refill_needed.set()
+        with self._lock:
+            if self._refill_thread is None:
+                self._refill_thread = threading.Thread(
+                    target=self._run_refills, name="schedule-refill", daemon=True
+                )
+                self._refill_thread.start()
+
+    def _run_refills(self):
+        while self._next_pending is not None:
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            if self._fill():
+                with self._lock:
+                    self._publish()
+
+    # endregion
+
+    # region index maintenance (lock must be held)
+    def _publish(self):
+        self.view = ScheduleView(
+            self.view.version + 1, tuple(self._tasks[:VIEW_SIZE]), len(self)
+        )
+
+    def _index_of(self, task: GameJingleTask) -> int:
+        idx = bisect.bisect_left(self._tasks, _sort_key(task), key=_sort_key)
+        while self._tasks[idx] is not task:
+            idx += 1
+
+        return idx
+
+    def _remove(self, task: GameJingleTask):
+        del self._tasks[self._index_of(task)]
+        del self._by_id[task.id]
+
+    def _check_neighbours(self, idx: int):
+        if idx > 0 and self._tasks[idx].start < self._tasks[idx - 1].end:
+            raise JingleOverlapError(self._tasks[idx - 1], self._tasks[idx])
+
+        if (
+            idx + 1 < len(self._tasks)
+            and self._tasks[idx + 1].start < self._tasks[idx].end
+        ):
+            raise JingleOverlapError(self._tasks[idx], self._tasks[idx + 1])
+
+    def _insert(self, task: GameJingleTask):
+        if task.id in self._by_id:
+            raise ScheduleError(f'Task "{task.id}" is already scheduled')
+
+        bisect.insort(self._tasks, task, key=_sort_key)
+        self._by_id[task.id] = task
+
+        try:
+            self._check_neighbours(self._index_of(task))
+        except JingleOverlapError:
+            self._remove(task)
+            raise
+
+    def _replace(self, old: Iterable[GameJingleTask], new: Iterable[GameJingleTask]):
+        # Replaces all tasks in old with the ones in new, or none if there are overlaps
+        old = list(old)
+        new = list(new)
+
+        for t in old:
+            self._remove(t)
+
+        inserted: list[GameJingleTask] = []
+        try:
+            for t in new:
+                self._insert(t)
+                inserted.append(t)
+        except Exception:
+            for t in inserted:
+                self._remove(t)
+            for t in old:
+                self._insert(t)
+            raise
+
+    # endregion
+
+    # region used by the scheduling loop
+    def take(self, task: GameJingleTask) -> bool:
+        # Removes task if it is (still) the next one; False if the schedule was edited
+        with self._lock:
+            if not self._tasks or self._tasks[0] is not task:
+                return False
+
+            del self._tasks[0]
+            del self._by_id[task.id]
+            self._publish()
+
+        self._request_refill()
+        return True
+
+    # endregion
+
+    # region edits
+    def cancel(self, task_id: str) -> GameJingleTask:
+        with self._lock:
+            if (task := self._by_id.get(task_id)) is None:
+                raise ScheduleError(f'Task "{task_id}" is not scheduled')
+
+            self._remove(task)
+            self._publish()
+
+        self._request_refill()
+        logger.info("Cancelled task %s", task_id)
+        events.emit("task_cancelled", task=task)
+        self._notify()
+        return task
+
+    def insert_jingle(
+        self, jingle_name: str, at: datetime.datetime, game_name: str | None = None
+    ) -> GameJingleTask:
+        if (jingle := self.cfg.jingles.get(jingle_name)) is None:
+            raise ScheduleError(f'Jingle "{jingle_name}" does not exist')
+
+        # Ad-hoc jingles are attached to a zero-length placeholder game, placed so that
+        # the jingle triggers at the requested time regardless of its trigger/offset.
+        # Followers pass the leader's game name, so tasks have the same ids on both.
+        game_start = at - jingle.offset
+        game = Game(
+            name=game_name or f"ad hoc #{next(self._adhoc_counter)}",
+            start=game_start,
+            end=game_start,
+            announcement_file=None,
+        )
+        task = GameJingleTask(jingle, game)
+
+        with self._lock:
+            self._insert(task)
+            self._publish()
+
+        logger.info("Inserted ad-hoc task %s triggering at %s", task.id, at)
+        events.emit("task_inserted", task=task)
+        self._notify()
+        return task
+
+    def shift_game(
+        self, game_name: str, delta: datetime.timedelta
+    ) -> list[GameJingleTask]:
+        if (game := self.get_game(game_name)) is None:
+            raise ScheduleError(f'Game "{game_name}" does not exist')
+
+        return self.update_game(
+            game_name, start=game.start + delta, end=game.end + delta
+        )
+
+    def update_game(
+        self,
+        game_name: str,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[GameJingleTask]:
+        # Sets the (actual) start and/or end of a game. Games specified relative to it
+        # move along, and the tasks of all moved games are regenerated.
+        with self._edit_lock:
+            if (game := self.get_game(game_name)) is None:
+                raise ScheduleError(f'Game "{game_name}" does not exist')
+
+            new_end = end or game.end
+            # Games specified by their duration keep it when they are moved
+            if start and not end and not game.end_ref and game.duration is not None:
+                new_end = start + game.duration
+
+            changed = dataclasses.replace(
+                game,
+                start=start or game.start,
+                end=new_end,
+                # Explicitly set times replace the original specification
+                start_ref=None if start else game.start_ref,
+                end_ref=None if end else game.end_ref,
+                duration=None if end else game.duration,
+            )
+            updated = propagate_game_change(
+                self.cfg.games, changed, self.cfg.game_dependents, self.cfg.game_order
+            )
+
+            new_tasks = self._replace_games(updated.values())
+
+        logger.info(
+            'Game "%s" changed to %s - %s, rescheduled %s games (%s tasks)',
+            game_name,
+            changed.start,
+            changed.end,
+            len(updated),
+            len(new_tasks),
+        )
+        events.emit(
+            "game_changed",
+            game=game_name,
+            start=changed.start,
+            end=changed.end,
+            tasks=new_tasks,
+        )
+        self._notify()
+        return new_tasks
+
+    def _replace_games(self, games: Iterable[Game]) -> list[GameJingleTask]:
+        # Regenerates the tasks of the games with the same names. Tasks that already ran
+        # (or are running) are not part of the schedule anymore and are not regenerated.
+        games = list(games)
+        generated = [t for g in games for t in get_tasks_for_game(self.cfg, g)]
+        previous = [
+            t
+            for g in games
+            if (old := self.get_game(g.name)) is not None
+            for t in get_tasks_for_game(self.cfg, old)
+        ]
+
+        # Tasks of the games that are still pending are moved into the index first, so
+        # none of them is left behind with the previous times. No refill can happen
+        # until they are replaced.
+        with self._fill_lock:
+            if previous:
+                self._fill(until=max(map(_sort_key, previous)))
+
+            with self._lock:
+                new_tasks = [t for t in generated if t.id in self._by_id]
+                old_tasks = [self._by_id[t.id] for t in new_tasks]
+
+                # Only the neighbours of the regenerated tasks are checked for overlaps
+                self._replace(old_tasks, new_tasks)
+
+                for g in games:
+                    if g.name in self._series_games:
+                        self._series_games[g.name] = g
+                    else:
+                        self.cfg.games[g.name] = g
+
+                self._publish()
+
+        # Tasks may have moved past the ones that are still pending
+        self._request_refill()
+        return new_tasks
+
+    # endregion
@@ -0,0 +1,447 @@
+import datetime
+import json
+import logging
+import queue
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable
+
+from jingleplayer import events, metrics, util
+
+from .schedule import Schedule
+
+logger = logging.getLogger(__name__)
+
+# Leader and followers exchange one JSON object per line over TCP. Followers send
+#   {"type": "time", "t0": <follower time>}
+# which the leader answers with its receive (t1) and transmit (t2) times, like NTP does.
+# The leader sends the edits of its schedule (the same ones the control API makes) as
+#   {"type": "game_changed", "seq": ..., "game": ..., "start": ..., "end": ...}
+#   {"type": "task_inserted", "seq": ..., "id": ..., "game": ..., "jingle": ...,
+#    "action_start": ...}
+#   {"type": "task_cancelled", "seq": ..., "id": ...}
+# numbered by seq. When a follower connects, the leader sends
+#   {"type": "hello", "session": ...}
+# followed by the last edit of each game and task so far, so a follower that is
+# (re)started late catches up. Followers skip edits with a seq they already applied in the
+# same session, so replays after reconnecting have no effect.
+DEFAULT_SYNC_PORT = 8787
+
+# Followers measure the clock offset with this many requests every SYNC_INTERVAL_S and
+# use the one with the shortest round trip, which is least distorted by network delays
+SYNC_SAMPLES = 8
+SYNC_INTERVAL_S = 30.0
+_SAMPLE_SPACING_S = 0.05
+_RESPONSE_WAIT_S = 0.5
+
+RECONNECT_DELAY_S = 2.0
+_SEND_TIMEOUT_S = 5.0
+
+# Offset changes larger than this (s) make the scheduling loop re-evaluate its wait
+_OFFSET_WAKE_THRESHOLD_S = 0.005
+
+
+def parse_address(s: str, default_host: str | None = None) -> tuple[str, int]:
+    # "HOST:PORT", or just "PORT" if there is a default host
+    host, sep, port = s.rpartition(":")
+    if not sep:
+        host = default_host or ""
+
+    if not host or not port.isdigit():
+        raise ValueError(
+            f'Invalid address "{s}", expected HOST:PORT'
+            + (" or PORT" if default_host else "")
+        )
+
+    return host, int(port)
+
+
+def _encode(msg: dict) -> bytes:
+    return (json.dumps(msg) + "\n").encode()
+
+
+# region leader
+class _Connection:
+    # Edits are queued and sent on the connection's own thread, so a slow follower (e.g.
+    # one that is catching up) never delays the others
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.sock.settimeout(_SEND_TIMEOUT_S)
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[dict | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="sync-leader-send", daemon=True
+        )
+        self._thread.start()
+
+    def send(self, msg: dict):
+        with self._lock:
+            self.sock.sendall(_encode(msg))
+
+    def enqueue(self, msgs: Iterable[dict]):
+        for msg in msgs:
+            self._queue.put(msg)
+
+    def close(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while (msg := self._queue.get()) is not None:
+            try:
+                self.send(msg)
+            except OSError:
+                logger.warning("Could not send edit to sync follower", exc_info=True)
+                self.sock.close()
+                return
+
+
+class _SyncRequestHandler(socketserver.StreamRequestHandler):
+    # Set on the subclass created by SyncLeader
+    leader: "SyncLeader"
+
+    def handle(self):
+        conn = _Connection(self.request)
+        self.leader._add_connection(conn)
+        logger.info("Sync follower %s:%s connected", *self.client_address[:2])
+
+        try:
+            while line := self.rfile.readline():
+                t1 = time.time()
+                msg = json.loads(line)
+
+                if msg.get("type") == "time":
+                    conn.send(
+                        {"type": "time", "t0": msg["t0"], "t1": t1, "t2": time.time()}
+                    )
+        except (OSError, ValueError, KeyError) as exc:
+            logger.info(
+                "Connection to sync follower %s:%s failed: %s",
+                *self.client_address[:2],
+                exc,
+            )
+        finally:
+            self.leader._remove_connection(conn)
+            logger.info("Sync follower %s:%s disconnected", *self.client_address[:2])
+
+
+class _LeaderSink(events.EventSink):
+    # Forwards edits of the schedule to the followers, on the sink's thread. Its queue is
+    # unbounded, as a dropped edit would never reach the followers; writing only queues
+    # the edits for the connections, so it can not fall behind.
+    def __init__(self, leader: "SyncLeader"):
+        self.leader = leader
+
+    @property
+    def name(self):
+        return "sync"
+
+    def _get_message(self, record: dict) -> dict | None:
+        match record["event"]:
+            case "game_changed":
+                return {
+                    "type": "game_changed",
+                    "game": record["game"],
+                    "start": record["start"].isoformat(),
+                    "end": record["end"].isoformat(),
+                }
+            case "task_inserted":
+                t = record["task"]
+                return {
+                    "type": "task_inserted",
+                    "id": t.id,
+                    "game": t.game.name,
+                    "jingle": t.jingle.name,
+                    "action_start": t.action_start.isoformat(),
+                }
+            case "task_cancelled":
+                return {"type": "task_cancelled", "id": record["task"].id}
+            case _:
+                return None
+
+    def write(self, records: list[dict]):
+        for r in records:
+            if (msg := self._get_message(r)) is not None:
+                self.leader.broadcast(msg)
+
+
+class _SyncServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SyncLeader:
+    # Serves the leader's clock and the edits of its schedule to followers. Followers are
+    # handled on their own threads and edits are sent from an event sink, so neither
+    # blocks the scheduling loop.
+    def __init__(self, port: int = DEFAULT_SYNC_PORT, host: str = "0.0.0.0"):
+        self._lock = threading.Lock()
+        self._connections: set[_Connection] = set()
+        # Identifies the sequence numbers of this leader, which start over on restarts
+        self._session = uuid.uuid4().hex
+        self._seq = 0
+        # Last edit of each game and task (by _get_history_key), in the order of seq
+        self._history: dict[tuple[str, str], dict] = {}
+
+        handler = type("SyncRequestHandler", (_SyncRequestHandler,), {"leader": self})
+
+        self._server = _SyncServer((host, port), handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="sync-leader", daemon=True
+        )
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def _add_connection(self, conn: _Connection):
+        # The history is queued and the connection registered under the same lock as
+        # broadcasts, so no edit is missed or sent out of order. Sending happens on the
+        # connection's thread.
+        with self._lock:
+            conn.enqueue(
+                [{"type": "hello", "session": self._session}, *self._history.values()]
+            )
+            self._connections.add(conn)
+
+        metrics.increment("sync.follower_connections")
+
+    def _remove_connection(self, conn: _Connection):
+        with self._lock:
+            self._connections.discard(conn)
+
+        conn.close()
+
+    @staticmethod
+    def _get_history_key(msg: dict) -> tuple[str, str]:
+        # Later edits of the same game or task replace earlier ones for catching up
+        return msg["type"], msg["game"] if msg["type"] == "game_changed" else msg["id"]
+
+    def broadcast(self, msg: dict):
+        with self._lock:
+            self._seq += 1
+            msg = {**msg, "seq": self._seq}
+
+            key = self._get_history_key(msg)
+            self._history.pop(key, None)
+            self._history[key] = msg
+
+            for conn in self._connections:
+                conn.enqueue((msg,))
+
+    def start(self):
+        self._thread.start()
+        events.add_sink(_LeaderSink(self), queue_size=0)
+        logger.info("Sync leader listening on %s:%s", *self.address)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# endregion
+
+
+# region follower
+class SyncFollower:
+    # Connects to a leader, runs the schedule on the leader's clock (see
+    # util.set_clock_offset) and applies the leader's edits to the own schedule.
+    # Reconnects if the connection is lost; the last clock offset is kept meanwhile.
+    def __init__(
+        self,
+        schedule: Schedule,
+        host: str,
+        port: int = DEFAULT_SYNC_PORT,
+        on_offset_change: Callable[[], None] | None = None,
+    ):
+        self.schedule = schedule
+        self.host = host
+        self.port = port
+        self.on_offset_change = on_offset_change
+
+        self._stop = threading.Event()
+        self._sock: socket.socket | None = None
+        # (round trip, offset) of the responses to the current round of requests
+        self._samples: list[tuple[float, float]] = []
+        self._samples_lock = threading.Lock()
+        # Ad-hoc tasks of the leader that were inserted, also if they already ran
+        self._inserted: set[str] = set()
+        # Session of the leader and the last of its edits that was applied
+        self._session: str | None = None
+        self._last_seq = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="sync-follower", daemon=True
+        )
+
+    # region clock
+    def _add_sample(self, msg: dict, t3: float):
+        t0, t1, t2 = msg["t0"], msg["t1"], msg["t2"]
+        round_trip = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+
+        with self._samples_lock:
+            self._samples.append((round_trip, offset))
+
+    def _synchronize(self, sock: socket.socket):
+        with self._samples_lock:
+            self._samples.clear()
+
+        for _ in range(SYNC_SAMPLES):
+            sock.sendall(_encode({"type": "time", "t0": time.time()}))
+            time.sleep(_SAMPLE_SPACING_S)
+        time.sleep(_RESPONSE_WAIT_S)
+
+        with self._samples_lock:
+            if not self._samples:
+                return
+            round_trip, offset = min(self._samples)
+
+        previous = util.get_clock_offset()
+        util.set_clock_offset(offset)
+
+        metrics.observe("sync.offset_s", offset)
+        metrics.observe("sync.round_trip_s", round_trip)
+        logger.info(
+            "Clock offset to sync leader: %.1f ms (round trip: %.1f ms)",
+            offset * 1000,
+            round_trip * 1000,
+        )
+
+        if abs(offset - previous) > _OFFSET_WAKE_THRESHOLD_S and self.on_offset_change:
+            self.on_offset_change()
+
+    # endregion
+
+    # region edits
+    def _apply(self, msg: dict):
+        schedule = self.schedule
+
+        match msg["type"]:
+            case "game_changed":
+                if (game := schedule.get_game(msg["game"])) is None:
+                    logger.warning(
+                        'Game "%s" changed by the sync leader does not exist',
+                        msg["game"],
+                    )
+                    return
+
+                # Only times that differ are set, so that games specified relative to
+                # others keep their specification, like on the leader
+                start = datetime.datetime.fromisoformat(msg["start"])
+                end = datetime.datetime.fromisoformat(msg["end"])
+
+                changes = {}
+                if start != game.start:
+                    changes["start"] = start
+                if end != game.end:
+                    changes["end"] = end
+
+                if changes:
+                    schedule.update_game(msg["game"], **changes)
+
+            case "task_inserted":
+                if msg["id"] in self._inserted:
+                    return
+                self._inserted.add(msg["id"])
+
+                if schedule.get(msg["id"]) is None:
+                    schedule.insert_jingle(
+                        msg["jingle"],
+                        datetime.datetime.fromisoformat(msg["action_start"]),
+                        game_name=msg["game"],
+                    )
+
+            case "task_cancelled":
+                if schedule.get(msg["id"]) is not None:
+                    schedule.cancel(msg["id"])
+
+    # endregion
+
+    def _receive(self, sock: socket.socket):
+        try:
+            with sock.makefile("rb") as fs:
+                while line := fs.readline():
+                    t3 = time.time()
+                    msg = json.loads(line)
+
+                    if msg["type"] == "time":
+                        self._add_sample(msg, t3)
+                        continue
+
+                    if msg["type"] == "hello":
+                        if msg["session"] != self._session:
+                            self._session = msg["session"]
+                            self._last_seq = 0
+                        continue
+
+                    # Already applied before reconnecting
+                    if msg["seq"] <= self._last_seq:
+                        continue
+                    self._last_seq = msg["seq"]
+
+                    try:
+                        self._apply(msg)
+                    except Exception:
+                        logger.warning(
+                            "Could not apply edit of the sync leader: %s",
+                            msg,
+                            exc_info=True,
+                        )
+                        metrics.increment("sync.failed_edits")
+        except (OSError, ValueError, KeyError) as exc:
+            if not self._stop.is_set():
+                logger.warning("Connection to sync leader failed: %s", exc)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection(
+                    (self.host, self.port), timeout=RECONNECT_DELAY_S
+                ) as sock:
+                    sock.settimeout(None)
+                    self._sock = sock
+                    logger.info("Connected to sync leader %s:%s", self.host, self.port)
+
+                    receiver = threading.Thread(
+                        target=self._receive,
+                        args=(sock,),
+                        name="sync-follower-receive",
+                        daemon=True,
+                    )
+                    receiver.start()
+
+                    while receiver.is_alive() and not self._stop.is_set():
+                        self._synchronize(sock)
+                        receiver.join(SYNC_INTERVAL_S)
+            except OSError as exc:
+                if not self._stop.is_set():
+                    logger.warning(
+                        "Could not reach sync leader %s:%s: %s",
+                        self.host,
+                        self.port,
+                        exc,
+                    )
+                    metrics.increment("sync.connection_errors")
+            finally:
+                self._sock = None
+
+            self._stop.wait(RECONNECT_DELAY_S)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+        if (sock := self._sock) is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# endregion
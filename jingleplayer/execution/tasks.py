@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import bisect
+import heapq
 import itertools
 import logging
 import operator
-from collections.abc import Sequence
-from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
 import humanize
 
-from jingleplayer.configuration import Config, Game, Jingle, JingleTrigger
-from jingleplayer.util import ZERO_TD
+from jingleplayer.configuration import (
+    ActionGroup,
+    Config,
+    Game,
+    Jingle,
+    JingleTrigger,
+)
+from jingleplayer.configuration.series import GameSeries
 
 from .actions import get_actiongroup_duration
+from .render import get_task_actiongroups
 
 logger = logging.getLogger(__name__)
 
@@ -27,25 +37,82 @@ def _get_jingle_trigger_time(j: Jingle, e: Game):
     return dt + j.offset
 
 
-@dataclass
+# Tasks of the same jingle mostly have the same durations, which then share one object
+_durations: dict[timedelta, timedelta] = {}
+
+
+def _intern(td: timedelta) -> timedelta:
+    return _durations.setdefault(td, td)
+
+
+@dataclass(frozen=True, slots=True)
 class GameJingleTask:
     jingle: Jingle
     game: Game
 
+    # Computed from jingle and game
+    pre_actions: ActionGroup = field(init=False, repr=False)
+    actions: ActionGroup = field(init=False, repr=False)
+    pre_action_duration: timedelta = field(init=False)
+    action_duration: timedelta = field(init=False)
+    action_start: datetime = field(init=False)
+    start: datetime = field(init=False)
+    end: datetime = field(init=False)
+
     def __post_init__(self):
         j = self.jingle
         e = self.game
 
-        self.pre_action_duration = get_actiongroup_duration(j.pre_actions, j, e)
-        self.action_duration = get_actiongroup_duration(j.actions, j, e)
+        pre_actions, actions = get_task_actiongroups(j, e)
+        pre_action_duration = _intern(get_actiongroup_duration(pre_actions, j, e))
+        action_duration = _intern(get_actiongroup_duration(actions, j, e))
+        action_start = _get_jingle_trigger_time(j, e)
 
-        self.action_start = _get_jingle_trigger_time(j, e)
-        self.start = self.action_start - self.pre_action_duration
-        self.end = self.action_start + self.action_duration
+        # The class is frozen, so the computed fields are set with object.__setattr__
+        for name, value in (
+            ("pre_actions", pre_actions),
+            ("actions", actions),
+            ("pre_action_duration", pre_action_duration),
+            ("action_duration", action_duration),
+            ("action_start", action_start),
+            ("start", action_start - pre_action_duration),
+            ("end", action_start + action_duration),
+        ):
+            object.__setattr__(self, name, value)
 
-        logger.info(
-            f'Created GameJingleTask for game "{self.game.name}" and jingle "{self.jingle.name}". Pre_actions starts at {self.start} and takes {humanize.precisedelta(self.pre_action_duration)}. Action starts at {self.action_start} and takes {humanize.precisedelta(self.action_duration)} (until {self.end}).'
-        )
+        # humanize is slow compared to creating a task, so the message is only built if
+        # it is logged
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'Created GameJingleTask for game "%s" and jingle "%s". Pre_actions starts at %s and takes %s. Action starts at %s and takes %s (until %s).',
+                self.game.name,
+                self.jingle.name,
+                self.start,
+                humanize.precisedelta(self.pre_action_duration),
+                self.action_start,
+                humanize.precisedelta(self.action_duration),
+                self.end,
+            )
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        # Identifies the task across runs, as long as the game's times are unchanged
+        return (self.game.name, self.jingle.name, self.action_start.isoformat())
+
+    @property
+    def id(self) -> str:
+        # Unique within a schedule, as there is one task per game and jingle
+        return f"{self.game.name} | {self.jingle.name}"
+
+    def to_record(self) -> dict[str, str]:
+        return {
+            "id": self.id,
+            "game": self.game.name,
+            "jingle": self.jingle.name,
+            "start": self.start.isoformat(),
+            "action_start": self.action_start.isoformat(),
+            "end": self.end.isoformat(),
+        }
 
 
 # endregion
@@ -59,26 +126,200 @@ class JingleOverlapError(Exception):
         )
 
 
-def _check_for_overlaps(tasks: Sequence[GameJingleTask]):
-    prev = tasks[0]
-    for i in range(1, len(tasks)):
-        curr = tasks[i]
+def _iter_checked(tasks: Iterable[GameJingleTask]) -> Iterator[GameJingleTask]:
+    # Passes sorted tasks through and raises on the first one that starts before an
+    # earlier one ends, without keeping them
+    latest = None
+    for t in tasks:
+        if latest is not None and t.start < latest.end:
+            raise JingleOverlapError(latest, t)
 
-        delta = curr.start - prev.end
-        if delta < ZERO_TD:
-            raise JingleOverlapError(prev, curr)
+        if latest is None or t.end > latest.end:
+            latest = t
 
-        prev = curr
+        yield t
 
 
-def get_tasks(cfg: Config):
+def get_tasks_for_game(cfg: Config, game: Game):
+    return [GameJingleTask(j, game) for j in cfg.jingles.values()]
+
+
+_sort_key = operator.attrgetter("start", "end")
+
+
+def _get_series_offsets(cfg: Config, series: GameSeries) -> list[timedelta]:
+    # Starts of the tasks of a game relative to the game's start, which are the same for
+    # all games of a series. Taken from the first game, empty if there are no tasks.
+    if (first := next(series.iter_games(), None)) is None:
+        return []
+
+    return [t.start - first.start for t in get_tasks_for_game(cfg, first)]
+
+
+def _iter_series_tasks(
+    cfg: Config, series: GameSeries, since: datetime | None = None
+) -> Iterator[GameJingleTask]:
+    # Tasks of a game can start before tasks of earlier games (e.g. the end jingle of
+    # long games), so they are held back until no later game can have an earlier task.
+    # All games of a series have the same jingles at the same offsets, so no later game
+    # has a task before the earliest task of the next game.
+    # Only tasks starting at or after since are yielded. Games all tasks of which start
+    # before it are skipped by their start, without creating them or their tasks.
+    games = series.iter_games()
+    if since is not None:
+        if not (offsets := _get_series_offsets(cfg, series)):
+            return
+
+        games = series.iter_games(since=since - max(offsets))
+
+    held: list[tuple[datetime, datetime, int, GameJingleTask]] = []
+    counter = itertools.count()
+
+    for game in games:
+        tasks = get_tasks_for_game(cfg, game)
+        if not tasks:
+            return
+
+        earliest = min(t.start for t in tasks)
+        while held and held[0][0] <= earliest:
+            yield heapq.heappop(held)[-1]
+
+        for t in tasks:
+            if since is None or t.start >= since:
+                heapq.heappush(held, (t.start, t.end, next(counter), t))
+
+    while held:
+        yield heapq.heappop(held)[-1]
+
+
+def _count_series_tasks(
+    cfg: Config, series: GameSeries, since: datetime | None = None
+) -> int:
+    # Number of tasks starting at or after since, counted from the starts of the games
+    if since is None:
+        return series.game_count * len(cfg.jingles)
+
+    offsets = _get_series_offsets(cfg, series)
+    if not offsets:
+        return 0
+
+    earliest = since - max(offsets)
+    latest = since - min(offsets)
+    n = 0
+    for start in series.iter_starts():
+        if start >= latest:
+            n += len(offsets)
+        elif start >= earliest:
+            n += sum(1 for o in offsets if start + o >= since)
+
+    return n
+
+
+def _index_since(game_tasks: list[GameJingleTask], since: datetime | None) -> int:
+    if since is None:
+        return 0
+
+    return bisect.bisect_left(game_tasks, since, key=operator.attrgetter("start"))
+
+
+def get_game_tasks(cfg: Config) -> list[GameJingleTask]:
+    # Tasks of the games listed in the config (not of game series), in order
     combinations = itertools.product(cfg.games.values(), cfg.jingles.values())
     tasks = [GameJingleTask(j, e) for e, j in combinations]
-    tasks.sort(key=operator.attrgetter("start", "end"))
-
-    _check_for_overlaps(tasks)
+    tasks.sort(key=_sort_key)
 
     return tasks
 
 
+def iter_tasks(
+    cfg: Config,
+    check_overlaps: bool = True,
+    game_tasks: list[GameJingleTask] | None = None,
+    since: datetime | None = None,
+) -> Iterator[GameJingleTask]:
+    # All tasks in order. Tasks of game series are only created when they are reached,
+    # so only as much of a series is expanded as is consumed, and overlaps are found as
+    # the tasks are consumed. game_tasks (see get_game_tasks) are reused if passed.
+    # With since, only the tasks starting at or after it are created.
+    if game_tasks is None:
+        game_tasks = get_game_tasks(cfg)
+
+    listed = itertools.islice(game_tasks, _index_since(game_tasks, since), None)
+    if cfg.game_series:
+        tasks = heapq.merge(
+            listed,
+            *(_iter_series_tasks(cfg, s, since) for s in cfg.game_series.values()),
+            key=_sort_key,
+        )
+    else:
+        tasks = listed
+
+    return _iter_checked(tasks) if check_overlaps else tasks
+
+
+def check_for_overlaps(cfg: Config, game_tasks: list[GameJingleTask] | None = None):
+    # Goes through all tasks once (without keeping them) and raises JingleOverlapError
+    # on the first overlap
+    for _ in iter_tasks(cfg, game_tasks=game_tasks):
+        pass
+
+
+def get_task_count(
+    cfg: Config,
+    since: datetime | None = None,
+    game_tasks: list[GameJingleTask] | None = None,
+) -> int:
+    # With since, only the tasks starting at or after it are counted (see iter_tasks)
+    if since is None:
+        listed = len(cfg.games) * len(cfg.jingles)
+    else:
+        if game_tasks is None:
+            game_tasks = get_game_tasks(cfg)
+
+        listed = len(game_tasks) - _index_since(game_tasks, since)
+
+    return listed + sum(
+        _count_series_tasks(cfg, s, since) for s in cfg.game_series.values()
+    )
+
+
+def find_task(
+    cfg: Config,
+    key: tuple[str, str, str],
+    game_tasks: list[GameJingleTask] | None = None,
+) -> GameJingleTask | None:
+    # Task with the key (see GameJingleTask.key), if it is part of the schedule. Listed
+    # games are looked up by name. Of game series, only the games that start at the time
+    # that follows from the key's trigger time (all games of a series have the same
+    # offsets) have the task created.
+    game_name, jingle_name, action_start = key
+    if (jingle := cfg.jingles.get(jingle_name)) is None:
+        return None
+
+    if (game := cfg.games.get(game_name)) is not None:
+        task = GameJingleTask(jingle, game)
+        return task if task.key == key else None
+
+    action_start = datetime.fromisoformat(action_start)
+    for series in cfg.game_series.values():
+        if (first := next(series.iter_games(), None)) is None:
+            continue
+
+        start = action_start - (
+            GameJingleTask(jingle, first).action_start - first.start
+        )
+        for game in series.iter_games(since=start):
+            if game.start > start:
+                break
+
+            if (task := GameJingleTask(jingle, game)).key == key:
+                return task
+
+    return None
+
+
+def get_tasks(cfg: Config):
+    return list(iter_tasks(cfg))
+
+
 # endregion
@@ -0,0 +1,201 @@
+import datetime
+import json
+import os
+import pathlib
+from collections.abc import Iterable
+
+from jingleplayer import events
+
+from .actions import get_action_duration
+from .journal import Phase
+from .tasks import GameJingleTask
+
+# A timeline file has one JSON object per line. The first one describes the file:
+#   {"type": "timeline", "version": 1, "generated": "2030-01-01T08:00:00"}
+# Each following line is either a task with its steps and absolute times, which replaces
+# an earlier task with the same id:
+#   {"type": "task", "id": "Game 1 | Start", "game": ..., "jingle": ..., "start": ...,
+#    "action_start": ..., "end": ..., "steps": [{"phase": "pre_actions", "step": 0,
+#    "action": "announce game", "start": ..., "duration": 4.2}, ...]}
+# or the removal of a task:
+#   {"type": "cancel", "id": "Game 1 | Start"}
+# A running instance appends lines when the schedule is edited, so readers only need to
+# read what was appended since they last looked.
+TIMELINE_VERSION = 1
+
+_ICS_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+
+# region records
+def _iter_steps(task: GameJingleTask):
+    # Phase, index, action, start and duration of each step of the task
+    for phase, group, start in (
+        (Phase.PRE_ACTIONS, task.pre_actions, task.start),
+        (Phase.ACTIONS, task.actions, task.action_start),
+    ):
+        for idx, action in enumerate(group.actions):
+            duration = get_action_duration(action, task.jingle, task.game)
+            yield phase, idx, action, start, duration
+            start += duration
+
+
+def get_task_steps(task: GameJingleTask) -> list[dict]:
+    return [
+        {
+            "phase": str(phase),
+            "step": idx,
+            "action": action.get_description_str(),
+            "start": start.isoformat(),
+            "duration": duration.total_seconds(),
+        }
+        for phase, idx, action, start, duration in _iter_steps(task)
+    ]
+
+
+def get_task_record(task: GameJingleTask) -> dict:
+    return {"type": "task", **task.to_record(), "steps": get_task_steps(task)}
+
+
+# endregion
+
+
+# region export
+def write_jsonl(tasks: Iterable[GameJingleTask], file: pathlib.Path):
+    # Replaces the file at once, so readers never see a partial timeline
+    tmp = file.with_name(f".{file.name}.tmp")
+
+    with tmp.open("w", encoding="utf-8") as fs:
+        header = {
+            "type": "timeline",
+            "version": TIMELINE_VERSION,
+            "generated": datetime.datetime.now().isoformat(),
+        }
+        fs.write(_dumps(header) + "\n")
+        fs.writelines(_dumps(get_task_record(t)) + "\n" for t in tasks)
+
+    os.replace(tmp, file)
+
+
+def _ics_text(s: str) -> str:
+    return (
+        s.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_fold(line: str) -> list[str]:
+    # Lines are limited to 75 octets, continuation lines start with a space
+    data = line.encode()
+    lines = []
+
+    while len(data) > 75:
+        cut = 75 if not lines else 74
+        # Do not cut UTF-8 sequences apart
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+
+        lines.append(data[:cut].decode())
+        data = data[cut:]
+
+    lines.append(data.decode())
+    return [lines[0], *(" " + line for line in lines[1:])]
+
+
+def write_ics(tasks: Iterable[GameJingleTask], file: pathlib.Path):
+    # Times are written as local ("floating") times, like they are given in the config
+    stamp = datetime.datetime.now(datetime.UTC).strftime(_ICS_TIME_FORMAT) + "Z"
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//jingleplayer//timeline//EN",
+    ]
+
+    for t in tasks:
+        steps = "\n".join(
+            f"{start:%H:%M:%S} {action.get_description_str()}"
+            for _, _, action, start, _ in _iter_steps(t)
+        )
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{_ics_text(f'{t.id} | {t.action_start.isoformat()}')}@jingleplayer",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{t.start.strftime(_ICS_TIME_FORMAT)}",
+            f"DTEND:{t.end.strftime(_ICS_TIME_FORMAT)}",
+            f"SUMMARY:{_ics_text(f'{t.jingle.name} ({t.game.name})')}",
+            f"DESCRIPTION:{_ics_text(steps)}",
+            "END:VEVENT",
+        ]
+
+    lines.append("END:VCALENDAR")
+
+    tmp = file.with_name(f".{file.name}.tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as fs:
+        fs.writelines(folded + "\r\n" for line in lines for folded in _ics_fold(line))
+
+    os.replace(tmp, file)
+
+
+def export_timeline(tasks: Iterable[GameJingleTask], file: pathlib.Path):
+    # The format is chosen by the file extension
+    if file.suffix.lower() == ".ics":
+        write_ics(tasks, file)
+    else:
+        write_jsonl(tasks, file)
+
+
+# endregion
+
+
+# region live updates
+class TimelineSink(events.EventSink):
+    # Appends edits of the schedule to a timeline file. Records are created on the
+    # sink's thread, so editing the schedule does not wait for them.
+    def __init__(self, file: pathlib.Path):
+        self.file = file
+        self._fs = None
+
+    @property
+    def name(self):
+        return f"timeline:{self.file}"
+
+    def _get_lines(self, record: dict) -> list[str]:
+        match record["event"]:
+            case "task_inserted":
+                return [_dumps(get_task_record(record["task"]))]
+            case "task_cancelled":
+                return [_dumps({"type": "cancel", "id": record["task"].id})]
+            case "game_changed":
+                return [_dumps(get_task_record(t)) for t in record["tasks"]]
+            case _:
+                return []
+
+    def write(self, records: list[dict]):
+        lines = [line for r in records for line in self._get_lines(r)]
+        if not lines:
+            return
+
+        if self._fs is None:
+            self._fs = self.file.open("a", encoding="utf-8")
+
+        self._fs.writelines(line + "\n" for line in lines)
+        self._fs.flush()
+
+    def close(self):
+        if self._fs is not None:
+            self._fs.close()
+            self._fs = None
+
+
+def follow_schedule(tasks: Iterable[GameJingleTask], file: pathlib.Path):
+    # Writes the timeline of the scheduled tasks and keeps it up to date
+    write_jsonl(tasks, file)
+    events.add_sink(TimelineSink(file))
+
+
+# endregion
@@ -0,0 +1,106 @@
+import contextlib
+import json
+import logging
+import pathlib
+import threading
+import time
+
+from jingleplayer import metrics
+
+logger = logging.getLogger(__name__)
+
+# Weight of a new measurement in the running estimate (exponentially weighted moving
+# average), so that the estimate follows slow changes but single outliers do not matter
+# much
+ALPHA = 0.2
+
+# Operations are started at most this much (s) early, whatever was measured
+MAX_LATENCY_S = 2.0
+
+
+class _Estimate:
+    __slots__ = ("count", "value")
+
+    def __init__(self, value: float = 0.0, count: int = 0):
+        self.value = value
+        self.count = count
+
+    def add(self, value: float):
+        # The first measurement is taken as is
+        self.value = (
+            value if self.count == 0 else ALPHA * value + (1 - ALPHA) * self.value
+        )
+        self.count += 1
+
+
+_lock = threading.Lock()
+_estimates: dict[str, _Estimate] = {}
+
+
+def audio_key(backend: str | None) -> str:
+    return f"audio:{backend or 'default'}"
+
+
+def controller_key(pc) -> str:
+    return f"controller:{type(pc).__name__}"
+
+
+def observe(key: str, seconds: float):
+    with _lock:
+        _estimates.setdefault(key, _Estimate()).add(seconds)
+
+    metrics.observe(f"latency.{key}_s", seconds)
+
+
+@contextlib.contextmanager
+def measure(key: str):
+    started = time.perf_counter()
+    yield
+    observe(key, time.perf_counter() - started)
+
+
+def get(key: str) -> float:
+    # Estimated time (s) from starting an operation until it takes effect
+    with _lock:
+        e = _estimates.get(key)
+
+    return min(e.value, MAX_LATENCY_S) if e else 0.0
+
+
+def snapshot() -> dict[str, tuple[float, int]]:
+    with _lock:
+        return {k: (e.value, e.count) for k, e in sorted(_estimates.items())}
+
+
+# region persistence
+def load(file: pathlib.Path):
+    try:
+        data = json.loads(file.read_text())
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        logger.warning(
+            'Could not load latency estimates from "%s"', file, exc_info=True
+        )
+        return
+
+    with _lock:
+        for key, (value, count) in data.items():
+            _estimates[key] = _Estimate(float(value), int(count))
+
+    logger.info('Loaded %s latency estimates from "%s"', len(data), file)
+
+
+def save(file: pathlib.Path):
+    data = {k: [value, count] for k, (value, count) in snapshot().items()}
+
+    try:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_name(f".{file.name}.tmp")
+        tmp.write_text(json.dumps(data, indent=4))
+        tmp.replace(file)
+    except OSError:
+        logger.warning('Could not save latency estimates to "%s"', file, exc_info=True)
+
+
+# endregion
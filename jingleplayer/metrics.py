@@ -0,0 +1,58 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+_lock = threading.Lock()
+_counters: Counter[str] = Counter()
+_observations: dict[str, "Observation"] = {}
+
+
+@dataclass
+class Observation:
+    count: int = 0
+    last: float = 0.0
+    min: float = float("inf")
+    max: float = float("-inf")
+    total: float = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.last = value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.total += value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+def increment(name: str, by: int = 1):
+    with _lock:
+        _counters[name] += by
+
+
+def observe(name: str, value: float):
+    with _lock:
+        _observations.setdefault(name, Observation()).add(value)
+
+
+def peek(name: str) -> Observation | None:
+    # Read without the lock, so displays never hold up the code that records values.
+    # The fields may be from different updates, which is fine for showing them.
+    return _observations.get(name)
+
+
+def snapshot() -> dict[str, object]:
+    with _lock:
+        snap: dict[str, object] = dict(_counters)
+        for name, o in _observations.items():
+            snap[name] = {
+                "count": o.count,
+                "last": o.last,
+                "min": o.min,
+                "max": o.max,
+                "mean": o.mean,
+            }
+
+    return snap
@@ -1,3 +1,4 @@
 from .controllers import PlaybackController as PlaybackController
+from .controllers import PlaybackState as PlaybackState
 from .controllers import SpotifyDbusPlaybackController as SpotifyDbusPlaybackController
 from .setup import setup_from_cli as setup_from_cli
@@ -1,11 +1,19 @@
 import logging
 from abc import ABC, abstractmethod
+from enum import StrEnum, auto
 
 logger = logging.getLogger(__name__)
 
 
+class PlaybackState(StrEnum):
+    PLAYING = auto()
+    PAUSED = auto()
+
+
 class PlaybackController(ABC):
     CAN_ONLY_TOGGLE: bool = True
+    # Whether get_volume and set_volume are supported (volumes are 0.0 to 1.0)
+    CAN_SET_VOLUME: bool = False
 
     @property
     @abstractmethod
@@ -20,9 +28,20 @@ class PlaybackController(ABC):
     def resume(self):
         pass
 
+    def get_volume(self) -> float:
+        raise NotImplementedError(f"{self.name} can not control the volume")
+
+    def set_volume(self, volume: float):
+        raise NotImplementedError(f"{self.name} can not control the volume")
+
 
 class DummyPlaybackController(PlaybackController):
     CAN_ONLY_TOGGLE = False
+    CAN_SET_VOLUME = True
+
+    def __init__(self):
+        super().__init__()
+        self._volume = 1.0
 
     @property
     def name(self) -> str:
@@ -38,6 +57,14 @@ class DummyPlaybackController(PlaybackController):
         logger.debug(s)
         print(s)
 
+    def get_volume(self) -> float:
+        return self._volume
+
+    def set_volume(self, volume: float):
+        # Not printed, as ramps set the volume many times
+        logger.debug("%s: set_volume(%.3f) called", self.name, volume)
+        self._volume = volume
+
 
 class PlayPauseKeyPlaybackController(PlaybackController):
     CAN_ONLY_TOGGLE = True
@@ -73,6 +100,7 @@ class PlayPauseKeyPlaybackController(PlaybackController):
 
 class SpotifyDbusPlaybackController(PlaybackController):
     CAN_ONLY_TOGGLE: bool = False
+    CAN_SET_VOLUME: bool = True
 
     @property
     def name(self) -> str:
@@ -96,3 +124,9 @@ class SpotifyDbusPlaybackController(PlaybackController):
 
     def open_uri(self, uri: str):
         self._dbus_proxy.OpenUri(uri)
+
+    def get_volume(self) -> float:
+        return self._dbus_proxy.Volume
+
+    def set_volume(self, volume: float):
+        self._dbus_proxy.Volume = volume
@@ -1,4 +1,4 @@
-from sdbus import DbusInterfaceCommon, dbus_method
+from sdbus import DbusInterfaceCommon, dbus_method, dbus_property
 
 
 class Player_Interface(  # type: ignore
@@ -16,3 +16,7 @@ class Player_Interface(  # type: ignore
     @dbus_method("s")
     def OpenUri(self, uri: str):
         raise NotImplementedError()
+
+    @dbus_property("d")
+    def Volume(self) -> float:
+        raise NotImplementedError()
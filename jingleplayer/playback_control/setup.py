@@ -49,7 +49,7 @@ def setup_from_cli(cli_options: list[str] | None) -> list[PlaybackController]:
     pcs: list[PlaybackController] = []
     for s in set(cli_options):
         pc = _get_playbackcontroller(s)
-        logger.debug(f'CLI option "{s}" parsed to PlaybackController {pc}')
+        logger.debug('CLI option "%s" parsed to PlaybackController %s', s, pc)
         pcs.append(pc)
 
     return pcs
@@ -1,16 +1,29 @@
+import collections
+import json
 import logging
 import math
 import pathlib
 import shutil
-from collections.abc import Iterable
-
-from jingleplayer import util
-from jingleplayer.configuration import Config
+import statistics
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from typing import TextIO
+
+from jingleplayer import audio, latency, util
+from jingleplayer.audio.verify import verify_files
+from jingleplayer.configuration import Config, Game, Jingle
 from jingleplayer.configuration.actions import (
+    ActionBase,
     AnnounceGameAction,
     AnnounceGamePlaylistAction,
+    ParallelAction,
     SwitchToGamePlaylistAction,
 )
+from jingleplayer.configuration.handlers import AudioActionHandler, get_handler
+from jingleplayer.execution import timeline
+from jingleplayer.execution.tasks import iter_tasks
 from jingleplayer.playback_control import PlaybackController
 
 logger = logging.getLogger(__name__)
@@ -18,11 +31,70 @@ logger = logging.getLogger(__name__)
 
 def _playaudio_and_delay(audiofile: pathlib.Path, type: str):
     print(f"Playing {type}...")
-    util.play_audiofile(audiofile)
+    audio.play_audiofile(audiofile)
     util.wait_for(1)
 
 
-def test_config(cfg: Config, play_audio: bool):
+# Files deviating more than this from the median loudness are pointed out
+LOUDNESS_TOLERANCE = 3.0
+# Silence (s) at the start or end of files from which on it is pointed out
+SILENCE_TOLERANCE = 0.1
+
+
+def _get_median_loudness(
+    levels: dict[pathlib.Path, audio.AudioAnalysis | Exception],
+) -> float | None:
+    loudnesses = [
+        r.loudness
+        for r in levels.values()
+        if isinstance(r, audio.AudioAnalysis) and not math.isinf(r.loudness)
+    ]
+    return statistics.median(loudnesses) if loudnesses else None
+
+
+def _print_audio_levels(
+    levels: dict[pathlib.Path, audio.AudioAnalysis | Exception],
+    gains: dict[pathlib.Path, float] | None,
+    trimmed: dict[pathlib.Path, tuple[float, float]] | None,
+):
+    median = _get_median_loudness(levels)
+
+    for f in sorted(levels):
+        r = levels[f]
+
+        if isinstance(r, Exception):
+            print(f"{f.name}: could not be analyzed ({r})")
+            continue
+
+        s = f"{f.name}: {r.loudness:.1f} LUFS, peak {r.peak:.1f} dBFS"
+        if gains and f in gains:
+            s += f", gain {gains[f]:+.1f} dB"
+        print(s)
+
+        if (
+            median is not None
+            and not gains
+            and abs(dev := r.loudness - median) > LOUDNESS_TOLERANCE
+        ):
+            print(
+                f"  WARNING: {abs(dev):.1f} LU {'louder' if dev > 0 else 'quieter'} than the median of all files ({median:.1f} LUFS)"
+            )
+
+        lead, trail = r.leading_silence, r.trailing_silence
+        if lead > SILENCE_TOLERANCE or trail > SILENCE_TOLERANCE:
+            s = f"  {lead:.2f}s silence at the start, {trail:.2f}s at the end"
+            if trimmed and f in trimmed:
+                s += " (trimmed)"
+            print(s)
+
+
+def test_config(
+    cfg: Config,
+    play_audio: bool,
+    audio_levels: dict[pathlib.Path, audio.AudioAnalysis | Exception] | None = None,
+    gains: dict[pathlib.Path, float] | None = None,
+    trimmed: dict[pathlib.Path, tuple[float, float]] | None = None,
+):
     trmwidth, _ = shutil.get_terminal_size()
     linehalf = "-" * math.ceil(trmwidth / 2)
 
@@ -56,9 +128,19 @@ def test_config(cfg: Config, play_audio: bool):
                 _playaudio_and_delay(af, "game announcement")
 
             print()
-    else:
+    elif not cfg.game_series:
         print("<No games configured.>")
 
+    # Game series are listed as rules, not game by game
+    for series in cfg.game_series.values():
+        print()
+        print(series.get_info_str())
+
+        if play_audio and (af := series.announcement_file):
+            _playaudio_and_delay(af, "game announcement")
+
+        print()
+
     print()
 
     # Jingles
@@ -101,6 +183,246 @@ def test_config(cfg: Config, play_audio: bool):
     else:
         print("<No playlist configured.>")
 
+    # Audio levels
+    if audio_levels is not None:
+        print()
+        print("Audio levels:")
+        print(linehalf)
+        print()
+
+        if len(audio_levels) > 0:
+            _print_audio_levels(audio_levels, gains, trimmed)
+        else:
+            print("<No audio files configured.>")
+
+
+# region machine-readable info
+INFO_FORMATS = ("text", "json", "jsonl", "summary")
+
+
+def _warning(about: str, name: str, message: str) -> dict:
+    return {"type": "warning", "about": about, "name": name, "message": message}
+
+
+def _finite_or_none(value: float) -> float | None:
+    # Infinity (e.g. the loudness of silence) is not valid JSON
+    return None if math.isinf(value) else value
+
+
+def _get_audio_time(action: ActionBase, jingle: Jingle, game: Game) -> timedelta:
+    # Time audio is played by the action, branches of parallel actions are added up
+    if isinstance(action, ParallelAction):
+        return sum(
+            (_get_audio_time(b, jingle, game) for b in action.branches), util.ZERO_TD
+        )
+
+    handler = get_handler(action)
+    if isinstance(handler, AudioActionHandler):
+        return handler.get_duration(action, jingle, game)
+
+    return util.ZERO_TD
+
+
+def _iter_audio_file_records(
+    levels: dict[pathlib.Path, audio.AudioAnalysis | Exception],
+    gains: dict[pathlib.Path, float] | None,
+    trimmed: dict[pathlib.Path, tuple[float, float]] | None,
+) -> Iterator[dict]:
+    median = _get_median_loudness(levels)
+
+    for f in sorted(levels):
+        r = levels[f]
+
+        if isinstance(r, Exception):
+            yield {"type": "audio_file", "file": str(f), "error": str(r)}
+            yield _warning("audio_file", str(f), f"could not be analyzed ({r})")
+            continue
+
+        yield {
+            "type": "audio_file",
+            "file": str(f),
+            "loudness": _finite_or_none(r.loudness),
+            "peak": _finite_or_none(r.peak),
+            "leading_silence": r.leading_silence,
+            "trailing_silence": r.trailing_silence,
+            "gain": gains.get(f) if gains else None,
+            "trimmed": bool(trimmed and f in trimmed),
+        }
+
+        if (
+            median is not None
+            and not gains
+            and abs(dev := r.loudness - median) > LOUDNESS_TOLERANCE
+        ):
+            yield _warning(
+                "audio_file",
+                str(f),
+                f"{abs(dev):.1f} LU {'louder' if dev > 0 else 'quieter'} than the median of all files ({median:.1f} LUFS)",
+            )
+
+
+def iter_info_records(
+    cfg: Config,
+    audio_levels: dict[pathlib.Path, audio.AudioAnalysis | Exception] | None = None,
+    gains: dict[pathlib.Path, float] | None = None,
+    trimmed: dict[pathlib.Path, tuple[float, float]] | None = None,
+) -> Iterator[dict]:
+    # The information shown by test_config as records with plain values (ISO times,
+    # durations in seconds), followed by every task of the schedule. Records are
+    # created as they are consumed, so the tasks of large game series are never all in
+    # memory at once. Warnings are records of their own, right after the record they
+    # are about.
+    has_game_announce = cfg.has_action(AnnounceGameAction)
+    has_pl_announce = cfg.has_action(AnnounceGamePlaylistAction)
+    has_pl_switch = cfg.has_action(SwitchToGamePlaylistAction)
+
+    for about, games in (
+        ("game", cfg.games.values()),
+        ("game_series", cfg.game_series.values()),
+    ):
+        for g in games:
+            yield {"type": about, **g.to_record()}
+
+            if has_game_announce and not g.announcement_file:
+                yield _warning(
+                    about,
+                    g.name,
+                    '"announce game" action is configured, but there is no announcement file',
+                )
+            if has_pl_switch and not g.playlist:
+                yield _warning(
+                    about,
+                    g.name,
+                    '"switch to game playlist" action is configured, but there is no playlist',
+                )
+
+    for j in cfg.jingles.values():
+        yield {"type": "jingle", **j.to_record()}
+
+        if j.audiofile and not j.has_playjingle_action:
+            yield _warning(
+                "jingle",
+                j.name,
+                'audio file is configured, but no "play jingle" action',
+            )
+
+    for pl in cfg.playlists.values():
+        yield {"type": "playlist", **pl.to_record()}
+
+        if has_pl_announce and not pl.announcement_file:
+            yield _warning(
+                "playlist",
+                pl.name,
+                '"announce playlist" action is configured, but there is no announcement file',
+            )
+
+    if audio_levels is not None:
+        yield from _iter_audio_file_records(audio_levels, gains, trimmed)
+
+    # Slack is the time between the end of the latest earlier task and the start of a
+    # task; overlaps are reported instead of raised, so the whole schedule is listed
+    latest = None
+    for t in iter_tasks(cfg, check_overlaps=False):
+        slack = t.start - latest.end if latest else None
+
+        yield {
+            **timeline.get_task_record(t),
+            "audio_time": sum(
+                (
+                    _get_audio_time(a, t.jingle, t.game)
+                    for a in (*t.pre_actions.actions, *t.actions.actions)
+                ),
+                util.ZERO_TD,
+            ).total_seconds(),
+            "slack": slack.total_seconds() if slack is not None else None,
+            "after": latest.id if latest else None,
+        }
+
+        if slack is not None and slack < util.ZERO_TD:
+            yield _warning(
+                "task",
+                t.id,
+                f'overlaps with "{latest.id}" by {-slack.total_seconds():.1f}s',
+            )
+
+        if latest is None or t.end > latest.end:
+            latest = t
+
+
+def summarize_info_records(records: Iterable[dict]) -> dict:
+    # Consumes the records in a single pass, so the tasks are never all kept
+    counts = collections.Counter()
+    audio_time = 0.0
+    min_slack = None
+    first_start = last_end = None
+    warnings = []
+
+    for r in records:
+        match r["type"]:
+            case "warning":
+                warnings.append(r)
+                continue
+            case "task":
+                audio_time += r["audio_time"]
+                if r["slack"] is not None and (
+                    min_slack is None or r["slack"] < min_slack["slack"]
+                ):
+                    min_slack = {
+                        "slack": r["slack"],
+                        "task": r["id"],
+                        "after": r["after"],
+                    }
+
+                first_start = first_start or r["start"]
+                end = datetime.fromisoformat(r["end"])
+                last_end = end if last_end is None else max(last_end, end)
+
+        counts[r["type"]] += 1
+
+    return {
+        "type": "summary",
+        "counts": dict(counts),
+        "first_start": first_start,
+        "last_end": last_end.isoformat() if last_end else None,
+        "audio_time": audio_time,
+        "min_slack": min_slack,
+        "warnings": warnings,
+    }
+
+
+def print_config_info(
+    cfg: Config,
+    format: str,
+    audio_levels: dict[pathlib.Path, audio.AudioAnalysis | Exception] | None = None,
+    gains: dict[pathlib.Path, float] | None = None,
+    trimmed: dict[pathlib.Path, tuple[float, float]] | None = None,
+    out: TextIO | None = None,
+):
+    # Machine-readable counterpart of test_config(cfg, False); each record is written as
+    # soon as it is created
+    out = out or sys.stdout
+    records = iter_info_records(cfg, audio_levels, gains, trimmed)
+
+    match format:
+        case "jsonl":
+            for r in records:
+                out.write(json.dumps(r) + "\n")
+        case "json":
+            # A JSON array, written element by element
+            out.write("[")
+            for i, r in enumerate(records):
+                out.write(("\n" if i == 0 else ",\n") + json.dumps(r))
+            out.write("\n]\n")
+        case "summary":
+            out.write(json.dumps(summarize_info_records(records), indent=4) + "\n")
+        case _:
+            raise ValueError(f'Unknown info format "{format}"')
+
+    out.flush()
+
+
+# endregion
+
 
 def test_playbackcontrol(playback_controllers: Iterable[PlaybackController]):
     trmwidth, _ = shutil.get_terminal_size()
@@ -135,3 +457,106 @@ def test_playbackcontrol(playback_controllers: Iterable[PlaybackController]):
         pc.pause()
 
         print()
+
+
+# Number of measurements per backend/controller when calibrating latencies
+CALIBRATION_ROUNDS = 5
+_CALIBRATION_SOUND_DURATION = timedelta(seconds=0.25)
+
+
+def calibrate_latency(playback_controllers: Iterable[PlaybackController]):
+    trmwidth, _ = shutil.get_terminal_size()
+    linehalf = "-" * math.ceil(trmwidth / 2)
+
+    print("Latency Calibration")
+    print(linehalf)
+    print()
+
+    # The time a short silent file takes to play beyond its duration is (mostly) the
+    # time until playback starts, which is what the audio latency estimate is made of
+    with tempfile.TemporaryDirectory() as d:
+        silence = pathlib.Path(d) / "silence.wav"
+        frames = round(
+            _CALIBRATION_SOUND_DURATION.total_seconds() * audio.cache.SAMPLE_RATE
+        )
+        audio.cache.write_wav(
+            silence,
+            [bytes(frames * audio.cache.CHANNELS * audio.cache.SAMPLE_WIDTH)],
+        )
+
+        print(f"Playing {CALIBRATION_ROUNDS} short silent sounds ...")
+        for _ in range(CALIBRATION_ROUNDS):
+            audio.play_audiofile(silence, _CALIBRATION_SOUND_DURATION)
+
+    for pc in playback_controllers:
+        print(
+            f"Resuming and pausing playback with {pc.name} {CALIBRATION_ROUNDS} times ..."
+        )
+        key = latency.controller_key(pc)
+
+        for _ in range(CALIBRATION_ROUNDS):
+            with latency.measure(key):
+                pc.resume()
+            util.wait_for(1)
+
+            with latency.measure(key):
+                pc.pause()
+            util.wait_for(1)
+
+    print()
+
+    estimates = latency.snapshot()
+    key_width = max((len(k) for k in estimates), default=3)
+    header = f"{'Key':<{key_width}}  {'Latency (ms)':>12}  {'Samples':>7}"
+    print(header)
+    print("-" * len(header))
+
+    for key, (value, count) in estimates.items():
+        print(f"{key:<{key_width}}  {value * 1000:>12.1f}  {count:>7}")
+
+
+def _format_seconds(s: float | None) -> str:
+    return "?" if s is None else f"{s:.2f}"
+
+
+def verify_audio(cfg: Config) -> bool:
+    trmwidth, _ = shutil.get_terminal_size()
+    linehalf = "-" * math.ceil(trmwidth / 2)
+
+    files = cfg.audio_files
+
+    print("Audio File Verification")
+    print(linehalf)
+    print()
+    print(f"Decoding {len(files)} audio files ...")
+    print()
+
+    results = verify_files(files)
+
+    name_width = max((len(r.file.name) for r in results), default=4)
+    header = f"{'File':<{name_width}}  {'Expected (s)':>12}  {'Decoded (s)':>11}  {'Rate (Hz)':>9}  {'Ch':>2}  Status"
+    print(header)
+    print("-" * len(header))
+
+    for r in results:
+        status = "OK" if r.ok else "FAILED"
+        if r.ok and r.warnings:
+            status = "WARNING"
+
+        print(
+            f"{r.file.name:<{name_width}}  {_format_seconds(r.probed_duration):>12}  {_format_seconds(r.decoded_duration):>11}  {r.sample_rate or '?':>9}  {r.channels or '?':>2}  {status}"
+        )
+        for p in r.problems:
+            print(f"  - {p}")
+        for w in r.warnings:
+            print(f"  - {w}")
+
+    failed = [r for r in results if not r.ok]
+
+    print()
+    if failed:
+        print(f"{len(failed)} of {len(results)} audio files have problems.")
+    else:
+        print(f"All {len(results)} audio files were decoded successfully.")
+
+    return not failed
@@ -1,15 +1,19 @@
+import functools
 import logging
+import os
 import pathlib
+import platform
+import re
 import time
 import typing
 from datetime import datetime, timedelta
 
 import humanize
-import pause
-import playsound3
 import pytimeparse2
 import tinytag
 
+from jingleplayer import waiting
+
 logger = logging.getLogger(__name__)
 
 RELATIVE_TO_NOW_BASE = datetime.now()
@@ -21,13 +25,46 @@ DT_FORMAT_WITH_SECONDS = "%Y-%m-%d %H:%M:%S"
 ZERO_TD = timedelta(0)
 
 
-def parse_timedelta_str(s: str):
-    td = typing.cast(  # with raise_exception and as_timedelta, return type is narrowed to timedelta
+# Number of distinct strings whose parsed value is kept. Configs (and generated ones in
+# particular) repeat the same few offsets, durations and delays many times.
+PARSE_CACHE_SIZE = 1024
+
+# Most timedeltas are given like "25m", "-2m", "1h30m" or "1m 30s", which are parsed
+# without pytimeparse2. Everything else (e.g. "1.5s", "3 min", "00:05:00") falls back to
+# it, so the accepted formats are unchanged.
+_TIMEDELTA_RE = re.compile(r"([+-]?)(?:(\d+)h)? ?(?:(\d+)m)? ?(?:(\d+)s)?")
+# Like DT_FORMAT(_WITH_SECONDS), with all fields zero-padded
+_DATETIME_RE = re.compile(r"(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d)(?::(\d\d))?")
+
+
+def _parse_timedelta_fast(s: str) -> timedelta | None:
+    if s.isdigit():
+        return timedelta(seconds=int(s))
+
+    if (parts := _TIMEDELTA_RE.fullmatch(s)) is None:
+        return None
+
+    sign, h, m, sec = parts.groups()
+    if h is None and m is None and sec is None:
+        return None
+
+    td = timedelta(hours=int(h or 0), minutes=int(m or 0), seconds=int(sec or 0))
+    return -td if sign == "-" else td
+
+
+def _parse_timedelta_general(s: str) -> timedelta:
+    return typing.cast(  # with raise_exception and as_timedelta, return type is narrowed to timedelta
         timedelta,  # cast() call is required for static type checkers
         pytimeparse2.parse(s, raise_exception=True, as_timedelta=True),
     )
 
-    logger.debug(f'Timedelta string "{s}" parsed to timedelta "{td}"')
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_timedelta_str(s: str) -> timedelta:
+    if (td := _parse_timedelta_fast(s)) is None:
+        td = _parse_timedelta_general(s)
+
+    logger.debug('Timedelta string "%s" parsed to timedelta "%s"', s, td)
     return td
 
 
@@ -41,18 +78,35 @@ def get_human_timedelta_string(td: timedelta, for_zero: str = "at"):
     raise RuntimeError()
 
 
-def parse_datetime_str(s: str):
+def _parse_datetime_fast(s: str) -> datetime | None:
+    if (parts := _DATETIME_RE.fullmatch(s)) is None:
+        return None
+
+    try:
+        return datetime(*(int(g) for g in parts.groups() if g is not None))
+    except ValueError:
+        # Out of range values are reported by the general parser
+        return None
+
+
+def _parse_datetime_general(s: str) -> datetime:
     try:
-        val = datetime.strptime(s, DT_FORMAT)
+        return datetime.strptime(s, DT_FORMAT)
     except ValueError as e:
         try:
-            val = datetime.strptime(s, DT_FORMAT_WITH_SECONDS)
+            return datetime.strptime(s, DT_FORMAT_WITH_SECONDS)
         except ValueError:
             raise ValueError(
                 f'datetime "{s}" is not given in a supported format.'
             ) from e
 
-    logger.debug(f'Datetime string "{s}" parsed to datetime "{val}"')
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_datetime_str(s: str) -> datetime:
+    if (val := _parse_datetime_fast(s)) is None:
+        val = _parse_datetime_general(s)
+
+    logger.debug('Datetime string "%s" parsed to datetime "%s"', s, val)
     return val
 
 
@@ -64,17 +118,22 @@ def format_datetime(dt: datetime) -> str:
 
 
 # region audio
-def play_audiofile(file: pathlib.Path):
-    logger.debug(f'Playing sound file "{file}"')
-    playsound3.playsound(file, block=True)
+# Probed durations by file and its modification time and size, so that files used by
+# many games are only probed once (and share one timedelta) as long as they are unchanged
+_audiofile_durations: dict[tuple[pathlib.Path, int, int], timedelta] = {}
 
 
 def get_audiofile_duration(file: pathlib.Path):
+    st = file.stat()
+    key = (file, st.st_mtime_ns, st.st_size)
+    if (audio_duration := _audiofile_durations.get(key)) is not None:
+        return audio_duration
+
     tag = tinytag.TinyTag.get(file, tags=False, duration=True)
     if tag.duration:
         audio_duration = timedelta(seconds=tag.duration)
-        logger.info(f'Audio duration for "{file}" determined to be {audio_duration}')
-        return audio_duration
+        logger.info('Audio duration for "%s" determined to be %s', file, audio_duration)
+        return _audiofile_durations.setdefault(key, audio_duration)
     else:
         raise RuntimeError(f'Audio duration of "{file}" could not be determined.')
 
@@ -82,17 +141,68 @@ def get_audiofile_duration(file: pathlib.Path):
 # endregion
 
 
+# region files
+def get_default_cache_dir() -> pathlib.Path:
+    if env_dir := os.environ.get("JINGLEPLAYER_CACHE_DIR"):
+        return pathlib.Path(env_dir)
+
+    if platform.system() == "Windows" and (appdata := os.environ.get("LOCALAPPDATA")):
+        return pathlib.Path(appdata) / "jingleplayer" / "cache"
+
+    if xdg := os.environ.get("XDG_CACHE_HOME"):
+        return pathlib.Path(xdg) / "jingleplayer"
+
+    return pathlib.Path.home() / ".cache" / "jingleplayer"
+
+
+# endregion
+
+
+# region clock
+# Offset of the clock the schedule runs on from this machine's wall clock. It is only set
+# on followers (see execution.sync), which run on the leader's clock.
+_clock_offset = ZERO_TD
+
+
+def set_clock_offset(seconds: float):
+    global _clock_offset
+    _clock_offset = timedelta(seconds=seconds)
+
+
+def get_clock_offset() -> float:
+    return _clock_offset.total_seconds()
+
+
+def now() -> datetime:
+    # Current time on the schedule's clock
+    return datetime.now() + _clock_offset
+
+
+# endregion
+
+
 # region waiting
-def wait_until(dt: datetime):
-    logger.debug(f"Waiting until {dt}. Now: {datetime.now()}")
-    pause.until(dt)
-    logger.debug(f"Waiting exited at {datetime.now()}")
+def wait_until(dt: datetime, waiter: waiting.Waiter | None = None) -> bool:
+    # Waits until dt on the schedule's clock. Returns False if the waiter was woken up
+    # before dt was reached.
+    # The current time is only looked up if it is logged
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Waiting until %s. Now: %s", dt, now())
+    reached = (waiter or waiting.DEFAULT_WAITER).wait_until(dt - _clock_offset)
+    if debug:
+        logger.debug("Waiting exited at %s (reached: %s)", now(), reached)
+    return reached
 
 
 def wait_for(seconds: float):
-    logger.debug(f"Waiting for {seconds} s. Now: {time.time()}")
-    pause.seconds(seconds)
-    logger.debug(f"Waiting exited at {time.time()}")
+    # Delays are relative, so they are not affected by changes of the wall clock
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Waiting for %s s. Now: %s", seconds, time.time())
+    time.sleep(seconds)
+    if debug:
+        logger.debug("Waiting exited at %s", time.time())
 
 
 # endregion
@@ -0,0 +1,117 @@
+import abc
+import errno
+import logging
+import os
+import selectors
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# The portable waiter re-checks the wall clock at least this often, so it notices clock
+# steps (NTP, manual changes) and suspend/resume
+_FALLBACK_MAX_SLEEP_S = 1.0
+
+# Only use timerfd if all needed functionality is available (Linux, Python >= 3.13)
+TIMERFD_AVAILABLE = all(
+    hasattr(os, attr)
+    for attr in (
+        "timerfd_create",
+        "timerfd_settime",
+        "TFD_TIMER_ABSTIME",
+        "TFD_TIMER_CANCEL_ON_SET",
+        "eventfd",
+    )
+)
+
+
+class Waiter(abc.ABC):
+    @abc.abstractmethod
+    def wait_until(self, dt: datetime) -> bool:
+        # Returns True once dt is reached and False if wake() was called before that
+        pass
+
+    @abc.abstractmethod
+    def wake(self):
+        # Wakes up the current (or, if there is none, the next) call to wait_until.
+        # Can be called from any thread.
+        pass
+
+
+class TimerfdWaiter(Waiter):
+    # Sleeps in the kernel on an absolute CLOCK_REALTIME timer. TFD_TIMER_CANCEL_ON_SET
+    # makes the kernel cancel the timer if the wall clock is set, so it is re-armed
+    # against the new clock. Suspend is handled by the kernel as the realtime clock jumps
+    # forward on resume. wake() writes to an eventfd watched alongside the timer.
+    def __init__(self):
+        self._tfd = os.timerfd_create(
+            time.CLOCK_REALTIME, flags=os.TFD_NONBLOCK | os.TFD_CLOEXEC
+        )
+        self._efd = os.eventfd(0, flags=os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._tfd, selectors.EVENT_READ)
+        self._selector.register(self._efd, selectors.EVENT_READ)
+
+    def wait_until(self, dt: datetime) -> bool:
+        deadline = dt.timestamp()
+
+        while True:
+            if time.time() >= deadline:
+                return True
+
+            os.timerfd_settime(
+                self._tfd,
+                flags=os.TFD_TIMER_ABSTIME | os.TFD_TIMER_CANCEL_ON_SET,
+                initial=deadline,
+            )
+
+            for key, _ in self._selector.select():
+                if key.fd == self._efd:
+                    os.eventfd_read(self._efd)
+                    return False
+
+            try:
+                os.read(self._tfd, 8)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                if e.errno != errno.ECANCELED:
+                    raise
+
+                logger.info("Wall clock was set while waiting, re-arming timer")
+                continue
+
+            return True
+
+    def wake(self):
+        os.eventfd_write(self._efd, 1)
+
+
+class EventWaiter(Waiter):
+    def __init__(self):
+        self._event = threading.Event()
+
+    def wait_until(self, dt: datetime) -> bool:
+        deadline = dt.timestamp()
+
+        while (remaining := deadline - time.time()) > 0:
+            if self._event.wait(min(remaining, _FALLBACK_MAX_SLEEP_S)):
+                self._event.clear()
+                return False
+
+        return True
+
+    def wake(self):
+        self._event.set()
+
+
+def create_waiter() -> Waiter:
+    if TIMERFD_AVAILABLE:
+        return TimerfdWaiter()
+
+    return EventWaiter()
+
+
+DEFAULT_WAITER = create_waiter()
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from jingleplayer.configuration import Config
+
+
+def _write_config(tmp_path, games: dict, game_series: dict) -> str:
+    file = tmp_path / "config.json"
+    file.write_text(
+        json.dumps(
+            {
+                "config_version": "1.0",
+                "games": games,
+                "game_series": game_series,
+                "jingles": {
+                    "Start": {"trigger": "game_start", "actions": "do nothing"}
+                },
+            }
+        )
+    )
+    return str(file)
+
+
+def _series(start: str, **kwargs) -> dict:
+    return {"start": start, "interval": "10m", "duration": "10m", "count": 3, **kwargs}
+
+
+def test_series_game_named_like_listed_game(tmp_path):
+    file = _write_config(
+        tmp_path,
+        {"S #2": {"start": "2030-01-01 09:00", "duration": "10m"}},
+        {"S": _series("2030-01-01 10:00")},
+    )
+
+    with pytest.raises(ValueError, match='"S #2"'):
+        Config.load(file)
+
+
+def test_series_games_named_alike(tmp_path):
+    file = _write_config(
+        tmp_path,
+        {},
+        {
+            "A": _series("2030-01-01 10:00", name="Game {n}"),
+            "B": _series("2030-01-02 10:00", name="Game {n}"),
+        },
+    )
+
+    with pytest.raises(ValueError, match='"Game 1" of game series "B"'):
+        Config.load(file)
+
+
+def test_unique_series_game_names(tmp_path):
+    file = _write_config(
+        tmp_path,
+        {"S #4": {"start": "2030-01-01 09:00", "duration": "10m"}},
+        {"S": _series("2030-01-01 10:00"), "T": _series("2030-01-02 10:00")},
+    )
+
+    assert Config.load(file).game_series.keys() == {"S", "T"}
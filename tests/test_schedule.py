@@ -0,0 +1,130 @@
+import datetime
+import json
+import threading
+import time
+
+from jingleplayer.configuration import Config
+from jingleplayer.execution.schedule import INDEX_SIZE, Schedule
+from jingleplayer.execution.tasks import get_task_count, iter_tasks
+
+
+def _load_series_config(tmp_path, n_games: int) -> Config:
+    # Games of 10 minutes, one after the other, with a jingle 1 minute before the end
+    file = tmp_path / "config.json"
+    file.write_text(
+        json.dumps(
+            {
+                "config_version": "1.0",
+                "game_series": {
+                    "G": {
+                        "start": "2030-01-01 00:00",
+                        "interval": "10m",
+                        "duration": "10m",
+                        "count": n_games,
+                    }
+                },
+                "jingles": {
+                    "Start": {
+                        "trigger": "game_start",
+                        "pre_actions": "do nothing",
+                        "actions": "do nothing",
+                    },
+                    "End": {
+                        "trigger": "game_end",
+                        "offset": "-1m",
+                        "pre_actions": "do nothing",
+                        "actions": "do nothing",
+                    },
+                },
+            }
+        )
+    )
+    return Config.load(str(file))
+
+
+def _make_schedule(cfg: Config) -> Schedule:
+    schedule = Schedule(
+        cfg, (), pending=iter_tasks(cfg), pending_count=get_task_count(cfg)
+    )
+    # The start task of game INDEX_SIZE / 2 + 1 is in the index, its end task pending
+    schedule.upcoming(INDEX_SIZE + 1)
+    return schedule
+
+
+def _drain(schedule: Schedule) -> list:
+    taken = []
+    while (t := schedule.peek()) is not None:
+        assert schedule.take(t)
+        taken.append(t)
+
+    return taken
+
+
+def test_update_series_game_with_pending_tasks(tmp_path):
+    cfg = _load_series_config(tmp_path, INDEX_SIZE)
+    schedule = _make_schedule(cfg)
+
+    name = f"G #{INDEX_SIZE // 2 + 1}"
+    assert schedule.get(f"{name} | Start") is not None
+    assert schedule.get(f"{name} | End") is None
+
+    game = schedule.get_game(name)
+    schedule.update_game(name, end=game.start + datetime.timedelta(minutes=5))
+
+    taken = [t for t in _drain(schedule) if t.game.name == name]
+    assert [(t.jingle.name, t.action_start.time()) for t in taken] == [
+        ("Start", game.start.time()),
+        ("End", (game.start + datetime.timedelta(minutes=4)).time()),
+    ]
+
+
+def test_move_series_game_earlier_with_pending_tasks(tmp_path):
+    # The end task must only be played at the new time
+    cfg = _load_series_config(tmp_path, INDEX_SIZE)
+    schedule = _make_schedule(cfg)
+
+    name = f"G #{INDEX_SIZE // 2 + 1}"
+    game = schedule.get_game(name)
+    previous = schedule.get_game(f"G #{INDEX_SIZE // 2}")
+    schedule.update_game(
+        previous.name, end=previous.end - datetime.timedelta(minutes=5)
+    )
+    start = game.start - datetime.timedelta(minutes=4)
+    schedule.update_game(name, start=start)
+
+    taken = [t for t in _drain(schedule) if t.game.name == name]
+    assert [(t.jingle.name, t.action_start) for t in taken] == [
+        ("Start", start),
+        ("End", start + datetime.timedelta(minutes=9)),
+    ]
+
+
+def test_take_refills_on_background_thread(tmp_path):
+    cfg = _load_series_config(tmp_path, INDEX_SIZE)
+
+    created_on = []
+
+    def pending():
+        for t in iter_tasks(cfg):
+            created_on.append(threading.current_thread().name)
+            yield t
+
+    schedule = Schedule(cfg, (), pending=pending(), pending_count=get_task_count(cfg))
+    n_created = len(created_on)
+
+    assert schedule.take(schedule.peek())
+    deadline = time.monotonic() + 5
+    while len(created_on) == n_created and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert created_on[n_created:] == ["schedule-refill"]
+
+
+def test_drain_keeps_order(tmp_path):
+    cfg = _load_series_config(tmp_path, INDEX_SIZE)
+    schedule = Schedule(
+        cfg, (), pending=iter_tasks(cfg), pending_count=get_task_count(cfg)
+    )
+
+    assert [t.id for t in _drain(schedule)] == [t.id for t in iter_tasks(cfg)]
+    assert len(schedule) == 0
@@ -0,0 +1,111 @@
+import datetime
+import json
+
+import pytest
+
+from jingleplayer.configuration import Config
+from jingleplayer.execution.tasks import (
+    JingleOverlapError,
+    check_for_overlaps,
+    find_task,
+    get_task_count,
+    iter_tasks,
+)
+
+
+def _load_config(tmp_path, game_start: str) -> Config:
+    file = tmp_path / "config.json"
+    file.write_text(
+        json.dumps(
+            {
+                "config_version": "1.0",
+                "games": {"Game 2": {"start": game_start, "duration": "10m"}},
+                "game_series": {
+                    "S": {
+                        "start": "2030-01-01 10:00",
+                        "interval": "10m",
+                        "duration": "10m",
+                        "count": 3,
+                    }
+                },
+                "jingles": {
+                    "Start": {
+                        "trigger": "game_start",
+                        "pre_actions": "wait 2s",
+                        "actions": "do nothing",
+                    }
+                },
+            }
+        )
+    )
+    return Config.load(str(file))
+
+
+def test_overlap_of_series_and_listed_game(tmp_path):
+    cfg = _load_config(tmp_path, "2030-01-01 10:10:01")
+
+    with pytest.raises(JingleOverlapError):
+        check_for_overlaps(cfg)
+
+
+def test_no_overlap_of_series_and_listed_game(tmp_path):
+    check_for_overlaps(_load_config(tmp_path, "2030-01-01 10:05"))
+
+
+def _load_mixed_config(tmp_path) -> Config:
+    # Listed games between the games of a series, whose end jingles start after the
+    # start jingle of the following game
+    file = tmp_path / "config.json"
+    file.write_text(
+        json.dumps(
+            {
+                "config_version": "1.0",
+                "games": {
+                    "Listed 1": {"start": "2030-01-01 09:00", "duration": "10m"},
+                    "Listed 2": {"start": "2030-01-01 12:00", "duration": "10m"},
+                },
+                "game_series": {
+                    "S": {
+                        "start": "2030-01-01 10:00",
+                        "interval": "10m",
+                        "duration": "15m",
+                        "count": 8,
+                    }
+                },
+                "jingles": {
+                    "Start": {"trigger": "game_start", "actions": "do nothing"},
+                    "End": {
+                        "trigger": "game_end",
+                        "offset": "-1m",
+                        "actions": "do nothing",
+                    },
+                },
+            }
+        )
+    )
+    return Config.load(str(file))
+
+
+@pytest.mark.parametrize(
+    "since",
+    ["2030-01-01 08:00", "10:00", "10:14", "10:20:30", "11:30", "12:05", "13:00"],
+)
+def test_tasks_since(tmp_path, since):
+    cfg = _load_mixed_config(tmp_path)
+    since = datetime.datetime.fromisoformat(
+        since if " " in since else f"2030-01-01 {since}"
+    )
+
+    expected = [t.key for t in iter_tasks(cfg) if t.start >= since]
+    assert [t.key for t in iter_tasks(cfg, since=since)] == expected
+    assert get_task_count(cfg, since=since) == len(expected)
+
+
+def test_find_task(tmp_path):
+    cfg = _load_mixed_config(tmp_path)
+
+    for t in iter_tasks(cfg):
+        assert find_task(cfg, t.key).key == t.key
+
+    assert find_task(cfg, ("S #3", "End", "2030-01-01T10:30:00")) is None
+    assert find_task(cfg, ("S #3", "Other", "2030-01-01T10:34:00")) is None